@@ -0,0 +1,277 @@
+"""Module containing asyncio request functions used to make traced
+requests. Requests are made over the connection pool of a TracedSession
+and executed on a thread pool, which allows requests to several services
+to be awaited concurrently. The parent span is captured when each request
+starts and is propagated explicitly into the request, since the thread
+local scope of the event loop is not visible from the worker threads.
+
+The traced_gather() helper can be used to fan out many requests under a
+single parent span
+
+    responses = await async_traced_requests.traced_gather('aggregate-items',
+        async_traced_requests.get('http://service-a/items'),
+        async_traced_requests.get('http://service-b/items'))
+"""
+
+import asyncio
+import contextvars
+import functools
+import logging
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+import requests
+
+import Octopus.bottle.jaeger_tracing.jaeger_config as config
+
+from Octopus.bottle.jaeger_tracing import tracing
+from Octopus.bottle.jaeger_tracing import traced_requests
+
+LOGGER = logging.getLogger('octopus.bottle.jaeger_tracing')
+
+# span opened by traced_gather(). asyncio tasks copy the current context
+# when created, which means the span is visible in all gathered requests
+_GATHER_SPAN = contextvars.ContextVar('octopus_gather_span', default=None)
+
+def get_parent_span() -> object:
+    """Function used to determine the parent span of
+    an asynchronous request. The span opened by an enclosing
+    traced_gather() call takes precedence over the active scope
+
+    Returns:
+        parent span or None if no span is active
+    """
+
+    span = _GATHER_SPAN.get()
+
+    if span is not None:
+        return span
+
+    parent_scope = tracing.get_active_scope()
+
+    return parent_scope.span if parent_scope else None
+
+
+class AsyncTracedSession:
+    """Asyncio session used to make traced HTTP requests. Requests
+    are executed over the connection pool of a TracedSession on a
+    dedicated thread pool, which means that the number of worker
+    threads should match the pool size of the session
+
+    Arguments:
+        session: optional TracedSession used to execute requests. A new
+            session is created from session_kwargs if not given
+        max_workers: int number of worker threads used to execute requests
+        session_kwargs: keyword arguments passed to TracedSession
+    """
+
+    def __init__(self, session: traced_requests.TracedSession = None, max_workers: int = 10, **session_kwargs: dict):
+
+        session_kwargs.setdefault('pool_maxsize', max_workers)
+
+        self._session = session or traced_requests.TracedSession(**session_kwargs)
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='octopus-traced-requests')
+
+    async def request(self, method: str, url: str, *args: tuple, **kwargs: dict) -> requests.Response:
+        """Function used to make a traced request with
+        the given HTTP method. The request is traced as a
+        child of the current parent span
+
+        Arguments:
+            method: str giving HTTP method
+            url: str giving url
+
+        Returns:
+            response object from request
+        """
+
+        kwargs['parent_span'] = get_parent_span()
+
+        loop = asyncio.get_running_loop()
+
+        return await loop.run_in_executor(self._executor, functools.partial(self._session.request, method, url, *args, **kwargs))
+
+    async def post(self, url: str, *args: tuple, **kwargs: dict) -> requests.Response:
+        return await self.request('POST', url, *args, **kwargs)
+
+    async def get(self, url: str, *args: tuple, **kwargs: dict) -> requests.Response:
+        return await self.request('GET', url, *args, **kwargs)
+
+    async def patch(self, url: str, *args: tuple, **kwargs: dict) -> requests.Response:
+        return await self.request('PATCH', url, *args, **kwargs)
+
+    async def delete(self, url: str, *args: tuple, **kwargs: dict) -> requests.Response:
+        return await self.request('DELETE', url, *args, **kwargs)
+
+    async def head(self, url: str, *args: tuple, **kwargs: dict) -> requests.Response:
+        kwargs.setdefault('allow_redirects', False)
+        return await self.request('HEAD', url, *args, **kwargs)
+
+    async def put(self, url: str, *args: tuple, **kwargs: dict) -> requests.Response:
+        return await self.request('PUT', url, *args, **kwargs)
+
+    async def options(self, url: str, *args: tuple, **kwargs: dict) -> requests.Response:
+        return await self.request('OPTIONS', url, *args, **kwargs)
+
+    def close(self):
+        """Function used to shut down the worker threads
+        and close all pooled connections. Blocks until all
+        in-flight requests have finished"""
+
+        self._executor.shutdown(wait=True)
+        self._session.close()
+
+    async def aclose(self):
+        """Function used to close the session from a coroutine.
+        The session is closed on a separate thread, which means
+        that the event loop is not blocked while in-flight
+        requests finish"""
+
+        loop = asyncio.get_running_loop()
+
+        await loop.run_in_executor(None, self.close)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args: tuple):
+        await self.aclose()
+
+async def traced_gather(operation_name: str, *aws: tuple, return_exceptions: bool = False) -> list:
+    """Function used to await several requests concurrently
+    under a single parent span. The span is created as a child
+    of the current parent span (if present) and is propagated
+    into each of the awaitables
+
+    Arguments:
+        operation_name: str giving name of parent span
+        aws: awaitables to run concurrently
+        return_exceptions: bool passed to asyncio.gather()
+
+    Returns:
+        list of results in the order of the given awaitables
+    """
+
+    if not config.ENABLE_JAEGER_TRACING:
+        return await asyncio.gather(*aws, return_exceptions=return_exceptions)
+
+    with tracing.TRACER.start_span(operation_name, child_of=get_parent_span()) as span:
+        token = _GATHER_SPAN.set(span)
+
+        try:
+            return await asyncio.gather(*aws, return_exceptions=return_exceptions)
+        finally:
+            _GATHER_SPAN.reset(token)
+
+_DEFAULT_SESSION = None
+_DEFAULT_SESSION_LOCK = threading.Lock()
+
+def get_default_session() -> AsyncTracedSession:
+    """Function used to retrieve the shared session used by
+    the module level request functions. The session shares
+    the connection pool of the default synchronous session
+
+    Returns:
+        instance of AsyncTracedSession
+    """
+
+    global _DEFAULT_SESSION
+
+    if _DEFAULT_SESSION is None:
+        with _DEFAULT_SESSION_LOCK:
+            if _DEFAULT_SESSION is None:
+                _DEFAULT_SESSION = AsyncTracedSession(session=traced_requests.get_default_session(),
+                                                      max_workers=config.TRACED_REQUESTS_POOL_MAXSIZE)
+    return _DEFAULT_SESSION
+
+async def post(url: str, *args: tuple, **kwargs: dict) -> object:
+    """Function used to make asynchronous POST request
+    over the shared default AsyncTracedSession
+
+    Arguments:
+        url: str giving url
+
+    Returns:
+        response object from request
+    """
+
+    return await get_default_session().post(url, *args, **kwargs)
+
+async def get(url: str, *args: tuple, **kwargs: dict) -> object:
+    """Function used to make asynchronous GET request
+    over the shared default AsyncTracedSession
+
+    Arguments:
+        url: str giving url
+
+    Returns:
+        response object from request
+    """
+
+    return await get_default_session().get(url, *args, **kwargs)
+
+async def patch(url: str, *args: tuple, **kwargs: dict) -> object:
+    """Function used to make asynchronous PATCH request
+    over the shared default AsyncTracedSession
+
+    Arguments:
+        url: str giving url
+
+    Returns:
+        response object from request
+    """
+
+    return await get_default_session().patch(url, *args, **kwargs)
+
+async def delete(url: str, *args: tuple, **kwargs: dict) -> object:
+    """Function used to make asynchronous DELETE request
+    over the shared default AsyncTracedSession
+
+    Arguments:
+        url: str giving url
+
+    Returns:
+        response object from request
+    """
+
+    return await get_default_session().delete(url, *args, **kwargs)
+
+async def head(url: str, *args: tuple, **kwargs: dict) -> object:
+    """Function used to make asynchronous HEAD request
+    over the shared default AsyncTracedSession
+
+    Arguments:
+        url: str giving url
+
+    Returns:
+        response object from request
+    """
+
+    return await get_default_session().head(url, *args, **kwargs)
+
+async def put(url: str, *args: tuple, **kwargs: dict) -> object:
+    """Function used to make asynchronous PUT request
+    over the shared default AsyncTracedSession
+
+    Arguments:
+        url: str giving url
+
+    Returns:
+        response object from request
+    """
+
+    return await get_default_session().put(url, *args, **kwargs)
+
+async def options(url: str, *args: tuple, **kwargs: dict) -> object:
+    """Function used to make asynchronous OPTIONS request
+    over the shared default AsyncTracedSession
+
+    Arguments:
+        url: str giving url
+
+    Returns:
+        response object from request
+    """
+
+    return await get_default_session().options(url, *args, **kwargs)
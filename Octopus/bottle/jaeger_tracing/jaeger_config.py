@@ -3,6 +3,9 @@
 import os 
 import logging 
 import pydantic
+import typing
+
+from Octopus.tracing import propagation
 
 LOGGER = logging.getLogger('octopus.bottle.jaeger_tracing')
 
@@ -11,9 +14,38 @@ SERVICE_NAME = os.environ.get('SERVICE_NAME', None)
 JAEGER_HOST = os.environ.get('JAEGER_HOST', None)
 JAEGER_PORT = os.environ.get('JAEGER_PORT', None)
 
+JAEGER_SAMPLER_TYPE = os.environ.get('JAEGER_SAMPLER_TYPE', None)
+JAEGER_SAMPLER_PARAM = os.environ.get('JAEGER_SAMPLER_PARAM', None)
+JAEGER_ROUTE_SAMPLING = os.environ.get('JAEGER_ROUTE_SAMPLING', None)
+
+JAEGER_REPORTER_QUEUE_SIZE = os.environ.get('JAEGER_REPORTER_QUEUE_SIZE', None)
+JAEGER_REPORTER_MAX_BATCH_BYTES = os.environ.get('JAEGER_REPORTER_MAX_BATCH_BYTES', None)
+JAEGER_REPORTER_FLUSH_INTERVAL = os.environ.get('JAEGER_REPORTER_FLUSH_INTERVAL', None)
+JAEGER_REPORTER_DROP_POLICY = os.environ.get('JAEGER_REPORTER_DROP_POLICY', None)
+
+JAEGER_SCOPE_MANAGER = os.environ.get('JAEGER_SCOPE_MANAGER', None)
+
+JAEGER_SLOW_REQUEST_THRESHOLD = os.environ.get('JAEGER_SLOW_REQUEST_THRESHOLD', None)
+JAEGER_SLOW_REQUEST_THRESHOLDS = os.environ.get('JAEGER_SLOW_REQUEST_THRESHOLDS', None)
+JAEGER_SLOW_REQUEST_BUFFER_SIZE = os.environ.get('JAEGER_SLOW_REQUEST_BUFFER_SIZE', None)
+JAEGER_SLOW_REQUEST_BUFFER_BYTES = os.environ.get('JAEGER_SLOW_REQUEST_BUFFER_BYTES', None)
+JAEGER_SLOW_REQUEST_STACKS = os.environ.get('JAEGER_SLOW_REQUEST_STACKS', None)
+
+JAEGER_SPAN_SINK = os.environ.get('JAEGER_SPAN_SINK', None)
+JAEGER_AGGREGATOR_MAX_SPANS = os.environ.get('JAEGER_AGGREGATOR_MAX_SPANS', None)
+
+JAEGER_PROPAGATION = os.environ.get('JAEGER_PROPAGATION', None)
+JAEGER_PROPAGATE_BAGGAGE = os.environ.get('JAEGER_PROPAGATE_BAGGAGE', None)
+
 ENABLE_JAEGER_TRACING = os.environ.get('ENABLE_JAEGER_TRACING', 'false') in ['true', 't']
 ENABLE_JAEGER_WITH_PROMETHEUS = os.environ.get('ENABLE_JAEGER_WITH_PROMETHEUS', 'false') in ['true', 't']
 
+# connection pool settings used by the default session of the traced_requests module
+TRACED_REQUESTS_POOL_CONNECTIONS = int(os.environ.get('TRACED_REQUESTS_POOL_CONNECTIONS', 10))
+TRACED_REQUESTS_POOL_MAXSIZE = int(os.environ.get('TRACED_REQUESTS_POOL_MAXSIZE', 10))
+TRACED_REQUESTS_MAX_RETRIES = int(os.environ.get('TRACED_REQUESTS_MAX_RETRIES', 0))
+TRACED_REQUESTS_KEEP_ALIVE = os.environ.get('TRACED_REQUESTS_KEEP_ALIVE', 'true').lower() in ['true', 't']
+
 
 class JaegerConfig(pydantic.BaseModel):
     """Dataclass used to encapsulate the config settings
@@ -23,11 +55,55 @@ class JaegerConfig(pydantic.BaseModel):
         jaeger_host: str host of jaeger agent
         jaeger_port: int port of jaeger agent
         service_name: str service name of application
+        sampler_type: str default sampler type. Supported types are
+            ['const', 'probabilistic', 'ratelimiting']
+        sampler_param: float parameter of default sampler
+        route_sampling: dict mapping routes (i.e. '/items' or 'GET /items')
+            to sampling strategies in format <type>:<param>
+        reporter_queue_size: int maximum number of spans queued for reporting
+        reporter_max_batch_bytes: int maximum size of a batch sent to the agent
+        reporter_flush_interval: float interval between flushes in seconds
+        reporter_drop_policy: str either 'oldest' or 'newest'. Determines
+            which spans are dropped when the queue is full
+        scope_manager: str scope manager tracking the active span. Supported
+            scope managers are ['thread', 'contextvars', 'gevent']
+        slow_request_threshold: float latency threshold in seconds above which
+            requests are kept in the slow request buffer. 0 disables capture
+        slow_request_thresholds: dict mapping routes (i.e. '/items' or 'GET /items')
+            to latency thresholds in seconds
+        slow_request_buffer_size: int maximum number of buffered slow requests
+        slow_request_buffer_bytes: int maximum total size of buffered slow requests
+        slow_request_stacks: bool snapshot the stack of requests exceeding
+            their threshold
+        span_sink: str destination of finished spans. Supported sinks are
+            ['agent', 'memory', 'both'], where 'memory' keeps spans in the
+            in-process aggregator
+        aggregator_max_spans: int number of recent spans kept by the aggregator
+        propagation: tuple of header formats used to propagate span contexts.
+            Supported formats are ['jaeger', 'w3c', 'b3', 'b3-single']
+        propagate_baggage: bool extract jaeger baggage headers of requests
     """
     
     service_name: str
     jaeger_host: str = 'localhost'
     jaeger_port: int = 6831
+    sampler_type: str = 'const'
+    sampler_param: float = 1
+    route_sampling: typing.Dict[str, str] = {}
+    reporter_queue_size: int = 1000
+    reporter_max_batch_bytes: int = 65000
+    reporter_flush_interval: float = 1.0
+    reporter_drop_policy: str = 'oldest'
+    scope_manager: str = 'thread'
+    slow_request_threshold: float = 0
+    slow_request_thresholds: typing.Dict[str, float] = {}
+    slow_request_buffer_size: int = 100
+    slow_request_buffer_bytes: int = 1048576
+    slow_request_stacks: bool = False
+    span_sink: str = 'agent'
+    aggregator_max_spans: int = 1000
+    propagation: typing.Tuple[str, ...] = propagation.DEFAULT_FORMATS
+    propagate_baggage: bool = True
     
 JAEGER_CONFIG = None
 
@@ -56,6 +132,87 @@ def set_jaeger_config(jaeger_config: dict):
     if SERVICE_NAME is not None:
         LOGGER.debug('service name set in environment variables. overriding config with %s', SERVICE_NAME)
         jaeger_config['service_name'] = SERVICE_NAME
+    
+    # override sampling strategies with environment variables if set
+    if JAEGER_SAMPLER_TYPE is not None:
+        LOGGER.debug('sampler type set in environment variables. overriding config with %s', JAEGER_SAMPLER_TYPE)
+        jaeger_config['sampler_type'] = JAEGER_SAMPLER_TYPE
+    
+    if JAEGER_SAMPLER_PARAM is not None:
+        LOGGER.debug('sampler param set in environment variables. overriding config with %s', JAEGER_SAMPLER_PARAM)
+        jaeger_config['sampler_param'] = JAEGER_SAMPLER_PARAM
+    
+    if JAEGER_ROUTE_SAMPLING is not None:
+        LOGGER.debug('route sampling set in environment variables. overriding config with %s', JAEGER_ROUTE_SAMPLING)
+        
+        from Octopus.tracing import sampling
+        
+        try:
+            jaeger_config['route_sampling'] = sampling.parse_route_strategies(JAEGER_ROUTE_SAMPLING)
+        
+        except ValueError as err:
+            LOGGER.exception(err)
+            
+            raise RuntimeError('received invalid route sampling strategies for jaeger plugin')
+        
+    # override reporter settings with environment variables if set
+    reporter_settings = {
+        'reporter_queue_size': JAEGER_REPORTER_QUEUE_SIZE,
+        'reporter_max_batch_bytes': JAEGER_REPORTER_MAX_BATCH_BYTES,
+        'reporter_flush_interval': JAEGER_REPORTER_FLUSH_INTERVAL,
+        'reporter_drop_policy': JAEGER_REPORTER_DROP_POLICY
+    }
+    
+    for setting, value in reporter_settings.items():
+        if value is not None:
+            LOGGER.debug('%s set in environment variables. overriding config with %s', setting, value)
+            jaeger_config[setting] = value
+    
+    if JAEGER_SCOPE_MANAGER is not None:
+        LOGGER.debug('scope manager set in environment variables. overriding config with %s', JAEGER_SCOPE_MANAGER)
+        jaeger_config['scope_manager'] = JAEGER_SCOPE_MANAGER
+    
+    # override slow request settings with environment variables if set
+    slow_request_settings = {
+        'slow_request_threshold': JAEGER_SLOW_REQUEST_THRESHOLD,
+        'slow_request_buffer_size': JAEGER_SLOW_REQUEST_BUFFER_SIZE,
+        'slow_request_buffer_bytes': JAEGER_SLOW_REQUEST_BUFFER_BYTES,
+        'slow_request_stacks': JAEGER_SLOW_REQUEST_STACKS
+    }
+    
+    for setting, value in slow_request_settings.items():
+        if value is not None:
+            LOGGER.debug('%s set in environment variables. overriding config with %s', setting, value)
+            jaeger_config[setting] = value
+    
+    if JAEGER_SPAN_SINK is not None:
+        LOGGER.debug('span sink set in environment variables. overriding config with %s', JAEGER_SPAN_SINK)
+        jaeger_config['span_sink'] = JAEGER_SPAN_SINK
+    
+    if JAEGER_AGGREGATOR_MAX_SPANS is not None:
+        LOGGER.debug('aggregator max spans set in environment variables. overriding config with %s', JAEGER_AGGREGATOR_MAX_SPANS)
+        jaeger_config['aggregator_max_spans'] = JAEGER_AGGREGATOR_MAX_SPANS
+    
+    if JAEGER_PROPAGATION is not None:
+        LOGGER.debug('propagation set in environment variables. overriding config with %s', JAEGER_PROPAGATION)
+        jaeger_config['propagation'] = [item.strip() for item in JAEGER_PROPAGATION.split(',')]
+    
+    if JAEGER_PROPAGATE_BAGGAGE is not None:
+        LOGGER.debug('propagate baggage set in environment variables. overriding config with %s', JAEGER_PROPAGATE_BAGGAGE)
+        jaeger_config['propagate_baggage'] = JAEGER_PROPAGATE_BAGGAGE
+    
+    if JAEGER_SLOW_REQUEST_THRESHOLDS is not None:
+        LOGGER.debug('slow request thresholds set in environment variables. overriding config with %s', JAEGER_SLOW_REQUEST_THRESHOLDS)
+        
+        from Octopus.tracing import sampling
+        
+        try:
+            jaeger_config['slow_request_thresholds'] = sampling.parse_route_strategies(JAEGER_SLOW_REQUEST_THRESHOLDS)
+        
+        except ValueError as err:
+            LOGGER.exception(err)
+            
+            raise RuntimeError('received invalid slow request thresholds for jaeger plugin')
         
     LOGGER.info('overriding default jaeger tracing configuration with %s', jaeger_config)
             
@@ -66,3 +223,46 @@ def set_jaeger_config(jaeger_config: dict):
         LOGGER.exception(err.json())
         
         raise RuntimeError('received invalid config dict for jaeger plugin')
+    
+    # validate propagation formats before the first request is traced
+    try:
+        propagation.validate_formats(JAEGER_CONFIG.propagation)
+        
+    except ValueError as err:
+        LOGGER.exception(err)
+        
+        raise RuntimeError(f'received invalid propagation format for jaeger plugin. must be one of {propagation.PROPAGATION_FORMATS}')
+    
+    # the tracer components are only validated if tracing is enabled, which
+    # avoids importing jaeger_client in applications with tracing disabled
+    if not ENABLE_JAEGER_TRACING:
+        return
+    
+    from Octopus.tracing import aggregator
+    from Octopus.tracing import reporter
+    from Octopus.tracing import sampling
+    from Octopus.tracing import scope
+    
+    if JAEGER_CONFIG.reporter_drop_policy not in reporter.DROP_POLICIES:
+        raise RuntimeError(f'received invalid reporter drop policy for jaeger plugin. must be one of {reporter.DROP_POLICIES}')
+    
+    if JAEGER_CONFIG.span_sink not in aggregator.SPAN_SINKS:
+        raise RuntimeError(f'received invalid span sink for jaeger plugin. must be one of {aggregator.SPAN_SINKS}')
+    
+    # validate sampling strategies before the tracer is lazily created
+    try:
+        sampling.get_route_sampler(JAEGER_CONFIG.sampler_type, JAEGER_CONFIG.sampler_param, JAEGER_CONFIG.route_sampling)
+        
+    except ValueError as err:
+        LOGGER.exception(err)
+        
+        raise RuntimeError('received invalid sampling strategy for jaeger plugin')
+    
+    # validate scope manager before the tracer is lazily created
+    try:
+        scope.get_scope_manager(JAEGER_CONFIG.scope_manager)
+        
+    except ValueError as err:
+        LOGGER.exception(err)
+        
+        raise RuntimeError(f'received invalid scope manager for jaeger plugin. must be one of {scope.SCOPE_MANAGERS}')
@@ -1,19 +1,211 @@
 """Module containing request functions used to make traced requests.
 All requests are made over the Python requests library; if tracing
-has been enabled in the Environment Variables, then the call is 
-traced. If not, the Python requests function is evaluated as normal"""
+has been enabled in the Environment Variables, then the call is
+traced. If not, the Python requests function is evaluated as normal.
+
+Requests are made over instances of TracedSession, which keep a pool
+of keep-alive connections per host. The module level functions route
+through a shared default session, which means that consecutive requests
+to the same host reuse the same TCP/TLS connection"""
+
+import logging
+import threading
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+import Octopus.bottle.jaeger_tracing.jaeger_config as config
 
 from Octopus.bottle.jaeger_tracing import tracing
 
+LOGGER = logging.getLogger('octopus.bottle.jaeger_tracing')
+
+
+class TracedSession:
+    """Session used to make traced HTTP requests over a pool of
+    keep-alive connections. Each host receives its own connection
+    pool, and spans are injected into the request headers in the
+    same way as tracing.traced_request(). Sessions can be used
+    as context managers, in which case the connection pools are
+    closed on exit
+
+    Arguments:
+        pool_connections: int number of per-host connection pools to cache
+        pool_maxsize: int maximum number of connections kept per host
+        max_retries: int number of retries for failed connections
+        retry_backoff: float backoff factor applied between retries
+        keep_alive: bool if False, connections are closed after each request
+    """
+
+    def __init__(self, pool_connections: int = 10, pool_maxsize: int = 10, max_retries: int = 0,
+                 retry_backoff: float = 0, keep_alive: bool = True):
+
+        self._session = requests.Session()
+
+        retries = Retry(total=max_retries, backoff_factor=retry_backoff, raise_on_status=False)
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize, max_retries=retries)
+
+        self._session.mount('http://', adapter)
+        self._session.mount('https://', adapter)
+
+        if not keep_alive:
+            self._session.headers['Connection'] = 'close'
+
+    def request(self, method: str, url: str, *args: tuple, **kwargs: dict) -> requests.Response:
+        """Function used to make a traced request with
+        the given HTTP method over the session connection
+        pool
+
+        Arguments:
+            method: str giving HTTP method
+            url: str giving url
+
+        Returns:
+            response object from request
+        """
+
+        method = method.upper()
+
+        def request_function(url: str, *args: tuple, **kwargs: dict) -> requests.Response:
+            return self._session.request(method, url, *args, **kwargs)
+
+        return tracing.traced_request(request_function, url, *args, request_method=method, **kwargs)
+
+    def post(self, url: str, *args: tuple, **kwargs: dict) -> requests.Response:
+        """Function used to make a traced POST request
+        over the session connection pool
+
+        Arguments:
+            url: str giving url
+
+        Returns:
+            response object from request
+        """
+
+        return self.request('POST', url, *args, **kwargs)
+
+    def get(self, url: str, *args: tuple, **kwargs: dict) -> requests.Response:
+        """Function used to make a traced GET request
+        over the session connection pool
+
+        Arguments:
+            url: str giving url
+
+        Returns:
+            response object from request
+        """
+
+        return self.request('GET', url, *args, **kwargs)
+
+    def patch(self, url: str, *args: tuple, **kwargs: dict) -> requests.Response:
+        """Function used to make a traced PATCH request
+        over the session connection pool
+
+        Arguments:
+            url: str giving url
+
+        Returns:
+            response object from request
+        """
+
+        return self.request('PATCH', url, *args, **kwargs)
+
+    def delete(self, url: str, *args: tuple, **kwargs: dict) -> requests.Response:
+        """Function used to make a traced DELETE request
+        over the session connection pool
+
+        Arguments:
+            url: str giving url
+
+        Returns:
+            response object from request
+        """
+
+        return self.request('DELETE', url, *args, **kwargs)
+
+    def head(self, url: str, *args: tuple, **kwargs: dict) -> requests.Response:
+        """Function used to make a traced HEAD request
+        over the session connection pool. Redirects are
+        not followed unless allow_redirects is given
+
+        Arguments:
+            url: str giving url
+
+        Returns:
+            response object from request
+        """
+
+        kwargs.setdefault('allow_redirects', False)
+        return self.request('HEAD', url, *args, **kwargs)
+
+    def put(self, url: str, *args: tuple, **kwargs: dict) -> requests.Response:
+        """Function used to make a traced PUT request
+        over the session connection pool
+
+        Arguments:
+            url: str giving url
+
+        Returns:
+            response object from request
+        """
+
+        return self.request('PUT', url, *args, **kwargs)
+
+    def options(self, url: str, *args: tuple, **kwargs: dict) -> requests.Response:
+        """Function used to make a traced OPTIONS request
+        over the session connection pool
+
+        Arguments:
+            url: str giving url
+
+        Returns:
+            response object from request
+        """
+
+        return self.request('OPTIONS', url, *args, **kwargs)
+
+    def close(self):
+        """Function used to close all pooled connections"""
+
+        self._session.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args: tuple):
+        self.close()
+
+_DEFAULT_SESSION = None
+_DEFAULT_SESSION_LOCK = threading.Lock()
+
+def get_default_session() -> TracedSession:
+    """Function used to retrieve the shared session used
+    by the module level request functions. The session is
+    created on first use with the pool settings defined in
+    the environment variables
+
+    Returns:
+        instance of TracedSession
+    """
+
+    global _DEFAULT_SESSION
+
+    if _DEFAULT_SESSION is None:
+        with _DEFAULT_SESSION_LOCK:
+            if _DEFAULT_SESSION is None:
+                LOGGER.debug('creating default traced session with pool size %s', config.TRACED_REQUESTS_POOL_MAXSIZE)
+
+                _DEFAULT_SESSION = TracedSession(pool_connections=config.TRACED_REQUESTS_POOL_CONNECTIONS,
+                                                 pool_maxsize=config.TRACED_REQUESTS_POOL_MAXSIZE,
+                                                 max_retries=config.TRACED_REQUESTS_MAX_RETRIES,
+                                                 keep_alive=config.TRACED_REQUESTS_KEEP_ALIVE)
+    return _DEFAULT_SESSION
 
 def post(url: str, *args: tuple, **kwargs: dict) -> object:
     """Function used to make POST request. Requests
-    are made by providing the tracing.traced_request()
-    function with the POST function from the requests 
-    library
-    
+    are made over the shared default TracedSession
+
     Arguments:
         url: str giving url
 
@@ -21,14 +213,12 @@ def post(url: str, *args: tuple, **kwargs: dict) -> object:
         response object from request
     """
 
-    return tracing.traced_request(requests.post, url, *args, **kwargs)
+    return get_default_session().post(url, *args, **kwargs)
 
 def get(url: str, *args: tuple, **kwargs: dict) -> object:
     """Function used to make GET request. Requests
-    are made by providing the tracing.traced_request()
-    function with the GET function from the requests 
-    library
-    
+    are made over the shared default TracedSession
+
     Arguments:
         url: str giving url
 
@@ -36,14 +226,12 @@ def get(url: str, *args: tuple, **kwargs: dict) -> object:
         response object from request
     """
 
-    return tracing.traced_request(requests.get, url, *args, **kwargs)
+    return get_default_session().get(url, *args, **kwargs)
 
 def patch(url: str, *args: tuple, **kwargs: dict) -> object:
     """Function used to make PATCH request. Requests
-    are made by providing the tracing.traced_request()
-    function with the PATCH function from the requests 
-    library
-    
+    are made over the shared default TracedSession
+
     Arguments:
         url: str giving url
 
@@ -51,14 +239,12 @@ def patch(url: str, *args: tuple, **kwargs: dict) -> object:
         response object from request
     """
 
-    return tracing.traced_request(requests.patch, url, *args, **kwargs)
+    return get_default_session().patch(url, *args, **kwargs)
 
 def delete(url: str, *args: tuple, **kwargs: dict) -> object:
     """Function used to make DELETE request. Requests
-    are made by providing the tracing.traced_request()
-    function with the DELETE function from the requests 
-    library
-    
+    are made over the shared default TracedSession
+
     Arguments:
         url: str giving url
 
@@ -66,46 +252,40 @@ def delete(url: str, *args: tuple, **kwargs: dict) -> object:
         response object from request
     """
 
-    return tracing.traced_request(requests.delete, url, *args, **kwargs)
+    return get_default_session().delete(url, *args, **kwargs)
 
 def head(url: str, *args: tuple, **kwargs: dict) -> object:
     """Function used to make HEAD request. Requests
-    are made by providing the tracing.traced_request()
-    function with the HEAD function from the requests 
-    library
-    
+    are made over the shared default TracedSession
+
     Arguments:
         url: str giving url
 
     Returns:
         response object from request
     """
-    return tracing.traced_request(requests.head, url, *args, **kwargs)
+    return get_default_session().head(url, *args, **kwargs)
 
 def put(url: str, *args: tuple, **kwargs: dict) -> object:
     """Function used to make PUT request. Requests
-    are made by providing the tracing.traced_request()
-    function with the PUT function from the requests 
-    library
-    
+    are made over the shared default TracedSession
+
     Arguments:
         url: str giving url
 
     Returns:
         response object from request
     """
-    return tracing.traced_request(requests.put, url, *args, **kwargs)
+    return get_default_session().put(url, *args, **kwargs)
 
 def options(url: str, *args: tuple, **kwargs: dict) -> object:
     """Function used to make OPTIONS request. Requests
-    are made by providing the tracing.traced_request()
-    function with the OPTIONS function from the requests 
-    library
-    
+    are made over the shared default TracedSession
+
     Arguments:
         url: str giving url
 
     Returns:
         response object from request
     """
-    return tracing.traced_request(requests.options, url, *args, **kwargs)
\ No newline at end of file
+    return get_default_session().options(url, *args, **kwargs)
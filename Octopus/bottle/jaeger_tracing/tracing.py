@@ -7,16 +7,17 @@ import logging
 import json
 import datetime
 import sys
+import threading
+import time
 
-import opentracing
-
-import requests
 import bottle
-import jaeger_client
-from jaeger_client.metrics import prometheus
 
 import Octopus.bottle.jaeger_tracing.jaeger_config as config
 
+from Octopus.tracing import lifecycle
+from Octopus.tracing import propagation
+from Octopus.tracing import tags
+
 # set logger
 LOGGER = logging.getLogger('octopus.bottle.jaeger_tracing')
 
@@ -24,68 +25,197 @@ LOGGER = logging.getLogger('octopus.bottle.jaeger_tracing')
 # Define function used to generate tracer
 #########################################
 
-def get_tracer() -> jaeger_client.Config: # pragma: no cover
+def get_tracer() -> 'jaeger_client.Tracer': # pragma: no cover
     """Function used to retrieve Jaeger Tracer.
     The Jaeger Host and Port can be specified in
     the environment variables, else the default
     connection to localhost at UDP port 6831
-    will be used"""
+    will be used. Spans are sent to the agent
+    by a bounded, batching span reporter, and the
+    active span is tracked by the configured scope
+    manager. Spans can be aggregated in process instead
+    of (or in addition to) being sent to the agent.
+    jaeger_client is imported once the tracer is created,
+    which keeps the import of the module cheap if tracing
+    is disabled"""
+
+    import jaeger_client
+    import jaeger_client.reporter
+    
+    from Octopus.tracing import aggregator
+    from Octopus.tracing import reporter
+    from Octopus.tracing import sampling
+    from Octopus.tracing import scope
+    from Octopus.tracing import slow_requests
 
     LOGGER.info('getting jaeger tracer for service %s', config.JAEGER_CONFIG.service_name)
 
     jaeger_config = {
-        'sampler': {
-            'type': 'const',
-            'param': 1
-        },
+        'sampler': sampling.get_route_sampler(config.JAEGER_CONFIG.sampler_type, config.JAEGER_CONFIG.sampler_param, config.JAEGER_CONFIG.route_sampling),
         'logging': True
     } 
     
     # enable prometheus metrics
+    metrics_factory = None
+    
     if config.ENABLE_JAEGER_WITH_PROMETHEUS:
-        config['metrics_factory'] = prometheus.PrometheusMetricsFactory(service_name_label=config.JAEGER_CONFIG.service_name)
+        from jaeger_client.metrics import prometheus
+        
+        metrics_factory = prometheus.PrometheusMetricsFactory(service_name_label=config.JAEGER_CONFIG.service_name)
     
     LOGGER.debug('Creating Jaeger Tracer for %s:%s', config.JAEGER_CONFIG.jaeger_host, config.JAEGER_CONFIG.jaeger_port)
 
-    jaeger_config['local_agent'] = {
-        'reporting_host': config.JAEGER_CONFIG.jaeger_host, 
-        'reporting_port': config.JAEGER_CONFIG.jaeger_port
-    }
+    def agent_reporter() -> reporter.BatchingReporter:
+        return reporter.BatchingReporter(config.JAEGER_CONFIG.jaeger_host, config.JAEGER_CONFIG.jaeger_port,
+                                         queue_size=config.JAEGER_CONFIG.reporter_queue_size,
+                                         max_batch_bytes=config.JAEGER_CONFIG.reporter_max_batch_bytes,
+                                         flush_interval=config.JAEGER_CONFIG.reporter_flush_interval,
+                                         drop_policy=config.JAEGER_CONFIG.reporter_drop_policy)
+    
+    # spans are sent to the agent and/or kept by the in-process aggregator
+    span_reporter = aggregator.get_span_reporter(config.JAEGER_CONFIG.span_sink, agent_reporter, max_spans=config.JAEGER_CONFIG.aggregator_max_spans)
 
     # create jaeger client config object and return tracer
-    _config = jaeger_client.Config(config=jaeger_config, service_name=config.JAEGER_CONFIG.service_name, validate=True)
+    _config = jaeger_client.Config(config=jaeger_config, service_name=config.JAEGER_CONFIG.service_name, metrics_factory=metrics_factory,
+                                   scope_manager=scope.get_scope_manager(config.JAEGER_CONFIG.scope_manager), validate=True)
 
-    return _config.initialize_tracer()
+    if _config.logging:
+        span_reporter = jaeger_client.reporter.CompositeReporter(span_reporter, jaeger_client.reporter.LoggingReporter())
+    
+    # collect child spans of slow requests if enabled
+    capture = get_slow_requests()
+    
+    if capture is not None:
+        span_reporter = slow_requests.CollectingReporter(span_reporter, capture)
+
+    tracer = _config.create_tracer(reporter=span_reporter, sampler=_config.sampler)
+    
+    import opentracing
+    
+    opentracing.set_global_tracer(tracer)
+
+    return tracer
 
 #####################################
 # define getter for tracer for module
 #####################################
 
-class Tracer:
+class Tracer(lifecycle.LazyTracer):
     """Wrapper used to lazy loading of Jaeger Tracing object.
     The Jaeger Tracer will not initialize until an attribute
-    of the tracer is directly referenced"""
+    of the tracer is directly referenced. The tracer is
+    recreated in the child process after a fork (see lifecycle)"""
     
-    _tracer = None
+    def create(self) -> 'jaeger_client.Tracer':
+        return get_tracer()
     
-    def initialize(self):
-        self._tracer = get_tracer()
+TRACER = Tracer()
+
+def post_worker_init(worker: object):
+    """Gunicorn hook used to warm up the tracer of a worker
+    once the application is loaded, which means that the
+    first request does not pay for the construction of the
+    tracer. The hook is imported in the gunicorn config file
+
+        # gunicorn.conf.py
+        from Octopus.bottle.jaeger_tracing.tracing import post_worker_init, worker_exit
+    """
     
-    def __getattr__(self, attr):
-        
-        if not self._tracer:
-            self._tracer = get_tracer()
+    if config.ENABLE_JAEGER_TRACING and config.JAEGER_CONFIG is not None:
+        TRACER.warm_up()
+        get_propagator()
+
+def worker_exit(server: object, worker: object):
+    """Gunicorn hook used to flush all queued spans and
+    close the tracers of a worker before it exits"""
+    
+    lifecycle.shutdown()
+    
+##############################################
+# Define registry of routes active per thread
+##############################################
+
+# operation name of the request span active in each thread. read by the sampling profiler
+ACTIVE_ROUTES = {}
+
+def set_active_route(operation_name: str) -> str:
+    """Function used to register the operation name of the
+    request span active in the current thread
+
+    Arguments:
+        operation_name: str operation name of span
+
+    Returns:
+        str previously active operation name or None
+    """
+
+    ident = threading.get_ident()
+    previous = ACTIVE_ROUTES.get(ident)
+
+    ACTIVE_ROUTES[ident] = operation_name
+
+    return previous
+
+def reset_active_route(previous: str):
+    """Function used to restore the previously active
+    operation name of the current thread
+
+    Arguments:
+        previous: str operation name returned by set_active_route()
+    """
+
+    if previous is None:
+        ACTIVE_ROUTES.pop(threading.get_ident(), None)
+    else:
+        ACTIVE_ROUTES[threading.get_ident()] = previous
+
+#####################################
+# Define capture of slow requests
+#####################################
+
+SLOW_REQUESTS = None
+
+def get_slow_requests() -> 'slow_requests.SlowRequestCapture':
+    """Function used to retrieve the capture of slow requests.
+    The capture is created on first use from the plugin config,
+    and None is returned if no latency threshold is configured"""
+    
+    global SLOW_REQUESTS
+    
+    if SLOW_REQUESTS is None and config.JAEGER_CONFIG is not None:
+        if config.JAEGER_CONFIG.slow_request_threshold or config.JAEGER_CONFIG.slow_request_thresholds:
+            from Octopus.tracing import slow_requests
             
-        return getattr(self._tracer, attr)
+            SLOW_REQUESTS = slow_requests.SlowRequestCapture(config.JAEGER_CONFIG.slow_request_threshold, config.JAEGER_CONFIG.slow_request_thresholds,
+                                                             max_entries=config.JAEGER_CONFIG.slow_request_buffer_size,
+                                                             max_bytes=config.JAEGER_CONFIG.slow_request_buffer_bytes,
+                                                             capture_stacks=config.JAEGER_CONFIG.slow_request_stacks)
+    return SLOW_REQUESTS
+
+@lifecycle.register_after_fork
+def reset_slow_requests():
+    """Function used to discard the capture of slow requests
+    inherited from the parent process, whose watchdog thread
+    does not exist in the child process"""
+    
+    global SLOW_REQUESTS
     
-    def __repr__(self):
-        return self._tracer.__repr__()
+    SLOW_REQUESTS = None
 
-    def __str__(self):
-        return str(self._tracer)
+def finish_slow_request(capture: 'slow_requests.SlowRequestCapture', request: 'slow_requests.InFlightRequest', request_method: str, error: Exception = None,
+                        end: float = None):
+    """Function used to finish tracking a request in the
+    capture of slow requests. The request tags are recreated
+    for unsampled spans, which do not record tags"""
     
-TRACER = Tracer()
+    request_tags = {
+        tags.HTTP_METHOD: request_method,
+        tags.HTTP_URL: bottle.request.path,
+        'user': bottle.request.headers.get('X-Authenticated-Userid')
+    }
     
+    capture.finish(request, end or time.time(), request_method, bottle.request.path, tags=request_tags, error=error)
+
 ###########################################################
 # Define functions to inject and extract spans from headers
 ###########################################################
@@ -103,17 +233,28 @@ def get_active_scope() -> object: # pragma: no cover
     if config.ENABLE_JAEGER_TRACING:
         return TRACER.scope_manager.active
 
-# create mappings between request methods and string
+# module level requests functions named after their HTTP method. functions are
+# matched by name, which avoids importing requests when the module is imported
 request_mappings = {
-    requests.post: 'POST',
-    requests.get: 'GET',
-    requests.patch: 'PATCH',
-    requests.put: 'PUT',
-    requests.delete: 'DELETE',
-    requests.options: 'OPTIONS'
+    'post': 'POST',
+    'get': 'GET',
+    'patch': 'PATCH',
+    'put': 'PUT',
+    'delete': 'DELETE',
+    'head': 'HEAD',
+    'options': 'OPTIONS'
 }
 
-def inject_span(request_func: object, url: str, span: object, headers: dict) -> dict:
+def get_request_method(request_func: object) -> str:
+    """Function used to retrieve the HTTP method of a
+    module level requests function (i.e. requests.get)"""
+    
+    if getattr(request_func, '__module__', None) != 'requests.api':
+        return None
+    
+    return request_mappings.get(getattr(request_func, '__name__', None))
+
+def inject_span(request_func: object, url: str, span: object, headers: dict, request_method: str = None) -> dict:
     """Function used to inject the into the 
     header of a request. This allows requests 
     to be traced across several API's
@@ -123,6 +264,8 @@ def inject_span(request_func: object, url: str, span: object, headers: dict) ->
         url: string giving request url
         span: span object to inject into header
         headers: dictionary of headers
+        request_method: optional string giving HTTP method. Required
+            if request_func is not a module level requests function
 
     Returns
         dictionary containing headers
@@ -130,17 +273,40 @@ def inject_span(request_func: object, url: str, span: object, headers: dict) ->
     """
 
     # set tags on span
-    span.set_tag(opentracing.ext.tags.HTTP_METHOD, request_mappings[request_func])
-    span.set_tag(opentracing.ext.tags.HTTP_URL, url)
-    span.set_tag(opentracing.ext.tags.SPAN_KIND, opentracing.ext.tags.SPAN_KIND_RPC_CLIENT)
+    span.set_tag(tags.HTTP_METHOD, request_method or get_request_method(request_func))
+    span.set_tag(tags.HTTP_URL, url)
+    span.set_tag(tags.SPAN_KIND, tags.SPAN_KIND_RPC_CLIENT)
 
-    TRACER.inject(span, opentracing.Format.HTTP_HEADERS, headers)
+    get_propagator().inject(span.context, headers)
 
     return headers
 
+def get_propagator() -> propagation.Propagator:
+    """Function used to retrieve the propagator of the
+    propagation formats set in the plugin config"""
+    
+    if config.JAEGER_CONFIG is None:
+        return propagation.get_propagator()
+    
+    return propagation.get_propagator(config.JAEGER_CONFIG.propagation, config.JAEGER_CONFIG.propagate_baggage)
+
+def extract_context(environ: dict) -> object:
+    """Function used to extract the parent span context
+    of a request directly from its WSGI environ
+    
+    Arguments:
+        environ: dict WSGI environ of request
+
+    Returns:
+        span context or None if the request carries no context
+    """
+    
+    return get_propagator().extract(environ)
+
 def extract_span(headers: dict) -> object:
     """Function used to extract span from headers
-    dictionary
+    dictionary. Bottle header dicts are read through
+    their underlying WSGI environ
     
     Arguments:
         headers: dictionary containing headers
@@ -151,11 +317,13 @@ def extract_span(headers: dict) -> object:
 
     """
 
+    environ = getattr(headers, 'environ', None)
+    
     # extract parent span
-    parent = TRACER.extract(opentracing.Format.HTTP_HEADERS, headers)
+    parent = extract_context(environ if environ is not None else propagation.get_environ(headers))
 
     # extract current spans and tag as server type
-    span_tags = {opentracing.ext.tags.SPAN_KIND: opentracing.ext.tags.SPAN_KIND_RPC_SERVER}
+    span_tags = {tags.SPAN_KIND: tags.SPAN_KIND_RPC_SERVER}
 
     return parent, span_tags
 
@@ -163,7 +331,7 @@ def extract_span(headers: dict) -> object:
 # Define Traced Request function used to make a traced request
 ##############################################################
 
-def traced_request(request_function: object, url: str, *args: tuple, **kwargs: dict) -> bottle.response:
+def traced_request(request_function: object, url: str, *args: tuple, request_method: str = None, parent_span: object = None, **kwargs: dict) -> bottle.response:
     """Function used to make a traced HTTP request
     via the Python requests library. If tracing is enabled,
     the request is executed within the local Span object; 
@@ -176,28 +344,34 @@ def traced_request(request_function: object, url: str, *args: tuple, **kwargs: d
         request_function: function from requests library used to make
             HTTP request
         url: string givin URL 
+        request_method: optional string giving HTTP method. Required
+            if request_function is not a module level requests function
+        parent_span: optional span to trace the request under. If not
+            given, the span of the current active scope is used
     
     Returns:
         instance of bottle.response giving response from 
             server
     """
     
-    # if tracing is enabled, get parent span
-    parent_scope = get_active_scope()
+    # if tracing is enabled and no parent is given, get span of active scope
+    if parent_span is None:
+        parent_scope = get_active_scope()
+        parent_span = parent_scope.span if parent_scope else None
 
     # if no active spans are found, carry out request without trace
-    if not parent_scope:
+    if not parent_span:
         return request_function(url, *args, **kwargs)
     
     # inject current span into headers
-    kwargs['headers'] = inject_span(request_function, url=url, span=parent_scope.span, headers=kwargs.get('headers', {}))
+    kwargs['headers'] = inject_span(request_function, url=url, span=parent_span, headers=kwargs.get('headers', {}), request_method=request_method)
 
-    with TRACER.start_active_span(url, child_of=parent_scope.span) as scope:
+    with TRACER.start_active_span(url, child_of=parent_span) as scope:
         
         # set tags on span
-        scope.span.set_tag(opentracing.ext.tags.HTTP_METHOD, request_mappings.get(request_function, None))
-        scope.span.set_tag(opentracing.ext.tags.HTTP_URL, url)
-        scope.span.set_tag(opentracing.ext.tags.SPAN_KIND, opentracing.ext.tags.SPAN_KIND_RPC_CLIENT)
+        scope.span.set_tag(tags.HTTP_METHOD, request_method or get_request_method(request_function))
+        scope.span.set_tag(tags.HTTP_URL, url)
+        scope.span.set_tag(tags.SPAN_KIND, tags.SPAN_KIND_RPC_CLIENT)
         
         result = request_function(url, *args, **kwargs)
 
@@ -247,50 +421,49 @@ def trace(route_name):
     def decorator(func):
         def wrapper(*args, **kwargs):
 
-            LOGGER.debug(f'Starting Trace for {route_name}')
+            LOGGER.debug('Starting Trace for %s', route_name)
             
             request_method = bottle.request.method 
-            
-            # user ID from header if present
-            user_id = bottle.request.headers.get('X-Authenticated-Userid', None)
 
-            # extract parent span
-            parent, _ = extract_span(bottle.request.headers)
+            # extract parent span. if no parent span is present in the request 
+            # headers, the route is traced with a new span
+            parent = extract_context(bottle.request.environ)
 
-            # if parent exists, use parent span
-            if parent:
-                LOGGER.debug('tracing route with existing parent jaeger span')
+            operation_name = f'{request_method.upper()} - {route_name}'
+            previous, capture, slow_request, error = set_active_route(operation_name), get_slow_requests(), None, None
 
-                with TRACER.start_active_span(f'{request_method.upper()} - {route_name}', child_of=parent) as scope:
+            try:
+                with TRACER.start_active_span(operation_name, child_of=parent) as scope:
                     
-                    if user_id:
-                        scope.span.set_tag('user', user_id)
-                        
-                    scope.span.set_tag(opentracing.ext.tags.HTTP_METHOD, bottle.request.method)
-                    scope.span.set_tag(opentracing.ext.tags.HTTP_URL, bottle.request.path)
-                        
-                    result = func(*args, **kwargs)
+                    # track requests of routes with a latency threshold
+                    if capture is not None:
+                        slow_request = capture.begin(scope.span, scope.span.start_time)
                     
-                    # set common tags such as success, http code etc
-                    set_common_tags(scope.span, result)
-
-            # else start new span
-            else:
-                LOGGER.debug('tracing route with new jaeger span')
-
-                # create span and evaluate function
-                with TRACER.start_active_span(f'{request_method.upper()} - {route_name}') as scope:
+                    # skip tag work entirely for spans that are not sampled
+                    if not scope.span.is_sampled():
+                        return func(*args, **kwargs)
+                    
+                    # user ID from header if present
+                    user_id = bottle.request.headers.get('X-Authenticated-Userid', None)
                     
                     if user_id:
                         scope.span.set_tag('user', user_id)
                         
-                    scope.span.set_tag(opentracing.ext.tags.HTTP_METHOD, bottle.request.method)
-                    scope.span.set_tag(opentracing.ext.tags.HTTP_URL, bottle.request.path)
-
+                    scope.span.set_tag(tags.HTTP_METHOD, request_method)
+                    scope.span.set_tag(tags.HTTP_URL, bottle.request.path)
+                        
                     result = func(*args, **kwargs)
                     
                     # set common tags such as success, http code etc
                     set_common_tags(scope.span, result)
+            except Exception as err:
+                error = err
+                raise
+            finally:
+                reset_active_route(previous)
+                
+                if slow_request is not None:
+                    finish_slow_request(capture, slow_request, request_method, error)
 
             return result
         return wrapper
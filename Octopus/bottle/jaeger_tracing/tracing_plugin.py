@@ -19,18 +19,25 @@ class JaegerTracing:
     """Bottle plugin for API Tracing. All tracing is done via the 
     opentracing standard with a Backend Jaeger Service to 
     collect and aggregate the traces. Note that
-    the Tracing Plugin should be applied last to ensure
-    that all routes that have been added by other plugins
-    are traced
+    the Tracing Plugin should be installed before the
+    Prometheus Plugin, which means that the latency of a
+    request is measured within its span, latency
+    observations carry the trace ID as an exemplar and
+    resource usage is set as tags of the span
     
     Arguments:
         jaeger_config: dict containing jaeger_host, jaeger_port,
             service name and module name variables
+        instrument_routes: bool if False, routes are not wrapped in
+            the tracing decorator. Used by the PlatformMetrics plugin,
+            which applies its own wrapper
     """
     
-    def __init__(self, jaeger_config: dict = {}):
+    def __init__(self, jaeger_config: dict = {}, instrument_routes: bool = True):
         
         config.set_jaeger_config(jaeger_config)
+        
+        self.instrument_routes = instrument_routes
     
     def setup(self, app: bottle.Bottle):
         """
@@ -67,4 +74,8 @@ class JaegerTracing:
 
         route_name = context['rule']
         
-        return tracing.trace(route_name)(callback) if config.ENABLE_JAEGER_TRACING else callback
+        # internal routes such as /metrics are not traced
+        if context['config'].get('octopus_internal'):
+            return callback
+        
+        return tracing.trace(route_name)(callback) if config.ENABLE_JAEGER_TRACING and self.instrument_routes else callback
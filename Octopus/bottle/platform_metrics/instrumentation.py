@@ -0,0 +1,189 @@
+"""Module containing the fused wrapper applied by the PlatformMetrics plugin.
+Stacking the JaegerTracing and Prometheus wrappers adds up to four frames
+to each request, each of which reads the request through bottle's
+thread-local proxies and takes its own timestamps. The fused wrapper
+reads the request once and takes a single pair of timestamps, which are
+shared by the span and the request metrics. Metric children are bound to
+the route when the callback is wrapped"""
+
+import logging
+import time
+
+import bottle
+
+from Octopus.tracing import tags
+
+LOGGER = logging.getLogger('octopus.bottle.platform_metrics')
+
+# result keys set as tags on sampled spans (see tracing.common_tags)
+COMMON_TAGS = ['success', 'http_code', 'internal_code', 'message', 'msg']
+
+
+def instrument_route(func: object, route: str, trace: bool = True, metrics: list = []) -> object:
+    """Function used to wrap a route callback in the fused
+    tracing and metrics wrapper. Requests are traced in the
+    same way as tracing.trace(), and the metrics given in the
+    metrics list are recorded in the same series as the
+    prometheus_metrics wrappers
+
+    Arguments:
+        func: callback function for API route
+        route: str route rule
+        trace: bool trace requests in jaeger spans
+        metrics: list of metrics to record. Supported metrics are
+            ['latency', 'request_count', 'processing_requests', 'resource_usage',
+            'latency_quantiles']
+
+    Returns:
+        wrapped callback function
+    """
+
+    proxy = in_progress = latency = exemplars = count = resources = quantiles = None
+
+    if trace:
+        from Octopus.bottle.jaeger_tracing import tracing
+
+        proxy = tracing.TRACER
+        set_active_route, reset_active_route = tracing.set_active_route, tracing.reset_active_route
+        get_slow_requests, finish_slow_request = tracing.get_slow_requests, tracing.finish_slow_request
+        extract_context = tracing.extract_context
+
+    if metrics:
+        import Octopus.bottle.prometheus.prometheus_config as prometheus_config
+
+        from Octopus.bottle.prometheus import prometheus_metrics
+
+        service = prometheus_config.PROMETHEUS_CONFIG.service_name
+
+        if 'processing_requests' in metrics:
+            in_progress = prometheus_metrics.IN_PROGRESS.labels(service=service)
+
+        if 'latency' in metrics:
+            latency = prometheus_metrics.get_request_latency().labels(endpoint=route, service=service)
+            exemplars = prometheus_metrics.get_exemplar_limiter(latency)
+
+        if 'request_count' in metrics:
+            count = prometheus_metrics.bind_request_counter(route)
+
+        if 'latency_quantiles' in metrics:
+            quantiles = prometheus_metrics.get_request_quantiles().labels(endpoint=route, service=service)
+
+        if 'resource_usage' in metrics:
+            import Octopus.bottle.prometheus.prometheus_resources as prometheus_resources
+
+            sampler = prometheus_metrics.get_allocation_sampler()
+            cpu_time = prometheus_metrics.get_cpu_time().labels(endpoint=route, service=service)
+            allocated = prometheus_metrics.get_allocated_bytes().labels(endpoint=route, service=service)
+
+            resources = prometheus_resources.ResourceUsage
+
+    def wrapper(*args: tuple, **kwargs: dict):
+
+        environ = bottle.request.environ
+        request_method, span, usage, slow_request, error = environ['REQUEST_METHOD'], None, None, None, None
+
+        if in_progress is not None:
+            in_progress.inc()
+
+        # durations are measured with the monotonic counter. wall clock time is only used
+        # to timestamp spans, which jaeger expects in seconds since the epoch
+        start, timer = time.time(), time.perf_counter()
+
+        try:
+            if resources is not None:
+                usage = resources(sampler)
+                usage.start()
+
+            if proxy is None:
+                result = func(*args, **kwargs)
+            else:
+                tracer = proxy.get()
+
+                # extract parent span. if no parent span is present in the request
+                # headers, the route is traced with a new span
+                parent = extract_context(environ)
+                span = tracer.start_span(f'{request_method.upper()} - {route}', child_of=parent, start_time=start)
+
+                # track requests of routes with a latency threshold
+                capture = get_slow_requests()
+
+                if capture is not None:
+                    slow_request = capture.begin(span, start)
+
+                previous = set_active_route(span.operation_name)
+
+                try:
+                    with tracer.scope_manager.activate(span, finish_on_close=False):
+                        result = call_traced(span, func, args, kwargs, request_method, environ)
+                finally:
+                    reset_active_route(previous)
+
+            if count is not None:
+                count(request_method, environ.get('HTTP_X_AUTHENTICATED_USERID', 'none'), bottle.response.status_line)
+
+            return result
+
+        except Exception as err:
+            error = err
+            raise
+
+        finally:
+            elapsed = time.perf_counter() - timer
+            end = start + elapsed
+
+            if usage is not None:
+                usage.stop()
+
+                cpu_time.observe(usage.cpu_time)
+
+                if usage.allocated is not None:
+                    allocated.observe(usage.allocated)
+
+                usage.set_tags(span)
+
+            if span is not None:
+                span.finish(finish_time=end)
+
+            if slow_request is not None:
+                finish_slow_request(capture, slow_request, request_method, error, end=end)
+
+            if latency is not None:
+                # attach the trace ID of sampled spans as an exemplar if due
+                if exemplars is not None and span is not None and span.is_sampled() and exemplars.is_due(elapsed):
+                    latency.observe(elapsed, {'trace_id': f'{span.trace_id:x}'})
+                else:
+                    latency.observe(elapsed)
+
+            if quantiles is not None:
+                quantiles.observe(elapsed)
+
+            if in_progress is not None:
+                in_progress.dec()
+
+    return wrapper
+
+def call_traced(span: object, func: object, args: tuple, kwargs: dict, request_method: str, environ: dict) -> object:
+    """Function used to execute a callback within an active
+    span. Tags are set in the same way as tracing.trace(), and
+    all tag work is skipped for spans that are not sampled"""
+
+    if not span.is_sampled():
+        return func(*args, **kwargs)
+
+    user_id = environ.get('HTTP_X_AUTHENTICATED_USERID')
+
+    if user_id:
+        span.set_tag('user', user_id)
+
+    span.set_tag(tags.HTTP_METHOD, request_method)
+    span.set_tag(tags.HTTP_URL, bottle.request.path)
+
+    result = func(*args, **kwargs)
+
+    # set common tags such as success, http code etc
+    if isinstance(result, dict):
+        for key, val in result.items():
+            if key.lower() in COMMON_TAGS:
+                span.set_tag(key, val)
+
+    return result
@@ -31,6 +31,8 @@ class PlatformMetrics:
     def __init__(self, prometheus_config: dict = {}, jaeger_config: dict = {}):
         
         self._prometheus_config, self._jaeger_config = prometheus_config, jaeger_config
+        
+        self._trace, self._metrics = False, []
     
     def setup(self, app: bottle.Bottle):
         """
@@ -39,7 +41,9 @@ class PlatformMetrics:
         setup function is used to ensure that the
         PlatformMetrics plugin has not already been applied
         and then applies both the JaegerTracing and Prometheus
-        plugins
+        plugins. Note that the plugins are installed without 
+        wrapping routes, since routes are wrapped by the fused
+        wrapper of the PlatformMetrics plugin
 
         Arguments:
             app: instance of bottle.Bottle to apply plugin to
@@ -60,19 +64,26 @@ class PlatformMetrics:
             from Octopus.bottle.jaeger_tracing import tracing_plugin
             
             LOGGER.info('adding Jaeger Tracing plugin to bottle application')
-            app.install(tracing_plugin.JaegerTracing(self._jaeger_config))
+            app.install(tracing_plugin.JaegerTracing(self._jaeger_config, instrument_routes=False))
+            
+            self._trace = True
             
         if ENABLE_PROMETHEUS_METRICS:
             from Octopus.bottle.prometheus import prometheus_plugin
             
             LOGGER.info('adding Prometheus Metric plugin to bottle application')
-            app.install(prometheus_plugin.Prometheus(self._prometheus_config))
+            app.install(prometheus_plugin.Prometheus(self._prometheus_config, instrument_routes=False))
+            
+            from Octopus.bottle.prometheus import prometheus_config
+            
+            self._metrics = prometheus_config.PROMETHEUS_CONFIG.metrics
             
     def apply(self, callback: object, context: bottle.Route):
-        """Function used to wrap callbacks. Note that the 
-        callback wrapping is handled by the JaegerTracing
-        and Prometheus plugins, not the PlatformMetrics
-        plugin
+        """Function used to wrap callbacks in a single fused
+        wrapper, which traces the request and records the
+        configured prometheus metrics. Request attributes are
+        read once, and the span and metrics share a single 
+        timing measurement
         
         Arguments:
             callback: callback function for API route
@@ -83,4 +94,10 @@ class PlatformMetrics:
             callback function wrapped in tracing decorator
         """
         
-        return callback
\ No newline at end of file
+        # internal routes such as /metrics are not instrumented
+        if (not self._trace and not self._metrics) or context['config'].get('octopus_internal'):
+            return callback
+        
+        from Octopus.bottle.platform_metrics import instrumentation
+        
+        return instrumentation.instrument_route(callback, context['rule'], trace=self._trace, metrics=self._metrics)
@@ -0,0 +1,123 @@
+"""Module containing the limiter used to bound the number of time series
+created by the request metrics. Each labelled metric is wrapped in a
+CardinalityLimiter, which caches the children of the metric and caps the
+number of distinct label sets. Once the cap is reached, new label sets are
+recorded in a single overflow series, and series that have not been used
+for the configured expiry are removed from the registry"""
+
+import collections
+import logging
+import threading
+import time
+import warnings
+
+LOGGER = logging.getLogger('octopus.bottle.prometheus')
+
+# label value used by the overflow series of a metric
+OVERFLOW_VALUE = 'overflow'
+
+
+class CardinalityLimiter:
+    """Wrapper used to limit the number of series created
+    by a labelled prometheus metric. Children are kept in
+    least recently used order, which means that idle series
+    can be expired without scanning all series. Preserved
+    labels keep their value in the overflow series, while
+    all other labels are set to OVERFLOW_VALUE. Note that in
+    multiprocessing mode, expired series are only removed
+    from memory and remain in the metric files until the
+    process exits
+
+    Arguments:
+        metric: labelled prometheus metric
+        max_series: int maximum number of series. 0 disables the limit
+        expiry: float seconds after which idle series are removed.
+            0 disables expiry
+        preserved_labels: list of label names kept in the overflow series
+    """
+
+    def __init__(self, metric: object, max_series: int = 1000, expiry: float = 0, preserved_labels: list = []):
+
+        self.metric = metric
+        self.max_series = max_series
+        self.expiry = expiry
+
+        self._labelnames = tuple(metric._labelnames)
+        self._preserved = [name in preserved_labels for name in self._labelnames]
+
+        self._series = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+        self._next_sweep = time.monotonic() + expiry
+        self._overflowed = False
+
+    def labels(self, **labels: dict) -> object:
+        """Function used to retrieve the child of the metric
+        for a set of labels. The overflow child is returned if
+        the maximum number of series has been reached
+
+        Arguments:
+            labels: dict label values keyed by label name
+
+        Returns:
+            child of prometheus metric
+        """
+
+        key = tuple(str(labels[name]) for name in self._labelnames)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._series.get(key)
+
+            if entry is not None:
+                entry[1] = now
+                self._series.move_to_end(key)
+            else:
+                if self.expiry and now >= self._next_sweep:
+                    self._expire(now)
+
+                if self.max_series and len(self._series) >= self.max_series:
+                    key = self._get_overflow_key(key)
+                    entry = self._series.get(key)
+
+                if entry is None:
+                    entry = self._series[key] = [self.metric.labels(*key), now]
+                else:
+                    entry[1] = now
+                    self._series.move_to_end(key)
+
+            return entry[0]
+
+    def _get_overflow_key(self, key: tuple) -> tuple:
+        """Function used to map a set of label values onto
+        the overflow series"""
+
+        if not self._overflowed:
+            LOGGER.warning('metric %s reached maximum of %s series. recording new series as overflow', self.metric._name, self.max_series)
+            self._overflowed = True
+
+        return tuple(value if preserved else OVERFLOW_VALUE for value, preserved in zip(key, self._preserved))
+
+    def _expire(self, now: float):
+        """Function used to remove series that have been idle
+        for longer than the expiry. Series are ordered by last
+        use, so the sweep stops at the first active series"""
+
+        self._next_sweep = now + self.expiry
+
+        while self._series:
+            key, (_, last_used) = next(iter(self._series.items()))
+
+            if now - last_used < self.expiry:
+                break
+
+            del self._series[key]
+
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore')
+                self.metric.remove(*key)
+
+            LOGGER.debug('removed idle series %s of metric %s', key, self.metric._name)
+
+    def __len__(self) -> int:
+        return len(self._series)
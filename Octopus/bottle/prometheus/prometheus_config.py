@@ -13,6 +13,24 @@ LOGGER = logging.getLogger('octopus.bottle.prometheus')
 ENABLE_PROMETHEUS_METRICS = os.environ.get('ENABLE_PROMETHEUS_METRICS', 'false').lower() in ['true', 't']
 PROMETHEUS_MULTIPROC_DIR = os.environ.get('prometheus_multiproc_dir', None)
 PROMETHEUS_METRICS = os.environ.get('PROMETHEUS_METRICS', None)
+PROMETHEUS_SCRAPE_CACHE_TTL = os.environ.get('PROMETHEUS_SCRAPE_CACHE_TTL', None)
+PROMETHEUS_MAX_SERIES = os.environ.get('PROMETHEUS_MAX_SERIES', None)
+PROMETHEUS_SERIES_EXPIRY = os.environ.get('PROMETHEUS_SERIES_EXPIRY', None)
+PROMETHEUS_LATENCY_BUCKETS = os.environ.get('PROMETHEUS_LATENCY_BUCKETS', None)
+PROMETHEUS_METRICS_CACHE_TTL = os.environ.get('PROMETHEUS_METRICS_CACHE_TTL', None)
+PROMETHEUS_ENABLE_GZIP = os.environ.get('PROMETHEUS_ENABLE_GZIP', None)
+PROMETHEUS_ENABLE_OPENMETRICS = os.environ.get('PROMETHEUS_ENABLE_OPENMETRICS', None)
+PROMETHEUS_METRICS_HOST = os.environ.get('PROMETHEUS_METRICS_HOST', None)
+PROMETHEUS_ENABLE_EXEMPLARS = os.environ.get('PROMETHEUS_ENABLE_EXEMPLARS', None)
+PROMETHEUS_EXEMPLAR_INTERVAL = os.environ.get('PROMETHEUS_EXEMPLAR_INTERVAL', None)
+PROMETHEUS_METRICS_PORT = os.environ.get('PROMETHEUS_METRICS_PORT', None)
+PROMETHEUS_METRICS_RETRY_INTERVAL = os.environ.get('PROMETHEUS_METRICS_RETRY_INTERVAL', None)
+PROMETHEUS_ALLOCATION_SAMPLE_RATE = os.environ.get('PROMETHEUS_ALLOCATION_SAMPLE_RATE', None)
+PROMETHEUS_ENABLE_PROFILER = os.environ.get('PROMETHEUS_ENABLE_PROFILER', None)
+PROMETHEUS_PROFILER_INTERVAL = os.environ.get('PROMETHEUS_PROFILER_INTERVAL', None)
+PROMETHEUS_MAX_PROFILE_SECONDS = os.environ.get('PROMETHEUS_MAX_PROFILE_SECONDS', None)
+PROMETHEUS_LATENCY_QUANTILES = os.environ.get('PROMETHEUS_LATENCY_QUANTILES', None)
+PROMETHEUS_QUANTILE_ACCURACY = os.environ.get('PROMETHEUS_QUANTILE_ACCURACY', None)
 
 SERVICE_NAME = os.environ.get('SERVICE_NAME', None)
 
@@ -27,13 +45,64 @@ class PrometheusConfig(pydantic.BaseModel):
     Arguments:
         service_name: str name of service 
         metrics: list metrics list to deliver. Currently supported
-            metrics are ['latency', 'request_count', 'processing_requests']
+            metrics are ['latency', 'request_count', 'processing_requests',
+            'resource_usage', 'latency_quantiles']
+        scrape_cache_ttl: float number of seconds merged metrics are cached
+            for in multiprocessing mode
+        max_series: int maximum number of series per request metric. New
+            series are recorded in an overflow series once reached
+        series_expiry: float seconds after which idle series are removed.
+            0 disables expiry
+        latency_buckets: list of upper bounds of the request latency
+            histogram buckets in seconds
+        metrics_cache_ttl: float number of seconds the rendered output of 
+            the /metrics route is cached for. 0 disables caching
+        enable_gzip: bool compress /metrics responses for scrapers accepting gzip
+        enable_openmetrics: bool serve the OpenMetrics format to scrapers
+            requesting it in the Accept header
+        metrics_host: str host the side listener is bound to
+        metrics_port: int port of the side listener. If set, metrics are
+            served from a separate listener instead of an application route
+        metrics_retry_interval: float number of seconds between attempts of
+            workers to bind a metrics port bound by another worker. 0
+            disables retries
+        enable_exemplars: bool attach the trace ID of the active span to
+            latency observations as OpenMetrics exemplars
+        exemplar_interval: float minimum number of seconds between exemplars
+            of a single histogram bucket
+        allocation_sample_rate: float fraction of requests whose allocations
+            are traced with tracemalloc by the resource_usage metric. 0
+            disables allocation sampling
+        enable_profiler: bool serve the sampling profiler on the
+            /debug/profile route
+        profiler_interval: float number of seconds between stack samples
+        max_profile_seconds: float maximum duration of a single profile
+        latency_quantiles: list of quantiles exported by the latency_quantiles metric
+        quantile_accuracy: float relative accuracy of the latency quantiles
     """
     
     service_name: str
     enable_prometheus_auth: bool = False
     prometheus_auth_token: str = ''
     metrics: typing.List[str] = ['latency', 'request_count', 'processing_requests']
+    scrape_cache_ttl: float = 0
+    max_series: int = 1000
+    series_expiry: float = 0
+    latency_buckets: typing.List[float] = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+    metrics_cache_ttl: float = 0
+    enable_gzip: bool = True
+    enable_openmetrics: bool = True
+    metrics_host: str = '0.0.0.0'
+    metrics_port: typing.Optional[int] = None
+    metrics_retry_interval: float = 10.0
+    enable_exemplars: bool = True
+    exemplar_interval: float = 1.0
+    allocation_sample_rate: float = 0
+    enable_profiler: bool = False
+    profiler_interval: float = 0.01
+    max_profile_seconds: float = 60
+    latency_quantiles: typing.List[float] = [0.5, 0.9, 0.99]
+    quantile_accuracy: float = 0.01
     
 PROMETHEUS_CONFIG = None
 
@@ -65,6 +134,78 @@ def set_prometheus_config(prometheus_config: dict):
         LOGGER.debug('prometheus_metrics set in environment variables. using %s', PROMETHEUS_METRICS.split(','))
         prometheus_config['metrics'] = PROMETHEUS_METRICS.split(',')
         
+    if PROMETHEUS_SCRAPE_CACHE_TTL is not None:
+        LOGGER.debug('prometheus_scrape_cache_ttl set in environment variables. using %s', PROMETHEUS_SCRAPE_CACHE_TTL)
+        prometheus_config['scrape_cache_ttl'] = PROMETHEUS_SCRAPE_CACHE_TTL
+        
+    if PROMETHEUS_MAX_SERIES is not None:
+        LOGGER.debug('prometheus_max_series set in environment variables. using %s', PROMETHEUS_MAX_SERIES)
+        prometheus_config['max_series'] = PROMETHEUS_MAX_SERIES
+        
+    if PROMETHEUS_SERIES_EXPIRY is not None:
+        LOGGER.debug('prometheus_series_expiry set in environment variables. using %s', PROMETHEUS_SERIES_EXPIRY)
+        prometheus_config['series_expiry'] = PROMETHEUS_SERIES_EXPIRY
+        
+    if PROMETHEUS_LATENCY_BUCKETS is not None:
+        LOGGER.debug('prometheus_latency_buckets set in environment variables. using %s', PROMETHEUS_LATENCY_BUCKETS.split(','))
+        prometheus_config['latency_buckets'] = PROMETHEUS_LATENCY_BUCKETS.split(',')
+        
+    if PROMETHEUS_METRICS_CACHE_TTL is not None:
+        LOGGER.debug('prometheus_metrics_cache_ttl set in environment variables. using %s', PROMETHEUS_METRICS_CACHE_TTL)
+        prometheus_config['metrics_cache_ttl'] = PROMETHEUS_METRICS_CACHE_TTL
+        
+    if PROMETHEUS_ENABLE_GZIP is not None:
+        LOGGER.debug('prometheus_enable_gzip set in environment variables. using %s', PROMETHEUS_ENABLE_GZIP)
+        prometheus_config['enable_gzip'] = PROMETHEUS_ENABLE_GZIP
+        
+    if PROMETHEUS_ENABLE_OPENMETRICS is not None:
+        LOGGER.debug('prometheus_enable_openmetrics set in environment variables. using %s', PROMETHEUS_ENABLE_OPENMETRICS)
+        prometheus_config['enable_openmetrics'] = PROMETHEUS_ENABLE_OPENMETRICS
+        
+    if PROMETHEUS_METRICS_HOST is not None:
+        LOGGER.debug('prometheus_metrics_host set in environment variables. using %s', PROMETHEUS_METRICS_HOST)
+        prometheus_config['metrics_host'] = PROMETHEUS_METRICS_HOST
+        
+    if PROMETHEUS_METRICS_PORT is not None:
+        LOGGER.debug('prometheus_metrics_port set in environment variables. using %s', PROMETHEUS_METRICS_PORT)
+        prometheus_config['metrics_port'] = PROMETHEUS_METRICS_PORT
+        
+    if PROMETHEUS_METRICS_RETRY_INTERVAL is not None:
+        LOGGER.debug('prometheus_metrics_retry_interval set in environment variables. using %s', PROMETHEUS_METRICS_RETRY_INTERVAL)
+        prometheus_config['metrics_retry_interval'] = PROMETHEUS_METRICS_RETRY_INTERVAL
+        
+    if PROMETHEUS_ENABLE_EXEMPLARS is not None:
+        LOGGER.debug('prometheus_enable_exemplars set in environment variables. using %s', PROMETHEUS_ENABLE_EXEMPLARS)
+        prometheus_config['enable_exemplars'] = PROMETHEUS_ENABLE_EXEMPLARS
+        
+    if PROMETHEUS_EXEMPLAR_INTERVAL is not None:
+        LOGGER.debug('prometheus_exemplar_interval set in environment variables. using %s', PROMETHEUS_EXEMPLAR_INTERVAL)
+        prometheus_config['exemplar_interval'] = PROMETHEUS_EXEMPLAR_INTERVAL
+        
+    if PROMETHEUS_ALLOCATION_SAMPLE_RATE is not None:
+        LOGGER.debug('prometheus_allocation_sample_rate set in environment variables. using %s', PROMETHEUS_ALLOCATION_SAMPLE_RATE)
+        prometheus_config['allocation_sample_rate'] = PROMETHEUS_ALLOCATION_SAMPLE_RATE
+        
+    if PROMETHEUS_ENABLE_PROFILER is not None:
+        LOGGER.debug('prometheus_enable_profiler set in environment variables. using %s', PROMETHEUS_ENABLE_PROFILER)
+        prometheus_config['enable_profiler'] = PROMETHEUS_ENABLE_PROFILER
+        
+    if PROMETHEUS_PROFILER_INTERVAL is not None:
+        LOGGER.debug('prometheus_profiler_interval set in environment variables. using %s', PROMETHEUS_PROFILER_INTERVAL)
+        prometheus_config['profiler_interval'] = PROMETHEUS_PROFILER_INTERVAL
+        
+    if PROMETHEUS_MAX_PROFILE_SECONDS is not None:
+        LOGGER.debug('prometheus_max_profile_seconds set in environment variables. using %s', PROMETHEUS_MAX_PROFILE_SECONDS)
+        prometheus_config['max_profile_seconds'] = PROMETHEUS_MAX_PROFILE_SECONDS
+        
+    if PROMETHEUS_LATENCY_QUANTILES is not None:
+        LOGGER.debug('prometheus_latency_quantiles set in environment variables. using %s', PROMETHEUS_LATENCY_QUANTILES.split(','))
+        prometheus_config['latency_quantiles'] = PROMETHEUS_LATENCY_QUANTILES.split(',')
+        
+    if PROMETHEUS_QUANTILE_ACCURACY is not None:
+        LOGGER.debug('prometheus_quantile_accuracy set in environment variables. using %s', PROMETHEUS_QUANTILE_ACCURACY)
+        prometheus_config['quantile_accuracy'] = PROMETHEUS_QUANTILE_ACCURACY
+        
     LOGGER.info('overriding default prometheus tracing configuration with %s', prometheus_config)
             
     try:
@@ -74,6 +215,18 @@ def set_prometheus_config(prometheus_config: dict):
         if PROMETHEUS_CONFIG.enable_prometheus_auth and not PROMETHEUS_CONFIG.prometheus_auth_token:
             raise exceptions.PrometheusConfigurationException('prometheus authorization enabled but token not provided')
         
+        # raise exception if latency buckets are empty or not in sorted order
+        if not PROMETHEUS_CONFIG.latency_buckets or PROMETHEUS_CONFIG.latency_buckets != sorted(PROMETHEUS_CONFIG.latency_buckets):
+            raise exceptions.PrometheusConfigurationException('latency buckets must be a non-empty list in sorted order')
+        
+        # raise exception if allocation sample rate is not a fraction
+        if not 0 <= PROMETHEUS_CONFIG.allocation_sample_rate <= 1:
+            raise exceptions.PrometheusConfigurationException('allocation sample rate must be between 0 and 1')
+        
+        # raise exception if latency quantiles or their accuracy are not fractions
+        if any(not 0 <= quantile <= 1 for quantile in PROMETHEUS_CONFIG.latency_quantiles) or not 0 < PROMETHEUS_CONFIG.quantile_accuracy < 1:
+            raise exceptions.PrometheusConfigurationException('latency quantiles must be between 0 and 1 and quantile accuracy between 0 and 1 (exclusive)')
+        
     except pydantic.ValidationError as err:
         LOGGER.exception(err.json())
         
@@ -0,0 +1,169 @@
+"""Module containing the renderer used to serve the /metrics route. Rendering
+the full registry on each scrape is expensive for large registries, and
+several prometheus replicas often scrape the same worker within a short
+interval. The MetricsRenderer caches the rendered output of each format for
+a configurable TTL, compresses responses for clients that accept gzip and
+returns 304 responses to clients that already hold the current output. The
+format (prometheus text or OpenMetrics) is negotiated from the Accept header.
+The renderer is independent of bottle, and returns the status, headers and
+body of a response"""
+
+import functools
+import gzip
+import hashlib
+import logging
+import threading
+import time
+
+from prometheus_client import exposition
+
+LOGGER = logging.getLogger('octopus.bottle.prometheus')
+
+
+@functools.lru_cache(maxsize=64)
+def accepts_gzip(accept_encoding: str) -> bool:
+    """Function used to determine if an Accept-Encoding
+    header accepts gzip. Codings with a quality value of
+    0 are refused, and an explicit gzip entry takes
+    precedence over the '*' wildcard
+
+    Arguments:
+        accept_encoding: str value of Accept-Encoding header
+
+    Returns:
+        bool True if gzip is accepted
+    """
+
+    qualities = {}
+
+    for item in accept_encoding.split(','):
+        coding, _, params = item.partition(';')
+        quality = 1.0
+
+        for param in params.split(';'):
+            key, _, value = param.partition('=')
+
+            if key.strip().lower() == 'q':
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+
+        qualities[coding.strip().lower()] = quality
+
+    quality = qualities.get('gzip', qualities.get('x-gzip', qualities.get('*', 0.0)))
+
+    return quality > 0
+
+
+class RenderedMetrics:
+    """Rendered output of a registry in a single format.
+    The compressed body is created on first use
+
+    Arguments:
+        body: bytes rendered metrics
+        content_type: str content type of rendered metrics
+        expires: float monotonic time at which the output expires
+    """
+
+    __slots__ = ['body', 'content_type', 'etag', 'expires', '_compressed']
+
+    def __init__(self, body: bytes, content_type: str, expires: float):
+
+        self.body = body
+        self.content_type = content_type
+        self.etag = '"' + hashlib.blake2b(body, digest_size=16).hexdigest() + '"'
+        self.expires = expires
+
+        self._compressed = None
+
+    @property
+    def compressed(self) -> bytes:
+
+        if self._compressed is None:
+            self._compressed = gzip.compress(self.body, compresslevel=6)
+
+        return self._compressed
+
+
+class MetricsRenderer:
+    """Renderer used to expose the metrics of a registry.
+    Output is cached per content type for the given TTL
+
+    Arguments:
+        registry: registry to render
+        ttl: float number of seconds rendered output is cached for.
+            0 disables caching
+        enable_gzip: bool compress output for clients accepting gzip
+        enable_openmetrics: bool negotiate the OpenMetrics format
+            from the Accept header
+    """
+
+    def __init__(self, registry: object, ttl: float = 0, enable_gzip: bool = True, enable_openmetrics: bool = True):
+
+        self.registry = registry
+        self.ttl = ttl
+        self.enable_gzip = enable_gzip
+        self.enable_openmetrics = enable_openmetrics
+
+        self._cache = {}
+        self._lock = threading.Lock()
+
+    def get_output(self, accept: str = None) -> RenderedMetrics:
+        """Function used to retrieve the rendered output of the
+        format negotiated from an Accept header. Output is only
+        rendered once per TTL, even for concurrent scrapes
+
+        Arguments:
+            accept: str value of Accept header
+
+        Returns:
+            RenderedMetrics instance
+        """
+
+        encoder, content_type = exposition.choose_encoder(accept if self.enable_openmetrics else None)
+
+        output = self._cache.get(content_type)
+
+        if output is not None and time.monotonic() < output.expires:
+            return output
+
+        with self._lock:
+            output = self._cache.get(content_type)
+
+            if output is None or time.monotonic() >= output.expires:
+                LOGGER.debug('rendering metrics with content type %s', content_type)
+
+                body = encoder(self.registry)
+                output = RenderedMetrics(body, content_type, time.monotonic() + self.ttl)
+
+                if self.ttl:
+                    self._cache[content_type] = output
+
+        return output
+
+    def render(self, accept: str = None, accept_encoding: str = None, if_none_match: str = None) -> tuple:
+        """Function used to render a response to a scrape
+
+        Arguments:
+            accept: str value of Accept header
+            accept_encoding: str value of Accept-Encoding header
+            if_none_match: str value of If-None-Match header
+
+        Returns:
+            tuple of (int status, dict headers, bytes body)
+        """
+
+        output = self.get_output(accept)
+
+        headers = {'Content-Type': output.content_type, 'ETag': output.etag, 'Vary': 'Accept, Accept-Encoding'}
+
+        if if_none_match and output.etag in [tag.strip() for tag in if_none_match.split(',')]:
+            return 304, headers, b''
+
+        if self.enable_gzip and accept_encoding and accepts_gzip(accept_encoding):
+            headers['Content-Encoding'] = 'gzip'
+
+            return 200, headers, output.compressed
+
+        return 200, headers, output.body
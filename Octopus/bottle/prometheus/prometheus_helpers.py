@@ -1,6 +1,7 @@
 """Module containing a series of helper functions used by the
 prometheus server metrics module"""
 
+import hmac
 import logging 
 
 import Octopus.bottle.prometheus.prometheus_config as config
@@ -12,13 +13,20 @@ def parse_auth_token(token: str) -> str:
     """Helper function used to parse authentication
     token sent by prometheus server from /metrics route"""
     
-    if not token.startswith('Bearer '):
+    if not token or not token.startswith('Bearer '):
         return None
     
-    return token.split('Bearer ')[1]
+    return token[len('Bearer '):]
     
 def is_authenticated_user(token: str) -> bool:
     """Helper function used to determine if a 
-    user has access to the /metrics route"""
+    user has access to the /metrics route. Tokens
+    are compared in constant time to avoid leaking
+    the configured token through response timings"""
     
-    return config.PROMETHEUS_CONFIG.prometheus_auth_token == parse_auth_token(token)
\ No newline at end of file
+    token = parse_auth_token(token)
+    
+    if token is None or not config.PROMETHEUS_CONFIG.prometheus_auth_token:
+        return False
+    
+    return hmac.compare_digest(config.PROMETHEUS_CONFIG.prometheus_auth_token.encode(), token.encode())
\ No newline at end of file
@@ -0,0 +1,263 @@
+"""Module containing the histogram used to measure request latency. The
+prometheus_client Histogram scans its buckets linearly and takes a separate
+lock for the sum and each bucket on every observation. The LatencyHistogram
+stores the bucket counts of each child in a single array, which is updated
+with a binary search under one lock. The histogram is exported as a regular
+prometheus histogram, which means that buckets can be aggregated across
+routes, workers and pods. Note that the values of the LatencyHistogram are
+held in memory, and the prometheus_client Histogram is used in
+multiprocessing mode instead. Buckets can carry OpenMetrics exemplars,
+which link a bucket to a representative trace. Exemplar capture is rate
+limited per bucket by the ExemplarLimiter"""
+
+import array
+import bisect
+import threading
+import time
+
+from contextlib import contextmanager
+
+import prometheus_client
+
+from prometheus_client.metrics_core import HistogramMetricFamily
+from prometheus_client.samples import Exemplar
+from prometheus_client.utils import floatToGoString
+
+INF = float('inf')
+
+DEFAULT_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0]
+
+
+def prepare_buckets(buckets: list) -> list:
+    """Function used to validate a list of bucket upper
+    bounds. The +Inf bucket is appended if missing
+
+    Arguments:
+        buckets: list of bucket upper bounds
+
+    Returns:
+        list of float bucket upper bounds
+    """
+
+    buckets = [float(bucket) for bucket in buckets]
+
+    if buckets != sorted(buckets):
+        raise ValueError('histogram buckets must be in sorted order')
+
+    if not buckets or buckets[-1] != INF:
+        buckets.append(INF)
+
+    if len(buckets) < 2:
+        raise ValueError('histogram requires at least one finite bucket')
+
+    return buckets
+
+
+class ExemplarLimiter:
+    """Rate limiter used to limit the capture of exemplars.
+    Each bucket accepts at most one exemplar per interval,
+    which means that the exemplars of rare slow buckets are
+    not crowded out by frequent fast requests
+
+    Arguments:
+        buckets: list of bucket upper bounds
+        interval: float minimum number of seconds between
+            exemplars of a single bucket
+    """
+
+    __slots__ = ['_upper_bounds', '_next', 'interval']
+
+    def __init__(self, buckets: list, interval: float = 1.0):
+
+        self._upper_bounds = prepare_buckets(buckets)
+        self._next = [0.0] * len(self._upper_bounds)
+
+        self.interval = interval
+
+    def is_due(self, amount: float) -> bool:
+        """Function used to determine if an exemplar should
+        be captured for an observation. Note that the check
+        reserves the slot of the bucket
+
+        Arguments:
+            amount: float observed value
+
+        Returns:
+            bool True if an exemplar should be captured
+        """
+
+        index = bisect.bisect_left(self._upper_bounds, amount)
+        now = time.monotonic()
+
+        if now < self._next[index]:
+            return False
+
+        self._next[index] = now + self.interval
+
+        return True
+
+
+class HistogramChild:
+    """Single labelled series of a LatencyHistogram. Bucket
+    counts are stored non-cumulatively in an array
+
+    Arguments:
+        upper_bounds: list of bucket upper bounds including +Inf
+    """
+
+    __slots__ = ['_upper_bounds', '_counts', '_sum', '_exemplars', '_lock', '__weakref__']
+
+    def __init__(self, upper_bounds: list):
+
+        self._upper_bounds = upper_bounds
+        self._counts = array.array('Q', [0] * len(upper_bounds))
+        self._sum = 0.0
+        self._exemplars = [None] * len(upper_bounds)
+        self._lock = threading.Lock()
+
+    def observe(self, amount: float, exemplar: dict = None):
+        """Function used to record a single observation
+
+        Arguments:
+            amount: float observed value
+            exemplar: optional dict of exemplar labels i.e. trace_id
+        """
+
+        index = bisect.bisect_left(self._upper_bounds, amount)
+
+        with self._lock:
+            self._counts[index] += 1
+            self._sum += amount
+
+            if exemplar:
+                self._exemplars[index] = Exemplar(exemplar, amount, time.time())
+
+    @contextmanager
+    def time(self):
+        """Context manager used to observe the duration
+        of a block in seconds"""
+
+        start = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    def get(self) -> tuple:
+        """Function used to retrieve a snapshot of the
+        cumulative bucket counts and the sum of the child
+
+        Returns:
+            tuple of (list of (upper bound, cumulative count[, exemplar]), sum)
+        """
+
+        with self._lock:
+            counts, exemplars, total = list(self._counts), list(self._exemplars), self._sum
+
+        buckets, cumulative = [], 0
+
+        for bound, count, exemplar in zip(self._upper_bounds, counts, exemplars):
+            cumulative += count
+
+            if exemplar is None:
+                buckets.append((floatToGoString(bound), cumulative))
+            else:
+                buckets.append((floatToGoString(bound), cumulative, exemplar))
+
+        return buckets, total
+
+
+class LatencyHistogram:
+    """Labelled histogram collector used in place of the
+    prometheus_client Histogram in single process mode. The
+    collector exposes the labels() and remove() interface
+    used by the request metric wrappers
+
+    Arguments:
+        name: str name of metric
+        documentation: str help text of metric
+        labelnames: list of label names
+        buckets: list of bucket upper bounds
+        registry: registry to register collector with
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: list, buckets: list = DEFAULT_BUCKETS,
+                 registry: object = prometheus_client.REGISTRY):
+
+        self._name = name
+        self._documentation = documentation
+        self._labelnames = tuple(labelnames)
+        self._upper_bounds = prepare_buckets(buckets)
+
+        self._children = {}
+        self._lock = threading.Lock()
+
+        if registry is not None:
+            registry.register(self)
+
+    def labels(self, *labelvalues: tuple, **labelkwargs: dict) -> HistogramChild:
+        """Function used to retrieve the child of a set of
+        label values, given either positionally or by name
+
+        Returns:
+            HistogramChild of label values
+        """
+
+        if labelkwargs:
+            labelvalues = tuple(labelkwargs[name] for name in self._labelnames)
+
+        if len(labelvalues) != len(self._labelnames):
+            raise ValueError(f'incorrect label count for histogram {self._name}')
+
+        key = tuple(str(value) for value in labelvalues)
+        child = self._children.get(key)
+
+        if child is None:
+            with self._lock:
+                child = self._children.setdefault(key, HistogramChild(self._upper_bounds))
+
+        return child
+
+    def remove(self, *labelvalues: tuple):
+        """Function used to remove the child of a set of label values"""
+
+        with self._lock:
+            self._children.pop(tuple(str(value) for value in labelvalues), None)
+
+    def describe(self) -> list:
+        return [HistogramMetricFamily(self._name, self._documentation, labels=self._labelnames)]
+
+    def collect(self) -> list:
+
+        metric = HistogramMetricFamily(self._name, self._documentation, labels=self._labelnames)
+
+        with self._lock:
+            children = list(self._children.items())
+
+        for labelvalues, child in children:
+            buckets, total = child.get()
+            metric.add_metric(list(labelvalues), buckets, total)
+
+        return [metric]
+
+def get_histogram(name: str, documentation: str, labelnames: list, buckets: list, multiprocess: bool) -> object:
+    """Function used to create a latency histogram. The
+    prometheus_client Histogram is used in multiprocessing
+    mode, since its values are written to the shared files
+
+    Arguments:
+        name: str name of metric
+        documentation: str help text of metric
+        labelnames: list of label names
+        buckets: list of bucket upper bounds
+        multiprocess: bool multiprocessing mode enabled
+
+    Returns:
+        LatencyHistogram or prometheus_client.Histogram
+    """
+
+    if multiprocess:
+        return prometheus_client.Histogram(name, documentation, labelnames, buckets=prepare_buckets(buckets))
+
+    return LatencyHistogram(name, documentation, labelnames, buckets=buckets)
@@ -1,15 +1,25 @@
 """Module containing metrics from prometheus server"""
 
+import json
 import logging 
+import threading
 import time 
+import urllib.parse
+import weakref
 
 import bottle 
 
 import prometheus_client
-from prometheus_client import multiprocess
 
+import Octopus.bottle.prometheus.prometheus_cardinality as prometheus_cardinality
 import Octopus.bottle.prometheus.prometheus_config as config
+import Octopus.bottle.prometheus.prometheus_exposition as prometheus_exposition
 import Octopus.bottle.prometheus.prometheus_helpers as prometheus_helpers
+import Octopus.bottle.prometheus.prometheus_histogram as prometheus_histogram
+import Octopus.bottle.prometheus.prometheus_multiprocess as prometheus_multiprocess
+import Octopus.bottle.prometheus.prometheus_profiler as prometheus_profiler
+import Octopus.bottle.prometheus.prometheus_quantiles as prometheus_quantiles
+import Octopus.bottle.prometheus.prometheus_resources as prometheus_resources
 
 LOGGER = logging.getLogger('octopus.bottle.prometheus')
 
@@ -22,7 +32,9 @@ def get_prometheus_registry():
     registry is created in Multiprocessing mode if the 
     PROMETHEUS_MULTIPROC_DIR is set in the environment variables.
     Note that this requires the directory to be created on the 
-    host
+    host. In multiprocessing mode, merged metrics are cached for
+    the configured scrape_cache_ttl, and quantile sketches are
+    merged from the sketch files of all processes
     
     Returns:
         Prometheus CollectorRegistry object used to store metrics
@@ -34,7 +46,12 @@ def get_prometheus_registry():
         # create global metric registry and convert to multiprocess registry
         registry = prometheus_client.CollectorRegistry()
         
-        multiprocess.MultiProcessCollector(registry)
+        ttl = config.PROMETHEUS_CONFIG.scrape_cache_ttl if config.PROMETHEUS_CONFIG is not None else 0
+        
+        prometheus_multiprocess.CachedMultiProcessCollector(registry, path=config.PROMETHEUS_MULTIPROC_DIR, ttl=ttl)
+        
+        # quantile sketches of all processes are merged at scrape time
+        prometheus_quantiles.QuantileCollector(registry, path=config.PROMETHEUS_MULTIPROC_DIR)
     else:
         LOGGER.warning('multiprocessing directory not set, using default metrics registry. pre-forked and multiprocessing servers will not gather metrics correctly')
         
@@ -58,13 +75,376 @@ class PrometheusRegistryProxy:
     
 REGISTRY = PrometheusRegistryProxy()
 
+RENDERER = None
+
+def get_metrics_renderer() -> prometheus_exposition.MetricsRenderer:
+    """Function used to retrieve the renderer of the /metrics
+    route. The renderer is created on first use with the
+    settings of the plugin config"""
+    
+    global RENDERER
+    
+    if RENDERER is None:
+        RENDERER = prometheus_exposition.MetricsRenderer(REGISTRY, ttl=config.PROMETHEUS_CONFIG.metrics_cache_ttl,
+                                                         enable_gzip=config.PROMETHEUS_CONFIG.enable_gzip,
+                                                         enable_openmetrics=config.PROMETHEUS_CONFIG.enable_openmetrics)
+    return RENDERER
+
+#####################################################
+# Define code used to link latency metrics to traces
+#####################################################
+
+EXEMPLAR_LIMITERS = weakref.WeakKeyDictionary()
+
+def get_exemplar_limiter(child: object) -> prometheus_histogram.ExemplarLimiter:
+    """Function used to retrieve the exemplar limiter of a
+    latency histogram child. None is returned if exemplars
+    are disabled or in multiprocessing mode, which does not
+    support exemplars
+
+    Arguments:
+        child: child of the latency histogram
+
+    Returns:
+        ExemplarLimiter of child or None
+    """
+
+    if not config.PROMETHEUS_CONFIG.enable_exemplars or config.PROMETHEUS_MULTIPROC_DIR is not None:
+        return None
+
+    limiter = EXEMPLAR_LIMITERS.get(child)
+
+    if limiter is None:
+        limiter = EXEMPLAR_LIMITERS.setdefault(child, prometheus_histogram.ExemplarLimiter(config.PROMETHEUS_CONFIG.latency_buckets,
+                                                                                         interval=config.PROMETHEUS_CONFIG.exemplar_interval))
+    return limiter
+
+def get_trace_exemplar() -> dict:
+    """Function used to create an exemplar from the span of
+    the active scope. None is returned if no span is active
+    or if the span is not sampled, since unsampled traces
+    are not sent to the jaeger backend
+
+    Returns:
+        dict containing trace_id or None
+    """
+
+    from Octopus.bottle.jaeger_tracing import tracing
+
+    scope = tracing.get_active_scope()
+
+    if scope is None or not scope.span.is_sampled():
+        return None
+
+    return {'trace_id': f'{scope.span.trace_id:x}'}
+
+def observe_latency(child: object, exemplars: prometheus_histogram.ExemplarLimiter, elapsed: float):
+    """Function used to observe a request latency. The trace
+    ID of the active span is attached as an exemplar if the
+    exemplar of the bucket is due. The slot of the bucket is
+    only reserved by requests with a sampled span, which means
+    that unsampled requests do not crowd out exemplars
+
+    Arguments:
+        child: child of the latency histogram
+        exemplars: ExemplarLimiter of child or None
+        elapsed: float request latency in seconds
+    """
+
+    exemplar = get_trace_exemplar() if exemplars is not None else None
+
+    if exemplar is not None and exemplars.is_due(elapsed):
+        child.observe(elapsed, exemplar)
+    else:
+        child.observe(elapsed)
+
 ###########################################
 # Define code used to wrap bottle callbacks
 ###########################################
 
 IN_PROGRESS = prometheus_client.Gauge('inprogress_requests', 'number of requests currently being processed', ['service'], multiprocess_mode='livesum')
 REQUEST_COUNT = prometheus_client.Counter('http_requests_total', 'total number of incoming requests', ['method', 'endpoint', 'service', 'user', 'http_code'])
-REQUEST_LATENCY = prometheus_client.Summary('http_request_latency', 'request latency', ['endpoint', 'service'])
+RESPONSE_BYTES = prometheus_client.Counter('http_response_bytes_total', 'total number of bytes sent in response bodies', ['endpoint', 'service'])
+
+# latency histograms are created lazily, since the buckets are set in the plugin config
+HISTOGRAMS = {}
+HISTOGRAMS_LOCK = threading.Lock()
+
+# labels that keep their values in the overflow series of each metric
+PRESERVED_LABELS = ['method', 'service', 'http_code']
+
+# maximum number of children cached on a single bound route
+MAX_BOUND_CHILDREN = 1000
+
+LIMITERS = {}
+
+def get_limiter(metric: object) -> prometheus_cardinality.CardinalityLimiter:
+    """Function used to retrieve the cardinality limiter of a
+    metric. Limiters are created lazily from the plugin config,
+    since the config is only set once the plugin is created
+
+    Arguments:
+        metric: labelled prometheus metric
+
+    Returns:
+        CardinalityLimiter wrapping metric
+    """
+
+    limiter = LIMITERS.get(metric)
+
+    if limiter is None:
+        limiter = LIMITERS.setdefault(metric, prometheus_cardinality.CardinalityLimiter(metric, max_series=config.PROMETHEUS_CONFIG.max_series,
+                                                                                        expiry=config.PROMETHEUS_CONFIG.series_expiry,
+                                                                                        preserved_labels=PRESERVED_LABELS))
+    return limiter
+
+def get_latency_histogram(name: str, documentation: str, buckets: list = None) -> object:
+    """Function used to retrieve a latency histogram labelled
+    by endpoint and service. Histograms are created on first
+    use with the buckets set in the plugin config, unless
+    buckets are given
+
+    Arguments:
+        name: str name of metric
+        documentation: str help text of metric
+        buckets: optional list of bucket upper bounds
+
+    Returns:
+        latency histogram labelled by endpoint and service
+    """
+
+    histogram = HISTOGRAMS.get(name)
+
+    if histogram is None:
+        with HISTOGRAMS_LOCK:
+            histogram = HISTOGRAMS.get(name)
+
+            if histogram is None:
+                histogram = HISTOGRAMS[name] = prometheus_histogram.get_histogram(name, documentation, ['endpoint', 'service'],
+                                                                                  buckets=buckets or config.PROMETHEUS_CONFIG.latency_buckets,
+                                                                                  multiprocess=config.PROMETHEUS_MULTIPROC_DIR is not None)
+    return histogram
+
+def get_request_latency() -> object:
+    """Function used to retrieve the request latency histogram"""
+
+    return get_latency_histogram('http_request_latency', 'request latency in seconds')
+
+def get_time_to_first_byte() -> object:
+    """Function used to retrieve the histogram of the time
+    until the first byte of the response body is sent"""
+
+    return get_latency_histogram('http_request_time_to_first_byte', 'time to first byte of response body in seconds')
+
+QUANTILES = None
+
+def get_request_quantiles() -> prometheus_quantiles.Quantile:
+    """Function used to retrieve the request latency quantiles.
+    The metric is created on first use with the quantiles and
+    accuracy set in the plugin config"""
+
+    global QUANTILES
+
+    if QUANTILES is None:
+        with HISTOGRAMS_LOCK:
+            if QUANTILES is None:
+                QUANTILES = prometheus_quantiles.Quantile('http_request_latency_quantiles', 'quantiles of request latency in seconds', ['endpoint', 'service'],
+                                                          quantiles=config.PROMETHEUS_CONFIG.latency_quantiles,
+                                                          relative_accuracy=config.PROMETHEUS_CONFIG.quantile_accuracy,
+                                                          path=config.PROMETHEUS_MULTIPROC_DIR)
+    return QUANTILES
+
+def get_cpu_time() -> object:
+    """Function used to retrieve the histogram of the CPU
+    time spent by the handling thread on each request"""
+
+    return get_latency_histogram('http_request_cpu_seconds', 'CPU time of request in seconds')
+
+def get_allocated_bytes() -> object:
+    """Function used to retrieve the histogram of the peak
+    number of bytes allocated by sampled requests"""
+
+    return get_latency_histogram('http_request_allocated_bytes', 'peak bytes allocated by sampled requests',
+                                 buckets=prometheus_resources.DEFAULT_BYTE_BUCKETS)
+
+SAMPLER = None
+
+def get_allocation_sampler() -> prometheus_resources.AllocationSampler:
+    """Function used to retrieve the allocation sampler. The
+    sampler is created on first use with the allocation_sample_rate
+    set in the plugin config"""
+
+    global SAMPLER
+
+    if SAMPLER is None:
+        SAMPLER = prometheus_resources.AllocationSampler(config.PROMETHEUS_CONFIG.allocation_sample_rate)
+
+    return SAMPLER
+
+def record_resource_usage(usage: prometheus_resources.ResourceUsage, cpu_time: object, allocated: object):
+    """Function used to record the resources used by a request.
+    The resources are set as tags of the active span if present,
+    which requires the tracing plugin to be installed first
+
+    Arguments:
+        usage: ResourceUsage of request
+        cpu_time: child of the CPU time histogram
+        allocated: child of the allocated bytes histogram
+    """
+
+    cpu_time.observe(usage.cpu_time)
+
+    if usage.allocated is not None:
+        allocated.observe(usage.allocated)
+
+    from Octopus.bottle.jaeger_tracing import tracing
+
+    scope = tracing.get_active_scope()
+
+    if scope is not None:
+        usage.set_tags(scope.span)
+
+def check_authorization(environ: dict) -> tuple:
+    """Function used to check the authorization token of
+    a request to the /metrics or debug routes if enabled
+    in the config settings
+    
+    Arguments:
+        environ: dict WSGI environment of request
+    
+    Returns:
+        None if authorized, else tuple of (int status, dict headers, bytes body)
+    """
+    
+    if not config.PROMETHEUS_CONFIG.enable_prometheus_auth:
+        return None
+    
+    LOGGER.debug('received request to %s route. checking authorization token', environ.get('PATH_INFO'))
+    
+    if prometheus_helpers.is_authenticated_user(environ.get('HTTP_AUTHORIZATION')):
+        return None
+    
+    LOGGER.warning('received unauthorized request to %s route', environ.get('PATH_INFO'))
+    
+    return 401, {'Content-Type': 'application/json'}, json.dumps({'http_code': 401, 'message': 'unauthorized'}).encode()
+
+def render_metrics(environ: dict) -> tuple:
+    """Handler function used to render the metrics of the 
+    global Prometheus registry for a scrape. The handler is
+    independent of bottle, and is used by both the /metrics 
+    route and the side listener. Rendered metrics are cached 
+    for the configured metrics_cache_ttl, compressed if the 
+    scraper accepts gzip and served in the format negotiated 
+    from the Accept header
+    
+    Arguments:
+        environ: dict WSGI environment of scrape
+    
+    Returns:
+        tuple of (int status, dict headers, bytes body)
+    """
+    
+    unauthorized = check_authorization(environ)
+    
+    if unauthorized is not None:
+        return unauthorized
+    
+    return get_metrics_renderer().render(environ.get('HTTP_ACCEPT'), environ.get('HTTP_ACCEPT_ENCODING'), environ.get('HTTP_IF_NONE_MATCH'))
+
+def render_profile(environ: dict) -> tuple:
+    """Handler function used to profile the application on
+    the /debug/profile route (see prometheus_profiler). The
+    route is protected by the same token as /metrics
+    
+    Arguments:
+        environ: dict WSGI environment of request
+    
+    Returns:
+        tuple of (int status, dict headers, bytes body)
+    """
+    
+    unauthorized = check_authorization(environ)
+    
+    if unauthorized is not None:
+        return unauthorized
+    
+    return prometheus_profiler.render_profile(environ, interval=config.PROMETHEUS_CONFIG.profiler_interval,
+                                              max_seconds=config.PROMETHEUS_CONFIG.max_profile_seconds)
+
+def render_slow_requests(environ: dict) -> tuple:
+    """Handler function used to serve the buffer of slow
+    requests captured by the trace() wrapper as JSON on
+    the /debug/slow_requests route. The route is protected
+    by the same token as /metrics
+    
+    Arguments:
+        environ: dict WSGI environment of request
+    
+    Returns:
+        tuple of (int status, dict headers, bytes body)
+    """
+    
+    unauthorized = check_authorization(environ)
+    
+    if unauthorized is not None:
+        return unauthorized
+    
+    from Octopus.bottle.jaeger_tracing import tracing
+    
+    capture = tracing.get_slow_requests()
+    
+    if capture is None:
+        return 404, {'Content-Type': 'application/json'}, json.dumps({'http_code': 404, 'message': 'slow request capture is disabled'}).encode()
+    
+    return 200, {'Content-Type': 'application/json'}, capture.buffer.to_json()
+
+def render_traces(environ: dict) -> tuple:
+    """Handler function used to serve the per-operation latency
+    quantiles and the most recent spans of the in-process trace
+    aggregator as JSON on the /debug/traces route. Spans are
+    filtered with the operation and limit query parameters
+    
+    Arguments:
+        environ: dict WSGI environment of request
+    
+    Returns:
+        tuple of (int status, dict headers, bytes body)
+    """
+    
+    unauthorized = check_authorization(environ)
+    
+    if unauthorized is not None:
+        return unauthorized
+    
+    from Octopus.tracing import aggregator
+    
+    if aggregator.AGGREGATOR is None:
+        return 404, {'Content-Type': 'application/json'}, json.dumps({'http_code': 404, 'message': 'trace aggregator is disabled'}).encode()
+    
+    query = urllib.parse.parse_qs(environ.get('QUERY_STRING', ''))
+    
+    try:
+        limit = int(query.get('limit', ['100'])[0])
+    except ValueError:
+        return 400, {'Content-Type': 'application/json'}, json.dumps({'http_code': 400, 'message': 'invalid limit'}).encode()
+    
+    body = {
+        'operations': aggregator.AGGREGATOR.get_operations(),
+        'spans': aggregator.AGGREGATOR.get_spans(limit=limit, operation=query.get('operation', [None])[0])
+    }
+    
+    return 200, {'Content-Type': 'application/json'}, json.dumps(body, default=str).encode()
+
+def set_bottle_response(status: int, headers: dict, body: bytes) -> bytes:
+    """Function used to set the status and headers returned
+    by a handler on the bottle response"""
+    
+    bottle.response.status = status
+    
+    for header, value in headers.items():
+        bottle.response.set_header(header, value)
+    
+    return body
 
 def get_prometheus_metrics():
     """Handler function used to retrieve prometheus metrics
@@ -72,27 +452,81 @@ def get_prometheus_metrics():
     on the /metrics route and are scraped by the prometheus
     server"""
     
-    # check authorization header if specified in config settings
-    if config.PROMETHEUS_CONFIG.enable_prometheus_auth:
-        LOGGER.debug('received request to /metrics route. checking authorization token')
-        
-        token = bottle.request.headers.get('Authorization', None)
-        
-        if not prometheus_helpers.is_authenticated_user(token):
-            LOGGER.warning('received unauthorized request to /metrics route')
-            
-            bottle.response.status = 401
-            
-            return {'http_code': 401, 'message': 'unauthorized'}
-            
-    return prometheus_client.generate_latest(REGISTRY)
+    return set_bottle_response(*render_metrics(bottle.request.environ))
+
+def get_profile():
+    """Handler function used to serve the /debug/profile route"""
+    
+    return set_bottle_response(*render_profile(bottle.request.environ))
+
+def get_slow_requests():
+    """Handler function used to serve the /debug/slow_requests route"""
+    
+    return set_bottle_response(*render_slow_requests(bottle.request.environ))
+
+def get_traces():
+    """Handler function used to serve the /debug/traces route"""
+    
+    return set_bottle_response(*render_traces(bottle.request.environ))
+
+def bind_request_counter(route: str) -> object:
+    """Function used to bind the request counter to a route.
+    The service and route labels are resolved once, and children
+    are cached per (method, user, status) on the route. Note that
+    children are only cached if series expiry is disabled, since
+    cached children bypass the last use tracking of the cardinality
+    limiter
+
+    Arguments:
+        route: str route rule
+
+    Returns:
+        function incrementing the counter for a method, user and status
+    """
+
+    service, limiter = config.PROMETHEUS_CONFIG.service_name, get_limiter(REQUEST_COUNT)
+
+    if config.PROMETHEUS_CONFIG.series_expiry:
+        def count(method: str, user: str, http_code: str):
+            limiter.labels(method=method, endpoint=route, service=service, user=user, http_code=http_code).inc()
+        return count
 
-def prometheus_in_progress_requests(func: object):
+    children, max_children = {}, limiter.max_series or MAX_BOUND_CHILDREN
+
+    def count(method: str, user: str, http_code: str):
+
+        key = (method, user, http_code)
+        child = children.get(key)
+
+        if child is None:
+            child = limiter.labels(method=method, endpoint=route, service=service, user=user, http_code=http_code)
+
+            if len(children) < max_children:
+                children[key] = child
+
+        child.inc()
+    return count
+
+def prometheus_in_progress_requests(func: object, route: str = None):
     """Decorator used to track in progress requests.
     The decorator executes the function in the context
     of the IN_PROGRESS gauge, which increments when
     the function starts and decrements when the function
-    is finished"""
+    is finished. If a route is given, the gauge child is
+    bound once when the callback is wrapped"""
+    
+    if route is not None:
+        child = IN_PROGRESS.labels(service=config.PROMETHEUS_CONFIG.service_name)
+        
+        def bound_wrapper(*args: tuple, **kwargs: dict):
+            
+            child.inc()
+            
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.dec()
+        return bound_wrapper
     
     def wrapper(*args, **kwargs):
         
@@ -102,15 +536,33 @@ def prometheus_in_progress_requests(func: object):
         return result
     return wrapper
     
-def prometheus_request_counter(func: object):
+def prometheus_request_counter(func: object, route: str = None):
     """Decorator used to increment the prometheus
     request counter during each request. This allows
     the request rate to be calculated and aggregated
-    on the prometheus server"""
+    on the prometheus server. Requests are labelled
+    with the route rule (i.e. /items/<id>) if given,
+    and the request path otherwise. If a route is given,
+    the counter is bound to the route once when the callback
+    is wrapped (see bind_request_counter())"""
+    
+    if route is not None:
+        count = bind_request_counter(route)
+        
+        def bound_wrapper(*args: tuple, **kwargs: dict):
+            
+            result = func(*args, **kwargs)
+            
+            environ = bottle.request.environ
+            
+            count(environ['REQUEST_METHOD'], environ.get('HTTP_X_AUTHENTICATED_USERID', 'none'), bottle.response.status_line)
+            
+            return result
+        return bound_wrapper
     
     def wrapper(*args: tuple, **kwargs: dict):
         
-        request_method, route = bottle.request.method, bottle.request.path
+        request_method, endpoint = bottle.request.method, bottle.request.path
         
         result = func(*args, **kwargs)
         
@@ -118,22 +570,117 @@ def prometheus_request_counter(func: object):
         
         http_code = bottle.response.status
         
-        REQUEST_COUNT.labels(method=request_method, endpoint=route, service=config.PROMETHEUS_CONFIG.service_name, user=user, http_code=http_code).inc()
+        get_limiter(REQUEST_COUNT).labels(method=request_method, endpoint=endpoint, service=config.PROMETHEUS_CONFIG.service_name, user=user, http_code=http_code).inc()
         
         return result
     return wrapper
 
-def prometheus_request_latency(func: object):
-    """Decorator used to increment the prometheus
-    request counter during each request. The latency
+def prometheus_request_latency(func: object, route: str = None):
+    """Decorator used to observe the latency of each
+    request in the request latency histogram. The latency
     is measured in seconds for each route, which can 
-    then be aggregated on the prometheus server"""
+    then be aggregated on the prometheus server. If a 
+    route is given, the child of the route is bound once
+    when the callback is wrapped. Bound children are not
+    subject to the cardinality limiter, since the number 
+    of route rules is fixed. Observations carry the trace
+    ID of the active span as an exemplar (see observe_latency())"""
+    
+    if route is not None:
+        child = get_request_latency().labels(endpoint=route, service=config.PROMETHEUS_CONFIG.service_name)
+        exemplars = get_exemplar_limiter(child)
+        
+        def bound_wrapper(*args: tuple, **kwargs: dict):
+            
+            start = time.perf_counter()
+            
+            try:
+                return func(*args, **kwargs)
+            finally:
+                observe_latency(child, exemplars, time.perf_counter() - start)
+        return bound_wrapper
     
     def wrapper(*args: tuple, **kwargs: dict):
         
-        with REQUEST_LATENCY.labels(endpoint=bottle.request.path, service=config.PROMETHEUS_CONFIG.service_name).time():
-            result = func(*args, **kwargs)
+        child = get_limiter(get_request_latency()).labels(endpoint=bottle.request.path, service=config.PROMETHEUS_CONFIG.service_name)
         
-        return result
+        start = time.perf_counter()
+        
+        try:
+            return func(*args, **kwargs)
+        finally:
+            observe_latency(child, get_exemplar_limiter(child), time.perf_counter() - start)
+    return wrapper
+
+def prometheus_resource_usage(func: object, route: str = None):
+    """Decorator used to measure the CPU time and sampled
+    allocations of each request (see prometheus_resources).
+    The resources are recorded in histograms and set as tags
+    of the active span, which requires the JaegerTracing plugin
+    to be installed before the Prometheus plugin. If a route is
+    given, the children of the route are bound once when the
+    callback is wrapped"""
+
+    sampler = get_allocation_sampler()
+
+    if route is not None:
+        cpu_time = get_cpu_time().labels(endpoint=route, service=config.PROMETHEUS_CONFIG.service_name)
+        allocated = get_allocated_bytes().labels(endpoint=route, service=config.PROMETHEUS_CONFIG.service_name)
+
+        def bound_wrapper(*args: tuple, **kwargs: dict):
+
+            usage = prometheus_resources.ResourceUsage(sampler)
+
+            try:
+                with usage:
+                    return func(*args, **kwargs)
+            finally:
+                record_resource_usage(usage, cpu_time, allocated)
+        return bound_wrapper
+
+    def wrapper(*args: tuple, **kwargs: dict):
+
+        cpu_time = get_limiter(get_cpu_time()).labels(endpoint=bottle.request.path, service=config.PROMETHEUS_CONFIG.service_name)
+        allocated = get_limiter(get_allocated_bytes()).labels(endpoint=bottle.request.path, service=config.PROMETHEUS_CONFIG.service_name)
+
+        usage = prometheus_resources.ResourceUsage(sampler)
+
+        try:
+            with usage:
+                return func(*args, **kwargs)
+        finally:
+            record_resource_usage(usage, cpu_time, allocated)
+    return wrapper
+
+def prometheus_request_quantiles(func: object, route: str = None):
+    """Decorator used to observe the latency of each request
+    in the request latency quantiles. In contrast to the latency
+    histogram, quantiles are exact up to the configured relative
+    accuracy and are merged across the processes of pre-forking
+    servers (see prometheus_quantiles). If a route is given, the
+    child of the route is bound once when the callback is wrapped"""
+    
+    if route is not None:
+        child = get_request_quantiles().labels(endpoint=route, service=config.PROMETHEUS_CONFIG.service_name)
+        
+        def bound_wrapper(*args: tuple, **kwargs: dict):
+            
+            start = time.perf_counter()
+            
+            try:
+                return func(*args, **kwargs)
+            finally:
+                child.observe(time.perf_counter() - start)
+        return bound_wrapper
+    
+    def wrapper(*args: tuple, **kwargs: dict):
+        
+        child = get_limiter(get_request_quantiles()).labels(endpoint=bottle.request.path, service=config.PROMETHEUS_CONFIG.service_name)
+        
+        start = time.perf_counter()
+        
+        try:
+            return func(*args, **kwargs)
+        finally:
+            child.observe(time.perf_counter() - start)
     return wrapper
-        
\ No newline at end of file
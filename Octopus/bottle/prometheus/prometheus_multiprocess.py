@@ -0,0 +1,266 @@
+"""Module containing the collector used to serve metrics in prometheus
+multiprocess mode. The default MultiProcessCollector re-reads and parses
+every .db file in the multiprocess directory on each scrape, including the
+files of all workers that have ever run. The CachedMultiProcessCollector
+caches the merged metrics for a short TTL and only re-parses files that
+may have changed since the previous scrape. Files of dead workers are
+compacted into a single archive file per metric type by the child_exit()
+hook, which means that scrape time tracks live workers
+
+    # gunicorn.conf.py
+    from Octopus.bottle.prometheus.prometheus_multiprocess import child_exit
+"""
+
+import fcntl
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+from collections import defaultdict
+from contextlib import contextmanager
+
+from prometheus_client import multiprocess
+from prometheus_client.metrics_core import Metric
+from prometheus_client.mmap_dict import MmapedDict
+
+import Octopus.bottle.prometheus.prometheus_quantiles as prometheus_quantiles
+
+LOGGER = logging.getLogger('octopus.bottle.prometheus')
+
+# metric types whose values are summed across processes and can be archived
+ARCHIVED_TYPES = ['counter', 'histogram', 'summary']
+
+ARCHIVE_NAME = 'archive'
+LOCK_FILE = '.octopus_multiprocess.lock'
+
+
+def get_multiprocess_dir(path: str = None) -> str:
+    """Function used to resolve the prometheus multiprocess
+    directory from the environment variables"""
+
+    return path or os.environ.get('PROMETHEUS_MULTIPROC_DIR', os.environ.get('prometheus_multiproc_dir'))
+
+@contextmanager
+def multiprocess_lock(path: str, exclusive: bool):
+    """Context manager used to lock the multiprocess directory.
+    Scrapes take a shared lock, while the compaction of dead
+    worker files takes an exclusive lock, which ensures that
+    a scrape never sees a file both archived and in place"""
+
+    with open(os.path.join(path, LOCK_FILE), 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def get_file_pid(filename: str) -> str:
+    """Function used to extract the PID (or archive name)
+    from the name of a multiprocess .db file"""
+
+    return os.path.basename(filename).split('_')[-1][:-3]
+
+def is_process_alive(pid: str) -> bool:
+    """Function used to determine if the process that
+    owns a multiprocess file is still running"""
+
+    if not pid.isdigit():
+        return False
+
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+    return True
+
+
+class CachedMultiProcessCollector(multiprocess.MultiProcessCollector):
+    """Multiprocess collector that caches merged metrics for
+    a configurable TTL and parses files incrementally. Parsed
+    samples are reused for files whose inode, mtime and size
+    are unchanged and that can no longer be written to, i.e.
+    the files of dead workers and archive files. Files of live
+    workers are re-read on each scrape, since writes through
+    mmap do not reliably update the mtime of a file, but the
+    JSON metric keys of all files are parsed only once
+
+    Arguments:
+        registry: registry to register collector with
+        path: str path to multiprocess directory
+        ttl: float number of seconds merged metrics are cached for
+    """
+
+    def __init__(self, registry: object, path: str = None, ttl: float = 0):
+
+        super().__init__(registry, path)
+
+        self._ttl = ttl
+        self._lock = threading.Lock()
+
+        self._files = {}
+        self._keys = {}
+
+        self._metrics = None
+        self._expires = 0
+
+    def collect(self):
+
+        if self._ttl and self._metrics is not None and time.monotonic() < self._expires:
+            return self._metrics
+
+        with self._lock:
+            if self._ttl and self._metrics is not None and time.monotonic() < self._expires:
+                return self._metrics
+
+            with multiprocess_lock(self._path, exclusive=False):
+                files = glob.glob(os.path.join(self._path, '*.db'))
+                metrics = self._merge(files)
+
+            self._metrics, self._expires = metrics, time.monotonic() + self._ttl
+
+        return metrics
+
+    def _parse_key(self, key: str) -> tuple:
+
+        value = self._keys.get(key)
+
+        if value is None:
+            metric_name, name, labels, help_text = json.loads(key)
+            value = self._keys[key] = (metric_name, name, tuple(sorted(labels.items())), help_text)
+
+        return value
+
+    def _read_file(self, filename: str) -> list:
+        """Function used to read the samples of a single
+        file. Samples are cached and reused if the file can
+        no longer have changed since it was last read"""
+
+        try:
+            stat = os.stat(filename)
+        except FileNotFoundError:
+            self._files.pop(filename, None)
+            return []
+
+        signature = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        cached = self._files.get(filename)
+
+        if cached is not None and cached[0] == signature and not is_process_alive(get_file_pid(filename)):
+            return cached[1]
+
+        try:
+            values = MmapedDict.read_all_values_from_file(filename)
+        except FileNotFoundError:
+            self._files.pop(filename, None)
+            return []
+
+        samples = [self._parse_key(key) + (value, timestamp) for key, value, timestamp, _ in values]
+
+        self._files[filename] = (signature, samples)
+
+        return samples
+
+    def _merge(self, files: list) -> list:
+        """Function used to merge the samples of all files
+        into accumulated metrics"""
+
+        metrics = {}
+
+        for filename in files:
+            parts = os.path.basename(filename).split('_')
+            typ = parts[0]
+
+            for metric_name, name, labels_key, help_text, value, timestamp in self._read_file(filename):
+                metric = metrics.get(metric_name)
+
+                if metric is None:
+                    metric = metrics[metric_name] = Metric(metric_name, help_text, typ)
+
+                if typ == 'gauge':
+                    metric._multiprocess_mode = parts[1]
+                    metric.add_sample(name, labels_key + (('pid', parts[2][:-3]),), value, timestamp)
+                else:
+                    metric.add_sample(name, labels_key, value)
+
+        # drop cached samples of files that no longer exist
+        for filename in set(self._files) - set(files):
+            del self._files[filename]
+
+        return list(multiprocess.MultiProcessCollector._accumulate_metrics(metrics, True))
+
+def archive_process_files(pid: int, path: str = None):
+    """Function used to compact the counter, histogram and summary
+    files of a dead process into a single archive file per metric
+    type. Values of the process are added to the archive, which is
+    replaced atomically before the files of the process are removed.
+    Quantile sketch files are merged into an archive in the same way
+
+    Arguments:
+        pid: int PID of dead process
+        path: str path to multiprocess directory
+    """
+
+    path = get_multiprocess_dir(path)
+
+    with multiprocess_lock(path, exclusive=True):
+        for typ in ARCHIVED_TYPES:
+            filename = os.path.join(path, f'{typ}_{pid}.db')
+
+            if not os.path.exists(filename):
+                continue
+
+            archive = os.path.join(path, f'{typ}_{ARCHIVE_NAME}.db')
+            values = defaultdict(float)
+
+            for source in [archive, filename]:
+                if os.path.exists(source):
+                    for key, value, _, _ in MmapedDict.read_all_values_from_file(source):
+                        values[key] += value
+
+            # write archive to temporary file and replace existing archive atomically
+            temporary = f'{archive}.{os.getpid()}.tmp'
+            mmaped_dict = MmapedDict(temporary)
+
+            try:
+                for key, value in values.items():
+                    mmaped_dict.write_value(key, value, 0.0)
+            finally:
+                mmaped_dict.close()
+
+            os.replace(temporary, archive)
+            os.remove(filename)
+
+            LOGGER.debug('archived %s metrics of process %s', typ, pid)
+
+        prometheus_quantiles.archive_sketch_file(pid, path)
+
+def mark_process_dead(pid: int, path: str = None):
+    """Function used to clean up the multiprocess files of a
+    dead process. Live gauges of the process are removed, and
+    its counters, histograms, summaries and quantile sketches
+    are archived
+
+    Arguments:
+        pid: int PID of dead process
+        path: str path to multiprocess directory
+    """
+
+    path = get_multiprocess_dir(path)
+
+    if not path:
+        return
+
+    multiprocess.mark_process_dead(pid, path)
+    archive_process_files(pid, path)
+
+def child_exit(server: object, worker: object):
+    """Gunicorn server hook used to clean up the metrics of
+    an exited worker. The hook is called in the master process"""
+
+    mark_process_dead(worker.pid)
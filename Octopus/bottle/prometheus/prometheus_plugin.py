@@ -8,6 +8,7 @@ import typing
 
 import bottle 
 
+import Octopus.bottle.jaeger_tracing.jaeger_config as jaeger_config
 import Octopus.bottle.prometheus.prometheus_config as config
 
 
@@ -19,12 +20,15 @@ if config.ENABLE_PROMETHEUS_METRICS:
     LOGGER.info('applying prometheus metrics to application')
     
     from Octopus.bottle.prometheus import prometheus_metrics
+    from Octopus.bottle.prometheus import prometheus_server
     
     # create mappings used to map config settings to wrappers
     WRAPPER_MAPPINGS = {
         'latency': prometheus_metrics.prometheus_request_latency,
         'request_count': prometheus_metrics.prometheus_request_counter,
-        'processing_requests': prometheus_metrics.prometheus_in_progress_requests
+        'processing_requests': prometheus_metrics.prometheus_in_progress_requests,
+        'resource_usage': prometheus_metrics.prometheus_resource_usage,
+        'latency_quantiles': prometheus_metrics.prometheus_request_quantiles
     }
     
 else:
@@ -38,11 +42,24 @@ class Prometheus:
     Prometheus server to scrape metrics from. It also
     decorates the application routes with a collection
     of metric decorators to measure various performance
-    metrics"""
+    metrics. If a metrics_port is configured, metrics
+    are served from a side listener on that port instead
+    of the /metrics route
     
-    def __init__(self, prometheus_config: dict = {}):
+    Arguments:
+        prometheus_config: dict containing service name and metrics list
+        instrument_routes: bool if False, the plugin only adds the 
+            /metrics route and leaves routes unwrapped. Used by the 
+            PlatformMetrics plugin, which applies its own wrapper
+    """
+    
+    def __init__(self, prometheus_config: dict = {}, instrument_routes: bool = True):
         
         config.set_prometheus_config(prometheus_config)
+        
+        self.instrument_routes = instrument_routes
+        
+        self._server = None
     
     def setup(self, app: bottle.Bottle):
         """
@@ -50,7 +67,8 @@ class Prometheus:
         apply() function has been called. The 
         setup function is used to ensure that the
         Promethes Metric plugin has not already been applied
-        and adds the /metrics route
+        and adds the /metrics route (or starts the side 
+        listener if a metrics_port is configured)
 
         Arguments:
             app: instance of bottle.Bottle to apply plugin to
@@ -64,8 +82,59 @@ class Prometheus:
             if isinstance(plugin, Prometheus):
                 raise RuntimeError('Instance of Promethes Metric Plugin Already Applied to Application')
         
-        # add metrics route to application
-        app.route('/metrics', callback=prometheus_metrics.get_prometheus_metrics)
+        if config.PROMETHEUS_CONFIG.enable_profiler and not config.PROMETHEUS_CONFIG.enable_prometheus_auth:
+            LOGGER.warning('profiler enabled without prometheus authorization. /debug/profile is unprotected')
+        
+        # exemplars and resource tags require the request to be measured within its span, i.e. the
+        # tracing plugin must wrap the prometheus wrappers, which means it must be installed first
+        if self.instrument_routes and jaeger_config.ENABLE_JAEGER_TRACING:
+            from Octopus.bottle.jaeger_tracing.tracing_plugin import JaegerTracing
+            
+            features = []
+            
+            if config.PROMETHEUS_CONFIG.enable_exemplars and 'latency' in config.PROMETHEUS_CONFIG.metrics:
+                features.append('latency exemplars')
+            
+            if 'resource_usage' in config.PROMETHEUS_CONFIG.metrics:
+                features.append('resource usage tags')
+            
+            if features and not any(isinstance(plugin, JaegerTracing) for plugin in app.plugins):
+                LOGGER.warning('JaegerTracing plugin not installed before Prometheus plugin. %s will not be attached', ' and '.join(features))
+        
+        if config.PROMETHEUS_CONFIG.metrics_port is not None:
+            prometheus_server.register_handler('/metrics', prometheus_metrics.render_metrics)
+            
+            if config.PROMETHEUS_CONFIG.enable_profiler:
+                prometheus_server.register_handler('/debug/profile', prometheus_metrics.render_profile)
+            
+            if jaeger_config.ENABLE_JAEGER_TRACING:
+                prometheus_server.register_handler('/debug/slow_requests', prometheus_metrics.render_slow_requests)
+                prometheus_server.register_handler('/debug/traces', prometheus_metrics.render_traces)
+            
+            self._server = prometheus_server.start_server(config.PROMETHEUS_CONFIG.metrics_host, config.PROMETHEUS_CONFIG.metrics_port,
+                                                          retry_interval=config.PROMETHEUS_CONFIG.metrics_retry_interval)
+            return
+        
+        # add metrics route to application. internal routes are not instrumented
+        app.route('/metrics', callback=prometheus_metrics.get_prometheus_metrics, octopus_internal=True)
+        
+        if config.PROMETHEUS_CONFIG.enable_profiler:
+            app.route('/debug/profile', callback=prometheus_metrics.get_profile, octopus_internal=True)
+        
+        # serve slow requests and aggregated spans if tracing is enabled
+        if jaeger_config.ENABLE_JAEGER_TRACING:
+            app.route('/debug/slow_requests', callback=prometheus_metrics.get_slow_requests, octopus_internal=True)
+            app.route('/debug/traces', callback=prometheus_metrics.get_traces, octopus_internal=True)
+        
+    def close(self):
+        """Function called when the plugin is uninstalled
+        or the application is closed. Stops the side
+        listener if running"""
+        
+        if self._server is not None:
+            self._server.shutdown()
+            
+            self._server = None
 
     def apply(self, callback: object, context: bottle.Route):
         """
@@ -73,7 +142,9 @@ class Prometheus:
         various prometheus metric decorator(s). The 
         decorators gather various performance metrics
         which are stored in the global registry for the
-        prometheus server to scrape
+        prometheus server to scrape. Metrics are labelled
+        with the route rule rather than the request path,
+        which bounds the number of series per route
 
         Arguments:
             callback: callback function for API route
@@ -84,7 +155,7 @@ class Prometheus:
             callback function wrapped in Promethes Metric decorator
         """
         
-        if not config.ENABLE_PROMETHEUS_METRICS:
+        if not config.ENABLE_PROMETHEUS_METRICS or not self.instrument_routes or context['config'].get('octopus_internal'):
             return callback
         
         for metric in config.PROMETHEUS_CONFIG.metrics:
@@ -92,7 +163,7 @@ class Prometheus:
             
             if wrapper is not None:
                 LOGGER.debug('applying prometheus metric \'%s\'', metric)
-                callback = wrapper(callback)
+                callback = wrapper(callback, route=context['rule'])
             else:
                 LOGGER.warning('undefined metric mapping \'%s\'', metric)
         
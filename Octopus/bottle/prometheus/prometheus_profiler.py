@@ -0,0 +1,136 @@
+"""Module containing the sampling profiler served on the /debug/profile route.
+The profiler samples the stacks of all threads at a fixed interval with
+sys._current_frames() for the requested number of seconds, which means that
+the profiled application is not instrumented and only pays for the sampling
+itself. Stacks are returned in the collapsed format read by flame graph tools
+(i.e. flamegraph.pl or speedscope), one line per unique stack with its count.
+The root frame of each stack is the operation name of the request span active
+in the sampled thread (see tracing.ACTIVE_ROUTES), or the name of the thread if
+no request is in progress
+
+    curl -H 'Authorization: Bearer <token>' 'localhost:9100/debug/profile?seconds=10' > profile.txt
+    flamegraph.pl profile.txt > profile.svg
+"""
+
+import collections
+import logging
+import os
+import sys
+import threading
+import time
+import urllib.parse
+
+LOGGER = logging.getLogger('octopus.bottle.prometheus')
+
+# only one profile is taken at a time, since concurrent profiles sample the same threads
+PROFILE_LOCK = threading.Lock()
+
+
+def get_frame_label(code: object, labels: dict) -> str:
+    """Function used to create the label of a frame in a
+    collapsed stack. Labels are cached per code object"""
+
+    label = labels.get(code)
+
+    if label is None:
+        name = getattr(code, 'co_qualname', code.co_name)
+        label = labels[code] = f'{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})'.replace(';', ':')
+
+    return label
+
+def sample_stacks(seconds: float, interval: float = 0.01, active_routes: dict = None) -> collections.Counter:
+    """Function used to sample the stacks of all threads
+    except the calling thread
+
+    Arguments:
+        seconds: float number of seconds to sample for
+        interval: float number of seconds between samples
+        active_routes: dict mapping thread idents to the operation
+            name of the active request span
+
+    Returns:
+        collections.Counter of collapsed stacks
+    """
+
+    stacks, labels, own = collections.Counter(), {}, threading.get_ident()
+    active_routes = active_routes if active_routes is not None else {}
+
+    end = time.monotonic() + seconds
+
+    while time.monotonic() < end:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+
+            stack = []
+
+            while frame is not None:
+                stack.append(get_frame_label(frame.f_code, labels))
+                frame = frame.f_back
+
+            root = active_routes.get(ident) or f'thread {names.get(ident, ident)}'
+            stack.append(root.replace(';', ':'))
+
+            stacks[';'.join(reversed(stack))] += 1
+
+        time.sleep(interval)
+
+    return stacks
+
+def format_stacks(stacks: collections.Counter) -> bytes:
+    """Function used to render sampled stacks in the
+    collapsed stack format"""
+
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.most_common()).encode()
+
+def get_active_routes() -> dict:
+    """Function used to retrieve the registry of active
+    routes. An empty registry is returned if tracing is
+    disabled, since routes are registered by the spans"""
+
+    from Octopus.bottle.jaeger_tracing import jaeger_config
+
+    if not jaeger_config.ENABLE_JAEGER_TRACING:
+        return {}
+
+    from Octopus.bottle.jaeger_tracing import tracing
+
+    return tracing.ACTIVE_ROUTES
+
+def render_profile(environ: dict, interval: float = 0.01, max_seconds: float = 60) -> tuple:
+    """Handler function used to profile the application
+    for the number of seconds given in the seconds query
+    parameter (defaults to 5)
+
+    Arguments:
+        environ: dict WSGI environment of request
+        interval: float number of seconds between samples
+        max_seconds: float maximum number of seconds of a profile
+
+    Returns:
+        tuple of (int status, dict headers, bytes body)
+    """
+
+    query = urllib.parse.parse_qs(environ.get('QUERY_STRING', ''))
+
+    try:
+        seconds = float(query.get('seconds', ['5'])[0])
+    except ValueError:
+        seconds = -1
+
+    if not 0 < seconds <= max_seconds:
+        return 400, {'Content-Type': 'text/plain'}, f'seconds must be between 0 and {max_seconds}'.encode()
+
+    if not PROFILE_LOCK.acquire(blocking=False):
+        return 409, {'Content-Type': 'text/plain'}, b'profile already in progress'
+
+    try:
+        LOGGER.info('profiling application for %s seconds', seconds)
+
+        stacks = sample_stacks(seconds, interval=interval, active_routes=get_active_routes())
+    finally:
+        PROFILE_LOCK.release()
+
+    return 200, {'Content-Type': 'text/plain; charset=utf-8'}, format_stacks(stacks)
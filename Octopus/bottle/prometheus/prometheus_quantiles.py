@@ -0,0 +1,555 @@
+"""Module containing the quantile metric used to export per-route latency
+percentiles. The prometheus_client Summary does not compute quantiles, and
+histograms only approximate quantiles within their bucket bounds. The
+Quantile metric records each series in a fixed range DDSketch (see
+Octopus.tracing.sketch), which means that the memory of a series is fixed
+regardless of the number of observations, and that quantiles have a
+guaranteed relative error. The metric is exported as a prometheus summary
+
+In multiprocessing mode, the sketches of each process are stored in a
+memory-mapped file per PID (quantile_<pid>.sketch) in the multiprocess
+directory, which are merged by the QuantileCollector at scrape time. The
+files of dead processes are merged into an archive file by the child_exit()
+hook of the prometheus_multiprocess module. Each record of a file holds a
+JSON key followed by the count, zero count and sum of the series and its
+bucket counts"""
+
+import glob
+import json
+import logging
+import mmap
+import os
+import struct
+import threading
+
+import prometheus_client
+
+from prometheus_client.metrics_core import Metric
+from prometheus_client.utils import floatToGoString
+
+from Octopus.tracing import sketch
+
+LOGGER = logging.getLogger('octopus.bottle.prometheus')
+
+DEFAULT_QUANTILES = [0.5, 0.9, 0.99]
+
+ARCHIVE_NAME = 'archive'
+
+# initial size of a sketch file. files are doubled in size once full
+INITIAL_FILE_SIZE = 1 << 20
+
+# header of a file holding the number of used bytes
+HEADER = struct.Struct('<Q')
+
+# header of a series holding the count, zero count and sum
+SERIES_HEADER = struct.Struct('<QQd')
+
+# sketch parameters of the multiprocess quantiles created by this process,
+# which take precedence over series written with other parameters
+PARAMETERS = {}
+
+
+def get_key(name: str, documentation: str, relative_accuracy: float, quantiles: list, labels: dict) -> str:
+    """Function used to create the key of a series in a sketch file"""
+
+    return json.dumps([name, documentation, relative_accuracy, quantiles, labels], sort_keys=True)
+
+def get_padded_key(key: str) -> bytes:
+    """Function used to encode the key of a record, which is
+    padded so that the values of the record are aligned"""
+
+    encoded = key.encode()
+
+    return encoded + b' ' * (-(len(encoded) + 4) % 8)
+
+SKETCH_SIZES = {}
+
+def get_sketch_size(relative_accuracy: float) -> int:
+    """Function used to retrieve the number of buckets of
+    a sketch with the given relative accuracy"""
+
+    size = SKETCH_SIZES.get(relative_accuracy)
+
+    if size is None:
+        size = SKETCH_SIZES[relative_accuracy] = sketch.DDSketch(relative_accuracy).get_size()
+
+    return size
+
+def iter_records(data: object) -> object:
+    """Generator used to iterate over the records of the
+    contents of a sketch file
+
+    Arguments:
+        data: bytes or mmap of sketch file
+
+    Yields:
+        tuples of (key, position of values, number of buckets)
+    """
+
+    if len(data) < HEADER.size:
+        return
+
+    used, position = HEADER.unpack_from(data, 0)[0], HEADER.size
+
+    while position < used:
+        length = struct.unpack_from('<I', data, position)[0]
+        key = bytes(data[position + 4:position + 4 + length]).decode()
+
+        position += 4 + len(get_padded_key(key))
+        size = get_sketch_size(json.loads(key)[2])
+
+        yield key, position, size
+
+        position += SERIES_HEADER.size + 8 * size
+
+def read_sketch_file(filename: str) -> list:
+    """Function used to read all series of a sketch file.
+    Files are read without the lock of the writing process,
+    which means that the series header may lag behind the
+    buckets. The count is therefore derived from the bucket
+    counts, which keeps quantile ranks within the buckets
+
+    Arguments:
+        filename: str path to sketch file
+
+    Returns:
+        list of tuples of (key, count, zero count, sum, bucket counts)
+    """
+
+    with open(filename, 'rb') as sketch_file:
+        data = sketch_file.read()
+
+    series = []
+
+    for key, position, size in iter_records(data):
+        _, zero_count, total = SERIES_HEADER.unpack_from(data, position)
+        counts = struct.unpack_from(f'<{size}Q', data, position + SERIES_HEADER.size)
+
+        series.append((key, zero_count + sum(counts), zero_count, total, counts))
+
+    return series
+
+
+class SketchFile:
+    """Memory-mapped file holding the sketches of a process.
+    Records are appended once per series, and the number of
+    used bytes is updated after a record has been written,
+    which means that readers never see partial records. The
+    buckets of a series are written before its header
+
+    Arguments:
+        filename: str path to sketch file
+    """
+
+    def __init__(self, filename: str):
+
+        self.filename = filename
+
+        self._file = open(filename, 'a+b')
+        self._lock = threading.Lock()
+
+        if os.fstat(self._file.fileno()).st_size == 0:
+            self._file.truncate(INITIAL_FILE_SIZE)
+
+        self._capacity = os.fstat(self._file.fileno()).st_size
+        self._mmap = mmap.mmap(self._file.fileno(), self._capacity)
+
+        self._used = HEADER.unpack_from(self._mmap, 0)[0] or HEADER.size
+        self._positions = {key: position for key, position, _ in iter_records(self._mmap)}
+
+        if self._used == HEADER.size:
+            HEADER.pack_into(self._mmap, 0, self._used)
+
+    def get_position(self, key: str, size: int) -> int:
+        """Function used to retrieve the position of the
+        values of a series. Records of new series are
+        appended to the file. Must be called with the
+        lock of the file held"""
+
+        position = self._positions.get(key)
+
+        if position is not None:
+            return position
+
+        padded = get_padded_key(key)
+        length = 4 + len(padded) + SERIES_HEADER.size + 8 * size
+
+        while self._used + length > self._capacity:
+            self._capacity *= 2
+
+            self._mmap.close()
+            self._file.truncate(self._capacity)
+            self._mmap = mmap.mmap(self._file.fileno(), self._capacity)
+
+        struct.pack_into(f'<I{len(padded)}s', self._mmap, self._used, len(key.encode()), padded)
+
+        position = self._positions[key] = self._used + 4 + len(padded)
+
+        self._used += length
+        HEADER.pack_into(self._mmap, 0, self._used)
+
+        return position
+
+    def observe(self, key: str, size: int, index: int, amount: float):
+        """Function used to record an observation in the
+        bucket of a series
+
+        Arguments:
+            key: str key of series
+            size: int number of buckets of series
+            index: int bucket index of observation. -1 for zero bucket
+            amount: float observed value
+        """
+
+        with self._lock:
+            position = self.get_position(key, size)
+
+            if index >= 0:
+                offset = position + SERIES_HEADER.size + 8 * index
+                struct.pack_into('<Q', self._mmap, offset, struct.unpack_from('<Q', self._mmap, offset)[0] + 1)
+
+            count, zero_count, total = SERIES_HEADER.unpack_from(self._mmap, position)
+            SERIES_HEADER.pack_into(self._mmap, position, count + 1, zero_count + (index < 0), total + amount)
+
+    def write(self, key: str, values: sketch.DDSketch):
+        """Function used to overwrite the values of a series
+        with the values of a sketch"""
+
+        with self._lock:
+            position = self.get_position(key, len(values.counts))
+
+            struct.pack_into(f'<{len(values.counts)}Q', self._mmap, position + SERIES_HEADER.size, *values.counts)
+            SERIES_HEADER.pack_into(self._mmap, position, values.count, values.zero_count, values.sum)
+
+    def close(self):
+
+        self._mmap.close()
+        self._file.close()
+
+
+SKETCH_FILES = {}
+SKETCH_FILES_LOCK = threading.Lock()
+
+def get_sketch_file(path: str) -> SketchFile:
+    """Function used to retrieve the sketch file of the current
+    process. Forked processes open a file of their own"""
+
+    pid = os.getpid()
+    sketch_file = SKETCH_FILES.get(pid)
+
+    if sketch_file is None:
+        with SKETCH_FILES_LOCK:
+            sketch_file = SKETCH_FILES.get(pid)
+
+            if sketch_file is None:
+                sketch_file = SKETCH_FILES[pid] = SketchFile(os.path.join(path, f'quantile_{pid}.sketch'))
+
+    return sketch_file
+
+
+class QuantileChild:
+    """Single labelled series of a Quantile held in memory"""
+
+    __slots__ = ['_sketch', '_lock']
+
+    def __init__(self, relative_accuracy: float):
+
+        self._sketch = sketch.DDSketch(relative_accuracy)
+        self._lock = threading.Lock()
+
+    def observe(self, amount: float):
+        """Function used to record a single observation"""
+
+        with self._lock:
+            self._sketch.add(amount)
+
+    def get(self) -> sketch.DDSketch:
+        """Function used to retrieve a copy of the sketch"""
+
+        copy = sketch.DDSketch(self._sketch.relative_accuracy)
+
+        with self._lock:
+            copy.merge(self._sketch)
+
+        return copy
+
+
+class MultiProcessQuantileChild:
+    """Single labelled series of a Quantile held in the
+    sketch file of the current process
+
+    Arguments:
+        key: str key of series
+        path: str path to multiprocess directory
+        mapping: DDSketch of the metric used to map observations
+            to bucket indices
+    """
+
+    __slots__ = ['_key', '_path', '_mapping', '_size']
+
+    def __init__(self, key: str, path: str, mapping: sketch.DDSketch):
+
+        self._key = key
+        self._path = path
+        self._mapping = mapping
+        self._size = len(mapping.counts)
+
+    def observe(self, amount: float):
+        """Function used to record a single observation"""
+
+        get_sketch_file(self._path).observe(self._key, self._size, self._mapping.get_index(amount), amount)
+
+
+def add_summary_samples(metric: Metric, labels: dict, values: sketch.DDSketch, quantiles: list):
+    """Function used to add the samples of a sketch to a summary"""
+
+    for quantile in quantiles:
+        value = values.quantile(quantile)
+        metric.add_sample(metric.name, dict(labels, quantile=floatToGoString(quantile)), value if value is not None else float('nan'))
+
+    metric.add_sample(metric.name + '_count', labels, values.count)
+    metric.add_sample(metric.name + '_sum', labels, values.sum)
+
+
+class Quantile:
+    """Labelled metric exporting the quantiles of observed
+    values as a prometheus summary. The metric exposes the
+    labels() and remove() interface used by the request
+    metric wrappers. If a multiprocess directory is given,
+    series are written to the sketch file of the process
+    and collected by the QuantileCollector
+
+    Arguments:
+        name: str name of metric
+        documentation: str help text of metric
+        labelnames: list of label names
+        quantiles: list of exported quantiles
+        relative_accuracy: float relative accuracy of quantiles
+        path: optional str path to multiprocess directory
+        registry: registry to register collector with in single process mode
+    """
+
+    def __init__(self, name: str, documentation: str, labelnames: list, quantiles: list = DEFAULT_QUANTILES,
+                 relative_accuracy: float = sketch.DEFAULT_RELATIVE_ACCURACY, path: str = None,
+                 registry: object = prometheus_client.REGISTRY):
+
+        self._name = name
+        self._documentation = documentation
+        self._labelnames = tuple(labelnames)
+        self._quantiles = [float(quantile) for quantile in quantiles]
+        self._relative_accuracy = relative_accuracy
+        self._path = path
+
+        if any(not 0 <= quantile <= 1 for quantile in self._quantiles):
+            raise ValueError('quantiles must be between 0 and 1')
+
+        self._children = {}
+        self._lock = threading.Lock()
+        self._mapping = None
+
+        if registry is not None and path is None:
+            registry.register(self)
+
+        if path is not None:
+            PARAMETERS[name] = (relative_accuracy, self._quantiles)
+
+    def labels(self, *labelvalues: tuple, **labelkwargs: dict) -> object:
+        """Function used to retrieve the child of a set of
+        label values, given either positionally or by name"""
+
+        if labelkwargs:
+            labelvalues = tuple(labelkwargs[name] for name in self._labelnames)
+
+        if len(labelvalues) != len(self._labelnames):
+            raise ValueError(f'incorrect label count for quantile {self._name}')
+
+        key = tuple(str(value) for value in labelvalues)
+        child = self._children.get(key)
+
+        if child is None:
+            with self._lock:
+                child = self._children.get(key)
+
+                if child is None:
+                    child = self._children[key] = self._create_child(key)
+
+        return child
+
+    def _create_child(self, labelvalues: tuple) -> object:
+
+        if self._path is None:
+            return QuantileChild(self._relative_accuracy)
+
+        key = get_key(self._name, self._documentation, self._relative_accuracy, self._quantiles, dict(zip(self._labelnames, labelvalues)))
+
+        if self._mapping is None:
+            self._mapping = sketch.DDSketch(self._relative_accuracy)
+
+        return MultiProcessQuantileChild(key, self._path, self._mapping)
+
+    def remove(self, *labelvalues: tuple):
+        """Function used to remove the child of a set of label
+        values. Note that series of sketch files are kept"""
+
+        with self._lock:
+            self._children.pop(tuple(str(value) for value in labelvalues), None)
+
+    def describe(self) -> list:
+        return [Metric(self._name, self._documentation, 'summary')]
+
+    def collect(self) -> list:
+
+        metric = Metric(self._name, self._documentation, 'summary')
+
+        with self._lock:
+            children = list(self._children.items())
+
+        for labelvalues, child in children:
+            add_summary_samples(metric, dict(zip(self._labelnames, labelvalues)), child.get(), self._quantiles)
+
+        return [metric]
+
+
+def get_file_rank(filename: str) -> tuple:
+    """Function used to rank a sketch file by recency. Files
+    of processes rank above the archive, and newer files above
+    older files
+
+    Returns:
+        tuple of (bool file of process, float modification time)
+    """
+
+    return not os.path.basename(filename).startswith(f'quantile_{ARCHIVE_NAME}.'), os.path.getmtime(filename)
+
+def merge_sketch_files(files: list, ranks: dict = None) -> dict:
+    """Function used to merge the series of sketch files
+
+    Arguments:
+        files: list of paths to sketch files
+        ranks: optional dict filled with the rank of the most
+            recent file (see get_file_rank) of each series key
+
+    Returns:
+        dict mapping series keys to merged DDSketch
+    """
+
+    merged = {}
+
+    for filename in files:
+        try:
+            series = read_sketch_file(filename)
+            rank = get_file_rank(filename) if ranks is not None else None
+        except FileNotFoundError:
+            continue
+
+        for key, count, zero_count, total, counts in series:
+            if ranks is not None and (key not in ranks or ranks[key] < rank):
+                ranks[key] = rank
+
+            values = merged.get(key)
+
+            if values is None:
+                values = merged[key] = sketch.DDSketch(json.loads(key)[2])
+
+            for index, value in enumerate(counts):
+                if value:
+                    values.counts[index] += value
+
+            values.count += count
+            values.zero_count += zero_count
+            values.sum += total
+
+    return merged
+
+
+class QuantileCollector:
+    """Collector used to merge the sketch files of all
+    processes at scrape time
+
+    Arguments:
+        registry: registry to register collector with
+        path: str path to multiprocess directory
+    """
+
+    def __init__(self, registry: object, path: str):
+
+        self._path = path
+
+        if registry is not None:
+            registry.register(self)
+
+    def collect(self) -> list:
+
+        # imported lazily, since the prometheus_multiprocess module archives sketch files
+        from Octopus.bottle.prometheus.prometheus_multiprocess import multiprocess_lock
+
+        ranks = {}
+
+        with multiprocess_lock(self._path, exclusive=False):
+            merged = merge_sketch_files(glob.glob(os.path.join(self._path, '*.sketch')), ranks)
+
+        selected = {}
+
+        # series written with other sketch parameters (i.e. by a previous deployment) are skipped. the
+        # parameters of the quantiles of this process are preferred, and those of the most recent file otherwise
+        for key in merged:
+            name, _, relative_accuracy, quantiles, labels = json.loads(key)
+
+            series = (name, tuple(sorted(labels.items())))
+            preference = (PARAMETERS.get(name) == (relative_accuracy, quantiles), ranks[key])
+
+            if series in selected:
+                LOGGER.warning('skipping series of %s with conflicting sketch parameters', name)
+
+                if selected[series][0] >= preference:
+                    continue
+
+            selected[series] = (preference, key)
+
+        metrics = {}
+
+        for _, key in selected.values():
+            name, documentation, _, quantiles, labels = json.loads(key)
+            values = merged[key]
+
+            metric = metrics.get(name)
+
+            if metric is None:
+                metric = metrics[name] = Metric(name, documentation, 'summary')
+
+            add_summary_samples(metric, labels, values, quantiles)
+
+        return list(metrics.values())
+
+def archive_sketch_file(pid: int, path: str):
+    """Function used to merge the sketch file of a dead
+    process into the archive file. Must be called with
+    the exclusive multiprocess lock held
+
+    Arguments:
+        pid: int PID of dead process
+        path: str path to multiprocess directory
+    """
+
+    filename = os.path.join(path, f'quantile_{pid}.sketch')
+
+    if not os.path.exists(filename):
+        return
+
+    archive = os.path.join(path, f'quantile_{ARCHIVE_NAME}.sketch')
+    merged = merge_sketch_files([archive, filename])
+
+    # write archive to temporary file and replace existing archive atomically
+    temporary = f'{archive}.{os.getpid()}.tmp'
+    sketch_file = SketchFile(temporary)
+
+    try:
+        for key, values in merged.items():
+            sketch_file.write(key, values)
+    finally:
+        sketch_file.close()
+
+    os.replace(temporary, archive)
+    os.remove(filename)
+
+    LOGGER.debug('archived quantile sketches of process %s', pid)
@@ -0,0 +1,138 @@
+"""Module containing the code used to measure the resources used by a request.
+Wall clock latency does not tell whether a slow route is CPU bound, blocked
+on I/O or allocating heavily. The CPU time of a request is measured with the
+CPU clock of the handling thread, and allocations are measured with tracemalloc
+on a sampled fraction of requests, since tracing allocations slows down every
+allocation made by the process. Note that the CPU clock of a thread includes
+the time of other greenlets on gevent servers, and that tracemalloc traces the
+allocations of all threads, which means that concurrent requests inflate the
+allocations of a sampled request"""
+
+import logging
+import random
+import threading
+import time
+import tracemalloc
+
+LOGGER = logging.getLogger('octopus.bottle.prometheus')
+
+DEFAULT_BYTE_BUCKETS = [1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864]
+
+
+class AllocationSampler:
+    """Sampler used to trace the allocations of a fraction of
+    requests. tracemalloc is only running while a sampled request
+    is in progress, and at most one request is sampled at a time,
+    since the peak of traced memory is shared by all requests.
+    If tracemalloc was started outside of the sampler (i.e. with
+    PYTHONTRACEMALLOC), it is left running
+
+    Arguments:
+        sample_rate: float fraction of requests sampled. 0 disables sampling
+    """
+
+    def __init__(self, sample_rate: float = 0):
+
+        self.sample_rate = sample_rate
+
+        self._lock = threading.Lock()
+        self._started = False
+
+    def start(self) -> int:
+        """Function used to start tracing the allocations of a
+        request if the request is sampled
+
+        Returns:
+            int traced memory at start of request or None if not sampled
+        """
+
+        if not self.sample_rate or random.random() >= self.sample_rate:
+            return None
+
+        # skip sample if another request is currently sampled
+        if not self._lock.acquire(blocking=False):
+            return None
+
+        if not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+
+        tracemalloc.reset_peak()
+
+        return tracemalloc.get_traced_memory()[0]
+
+    def stop(self, start: int) -> int:
+        """Function used to stop tracing the allocations of
+        a sampled request
+
+        Arguments:
+            start: int traced memory at start of request
+
+        Returns:
+            int peak number of bytes allocated during request
+        """
+
+        try:
+            _, peak = tracemalloc.get_traced_memory()
+
+            if self._started:
+                tracemalloc.stop()
+                self._started = False
+        finally:
+            self._lock.release()
+
+        return max(peak - start, 0)
+
+
+class ResourceUsage:
+    """Context manager used to measure the CPU time and
+    sampled allocations of a block. allocated is None if
+    the block was not sampled
+
+    Arguments:
+        sampler: AllocationSampler or None
+    """
+
+    __slots__ = ['cpu_time', 'allocated', '_sampler', '_cpu_start', '_memory_start']
+
+    def __init__(self, sampler: AllocationSampler = None):
+
+        self.cpu_time = 0.0
+        self.allocated = None
+
+        self._sampler = sampler
+
+    def start(self):
+        """Function used to start measuring resources"""
+
+        self._memory_start = self._sampler.start() if self._sampler is not None else None
+        self._cpu_start = time.thread_time()
+
+    def stop(self):
+        """Function used to stop measuring resources"""
+
+        self.cpu_time = time.thread_time() - self._cpu_start
+
+        if self._memory_start is not None:
+            self.allocated = self._sampler.stop(self._memory_start)
+
+    def __enter__(self) -> object:
+
+        self.start()
+
+        return self
+
+    def __exit__(self, *args: tuple):
+        self.stop()
+
+    def set_tags(self, span: object):
+        """Function used to set the measured resources as
+        tags of a span. Unsampled spans are skipped"""
+
+        if span is None or not span.is_sampled():
+            return
+
+        span.set_tag('resource.cpu_time', self.cpu_time)
+
+        if self.allocated is not None:
+            span.set_tag('resource.allocated_bytes', self.allocated)
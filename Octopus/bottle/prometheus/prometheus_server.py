@@ -0,0 +1,190 @@
+"""Module containing the side listener used to serve metrics outside of the
+application. Serving /metrics as an application route means that scrapes
+take request slots from the worker pool of the application. The side
+listener serves registered handlers from a separate thread on its own port.
+Handlers are independent of bottle, take the WSGI environment of a request
+and return the status, headers and body of the response
+
+    prometheus_server.register_handler('/metrics', prometheus_metrics.render_metrics)
+    listener = prometheus_server.start_server('0.0.0.0', 9100)
+
+In a pre-forking server, only one worker can bind the port. The other workers
+retry binding it periodically, which means that the port is taken over by a
+remaining worker once the worker serving it exits (i.e. if it is recycled
+after max_requests)
+"""
+
+import http
+import logging
+import socketserver
+import threading
+
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+LOGGER = logging.getLogger('octopus.bottle.prometheus')
+
+HANDLERS = {}
+
+
+def register_handler(path: str, handler: object):
+    """Function used to register a handler with the side
+    listener. Handlers are called with the WSGI environment
+    of a request and return a tuple of (int status, dict
+    headers, bytes body)
+
+    Arguments:
+        path: str path served by handler
+        handler: function handling requests to path
+    """
+
+    HANDLERS[path] = handler
+
+def application(environ: dict, start_response: object) -> list:
+    """WSGI application used to dispatch requests to the
+    registered handlers"""
+
+    handler = HANDLERS.get(environ.get('PATH_INFO', ''))
+
+    if handler is None:
+        status, headers, body = 404, {'Content-Type': 'text/plain'}, b'not found'
+    else:
+        try:
+            status, headers, body = handler(environ)
+        except Exception:
+            LOGGER.exception('unable to handle request to %s', environ.get('PATH_INFO'))
+
+            status, headers, body = 500, {'Content-Type': 'text/plain'}, b'internal server error'
+
+    start_response(f'{status} {http.HTTPStatus(status).phrase}', list(headers.items()))
+
+    return [body]
+
+
+class ThreadingWSGIServer(socketserver.ThreadingMixIn, WSGIServer):
+    """WSGI server handling each request in a separate
+    thread, which prevents slow scrapers from blocking
+    the listener"""
+
+    daemon_threads = True
+
+
+class QuietRequestHandler(WSGIRequestHandler):
+    """Request handler logging requests at debug level
+    instead of writing them to stderr"""
+
+    def log_message(self, format: str, *args: tuple):
+        LOGGER.debug('side listener: ' + format, *args)
+
+def bind_server(host: str, port: int) -> WSGIServer:
+    """Function used to bind the side listener to a port.
+    None is returned if the port is already bound (i.e. by
+    another worker of a pre-forking server)"""
+
+    try:
+        return make_server(host, port, application, server_class=ThreadingWSGIServer, handler_class=QuietRequestHandler)
+    except OSError as err:
+        LOGGER.debug('unable to bind metrics listener to %s:%s: %s', host, port, err)
+        return None
+
+
+class MetricsListener:
+    """Side listener serving the registered handlers from a
+    daemon thread. If the port cannot be bound, the listener
+    retries binding it every retry_interval seconds
+
+    Arguments:
+        host: str host to bind listener to
+        port: int port to bind listener to
+        retry_interval: float number of seconds between attempts
+            to bind the port. 0 disables retries
+    """
+
+    def __init__(self, host: str, port: int, retry_interval: float = 10.0):
+
+        self.host = host
+        self.port = port
+        self.retry_interval = retry_interval
+
+        self.server = None
+
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def start(self) -> 'MetricsListener':
+        """Function used to bind the port and start serving
+        requests. If the port is already bound, a thread
+        retrying the bind is started instead"""
+
+        if self._serve(bind_server(self.host, self.port)):
+            thread = threading.Thread(target=self.server.serve_forever, name='octopus-metrics-listener', daemon=True)
+            thread.start()
+
+            return self
+
+        if self.retry_interval > 0:
+            LOGGER.warning('metrics listener port %s:%s already bound. retrying every %s seconds', self.host, self.port, self.retry_interval)
+
+            thread = threading.Thread(target=self._retry, name='octopus-metrics-listener', daemon=True)
+            thread.start()
+        else:
+            LOGGER.warning('unable to start metrics listener on %s:%s', self.host, self.port)
+
+        return self
+
+    def _serve(self, server: WSGIServer) -> bool:
+        """Function used to take ownership of a bound server.
+        Servers bound after the listener has been shut down
+        are closed"""
+
+        if server is None:
+            return False
+
+        with self._lock:
+            if self._stopped.is_set():
+                server.server_close()
+                return False
+
+            self.server = server
+
+        LOGGER.info('serving %s on %s:%s', ','.join(HANDLERS), self.host, self.port)
+
+        return True
+
+    def _retry(self):
+        """Function executed by the retry thread. The thread
+        serves requests once the port has been bound"""
+
+        while not self._stopped.wait(self.retry_interval):
+            if self._serve(bind_server(self.host, self.port)):
+                self.server.serve_forever()
+                return
+
+    def shutdown(self):
+        """Function used to stop serving requests and close
+        the port, or to stop retrying to bind it"""
+
+        with self._lock:
+            self._stopped.set()
+            server, self.server = self.server, None
+
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+def start_server(host: str, port: int, retry_interval: float = 10.0) -> MetricsListener:
+    """Function used to start the side listener. If the port
+    is already bound (i.e. by another worker of a pre-forking
+    server), the listener retries binding it every
+    retry_interval seconds
+
+    Arguments:
+        host: str host to bind listener to
+        port: int port to bind listener to
+        retry_interval: float number of seconds between attempts
+            to bind the port. 0 disables retries
+
+    Returns:
+        started MetricsListener
+    """
+
+    return MetricsListener(host, port, retry_interval).start()
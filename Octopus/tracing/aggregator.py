@@ -0,0 +1,214 @@
+"""Module containing the in-process span sink used when running without a
+jaeger agent (i.e. in staging or load tests). The TraceAggregator is a span
+reporter that keeps the most recent spans in a bounded ring buffer and
+maintains a quantile sketch of the durations of each operation, which gives
+per-route latency quantiles without any external service. The aggregator
+is shared by all tracers of the process, and is selected with the span_sink
+setting of the jaeger plugin (or the JAEGER_SPAN_SINK variable)
+
+    'agent'     spans are sent to the jaeger agent (default)
+    'memory'    spans are only kept in the aggregator
+    'both'      spans are sent to the agent and kept in the aggregator
+"""
+
+import collections
+import logging
+import threading
+
+from jaeger_client.reporter import BaseReporter, CompositeReporter
+
+from Octopus.tracing import lifecycle
+from Octopus.tracing import sketch
+from Octopus.tracing.slow_requests import get_tag_values
+
+logger = logging.getLogger('octopus.aggregator')
+
+SPAN_SINKS = ['agent', 'memory', 'both']
+
+# operation name of the series recording operations beyond the limit
+OVERFLOW_OPERATION = 'overflow'
+
+QUANTILES = {'p50': 0.5, 'p90': 0.9, 'p99': 0.99}
+
+
+class OperationStats:
+    """Aggregated durations of a single operation"""
+
+    __slots__ = ['sketch', 'errors', 'max']
+
+    def __init__(self, relative_accuracy: float):
+
+        self.sketch = sketch.DDSketch(relative_accuracy)
+        self.errors = 0
+        self.max = 0.0
+
+
+class TraceAggregator(BaseReporter):
+    """Span reporter used to aggregate spans in process.
+    Operations are keyed by service and operation name. Once
+    max_operations is reached, spans of new operations are
+    recorded under the overflow operation of their service
+
+    Arguments:
+        max_spans: int number of recent spans kept
+        max_operations: int maximum number of aggregated operations
+        relative_accuracy: float relative accuracy of quantiles
+    """
+
+    def __init__(self, max_spans: int = 1000, max_operations: int = 1000, relative_accuracy: float = sketch.DEFAULT_RELATIVE_ACCURACY):
+
+        self.max_operations = max_operations
+        self.relative_accuracy = relative_accuracy
+
+        self._spans = collections.deque(maxlen=max_spans)
+        self._operations = {}
+        self._lock = threading.Lock()
+
+    def report_span(self, span: object):
+
+        duration = (span.end_time or span.start_time) - span.start_time
+        service = span.tracer.service_name
+
+        key = (service, span.operation_name)
+        error = any(tag.key == 'error' and tag.vBool for tag in span.tags)
+
+        with self._lock:
+            self._spans.append((span.trace_id, span.span_id, span.parent_id, service, span.operation_name, span.start_time, duration, error, span.tags))
+
+            stats = self._operations.get(key)
+
+            if stats is None:
+                if len(self._operations) >= self.max_operations:
+                    key = (service, OVERFLOW_OPERATION)
+
+                stats = self._operations.get(key)
+
+                if stats is None:
+                    stats = self._operations[key] = OperationStats(self.relative_accuracy)
+
+            stats.sketch.add(duration)
+            stats.max = max(stats.max, duration)
+
+            if error:
+                stats.errors += 1
+
+    def get_operations(self) -> list:
+        """Function used to retrieve the aggregated durations
+        of all operations, ordered by total duration
+
+        Returns:
+            list of dicts containing count, error count, mean,
+            max and quantiles of each operation
+        """
+
+        with self._lock:
+            operations = [(service, operation, stats.sketch.count, stats.sketch.sum, stats.errors, stats.max,
+                           {name: stats.sketch.quantile(q) for name, q in QUANTILES.items()}) for (service, operation), stats in self._operations.items()]
+
+        operations.sort(key=lambda item: item[3], reverse=True)
+
+        return [{
+            'service': service,
+            'operation': operation,
+            'count': count,
+            'errors': errors,
+            'mean': total / count,
+            'max': maximum,
+            **quantiles
+        } for service, operation, count, total, errors, maximum, quantiles in operations]
+
+    def get_spans(self, limit: int = 100, operation: str = None) -> list:
+        """Function used to retrieve the most recent spans
+
+        Arguments:
+            limit: int maximum number of spans returned
+            operation: optional str operation name to filter by
+
+        Returns:
+            list of dicts describing spans, newest first
+        """
+
+        with self._lock:
+            spans = list(self._spans)
+
+        spans.reverse()
+
+        if operation is not None:
+            spans = [span for span in spans if span[4] == operation]
+
+        return [{
+            'trace_id': f'{trace_id:x}',
+            'span_id': f'{span_id:x}',
+            'parent_id': f'{parent_id:x}' if parent_id else None,
+            'service': service,
+            'operation': operation_name,
+            'start': start,
+            'duration': duration,
+            'error': error,
+            'tags': get_tag_values(tags)
+        } for trace_id, span_id, parent_id, service, operation_name, start, duration, error, tags in spans[:limit]]
+
+    def reset(self):
+        """Function used to clear all spans and operations"""
+
+        with self._lock:
+            self._spans.clear()
+            self._operations.clear()
+
+
+AGGREGATOR = None
+
+def get_aggregator(max_spans: int = 1000) -> TraceAggregator:
+    """Function used to retrieve the aggregator of the process.
+    The aggregator is created on first use, and is shared by
+    all tracers of the process
+
+    Arguments:
+        max_spans: int number of recent spans kept
+
+    Returns:
+        TraceAggregator instance
+    """
+
+    global AGGREGATOR
+
+    if AGGREGATOR is None:
+        AGGREGATOR = TraceAggregator(max_spans=max_spans)
+
+    return AGGREGATOR
+
+@lifecycle.register_after_fork
+def reset_aggregator():
+    """Function used to discard the aggregator inherited from
+    the parent process, which holds the spans of the parent"""
+
+    global AGGREGATOR
+
+    AGGREGATOR = None
+
+def get_span_reporter(span_sink: str, agent_reporter: object, max_spans: int = 1000) -> BaseReporter:
+    """Function used to create the span reporter of a tracer
+    for a span sink. The agent reporter is only created if
+    spans are sent to the agent
+
+    Arguments:
+        span_sink: str one of 'agent', 'memory' or 'both'
+        agent_reporter: function creating the reporter of the agent
+        max_spans: int number of recent spans kept by the aggregator
+
+    Returns:
+        jaeger span reporter
+    """
+
+    if span_sink not in SPAN_SINKS:
+        raise ValueError(f'unknown span sink {span_sink}. must be one of {SPAN_SINKS}')
+
+    if span_sink == 'agent':
+        return agent_reporter()
+
+    logger.info('aggregating spans in process')
+
+    if span_sink == 'memory':
+        return get_aggregator(max_spans)
+
+    return CompositeReporter(agent_reporter(), get_aggregator(max_spans))
@@ -23,6 +23,10 @@ def profiled_method(class_name: str):
                 
                 with jaeger.TRACER.start_active_span(f'{class_name} - {func.__name__}', child_of=parent_scope.span) as scope:
                     
+                    # skip timestamp tags for spans that are not sampled
+                    if not scope.span.is_sampled():
+                        return func(*args, **kwargs)
+                    
                     scope.span.set_tag('start_timestamp', datetime.datetime.utcnow().isoformat())
                     
                     result = func(*args, **kwargs)
@@ -34,6 +38,10 @@ def profiled_method(class_name: str):
                 
                 with jaeger.TRACER.start_active_span(f'{class_name} - {func.__name__}') as scope:
                     
+                    # skip timestamp tags for spans that are not sampled
+                    if not scope.span.is_sampled():
+                        return func(*args, **kwargs)
+                    
                     scope.span.set_tag('start_timestamp', datetime.datetime.utcnow().isoformat())
                     
                     result = func(*args, **kwargs)
@@ -1,59 +1,203 @@
-"""Module containing a series of helper functions used by the octopus 
-module"""
+"""Module containing a series of helper functions used by the octopus
+module. Methods are filtered with the comma separated patterns given
+in the OCTOPUS_INCLUSION_PATTERNS and OCTOPUS_EXCLUSION_PATTERNS
+environment variables. Patterns are regular expressions matched against
+the start of the method name (or the qualified name 'Class.method'), and
+patterns prefixed with 'glob:' use shell style wildcards instead
 
-import logging 
+    OCTOPUS_INCLUSION_PATTERNS='get_.*,glob:ItemService.*'
+    OCTOPUS_EXCLUSION_PATTERNS='glob:*_internal'
+
+Patterns are compiled into a single combined expression at startup where
+possible, and filter decisions are cached per class and method"""
+
+import fnmatch
+import functools
+import logging
 import os
 import re
 
 logger = logging.getLogger('octopus.helpers')
 
-OCTOPUS_EXCLUSION_PATTERNS = os.environ.get('OCTOPUS_EXCLUSION_PATTERNS', '').split(',')
-OCTOPUS_INCLUSION_PATTERNS = os.environ.get('OCTOPUS_INCLUSION_PATTERNS', '').split(',')
+GLOB_PREFIX = 'glob:'
+REGEX_PREFIX = 're:'
+
+# flags of patterns without inline global flags
+DEFAULT_FLAGS = re.compile('').flags
+
+OCTOPUS_EXCLUSION_PATTERNS = [pattern.strip() for pattern in os.environ.get('OCTOPUS_EXCLUSION_PATTERNS', '').split(',') if pattern.strip()]
+OCTOPUS_INCLUSION_PATTERNS = [pattern.strip() for pattern in os.environ.get('OCTOPUS_INCLUSION_PATTERNS', '').split(',') if pattern.strip()]
+
+OCTOPUS_FILTER_CACHE_SIZE = int(os.environ.get('OCTOPUS_FILTER_CACHE_SIZE', 4096))
+
+
+def translate_pattern(pattern: str) -> str:
+    """Helper function used to translate a pattern into
+    a regular expression. Glob patterns are translated
+    with fnmatch, all other patterns are used as is"""
+
+    pattern = pattern.strip()
+
+    if pattern.startswith(GLOB_PREFIX):
+        return fnmatch.translate(pattern[len(GLOB_PREFIX):])
+
+    if pattern.startswith(REGEX_PREFIX):
+        return pattern[len(REGEX_PREFIX):]
+
+    return pattern
+
+class PatternSet:
+    """Set of separately compiled regular expressions, used
+    if patterns cannot be combined into a single expression
+
+    Arguments:
+        patterns: list of compiled regular expressions
+    """
+
+    def __init__(self, patterns: list):
+        self.patterns = patterns
+
+    def match(self, name: str) -> re.Match:
+        """Function used to match a name against all patterns
+
+        Returns:
+            match of the first matching pattern or None
+        """
+
+        for pattern in self.patterns:
+            match = pattern.match(name)
+
+            if match is not None:
+                return match
+
+        return None
+
+def compile_patterns(patterns: list, source: str = 'patterns') -> object:
+    """Helper function used to compile a list of patterns
+    into a single combined regular expression. Invalid
+    patterns are logged and skipped. Patterns containing
+    capture groups (whose backreferences would be renumbered)
+    or inline global flags cannot be combined, and are
+    matched separately with a PatternSet instead. None is
+    returned if no valid patterns are given
+
+    Arguments:
+        patterns: list of patterns
+        source: str name of the setting the patterns are read from
+
+    Returns:
+        compiled regular expression, PatternSet or None
+    """
+
+    expressions, compiled = [], []
+
+    for pattern in patterns:
+        expression = translate_pattern(pattern)
+
+        try:
+            compiled.append(re.compile(expression))
+        except re.error as err:
+            logger.error('ignoring invalid pattern %r in %s: %s', pattern, source, err)
+            continue
+
+        expressions.append(expression)
 
+    if not compiled:
+        return None
+
+    if len(compiled) == 1:
+        return compiled[0]
+
+    # inline global flags (i.e. '(?i)') are reported in the flags of a pattern
+    if any(pattern.groups or pattern.flags != DEFAULT_FLAGS for pattern in compiled):
+        return PatternSet(compiled)
+
+    try:
+        return re.compile('|'.join(f'(?:{expression})' for expression in expressions))
+    except re.error:
+        return PatternSet(compiled)
+
+
+class MethodFilter:
+    """Filter used to decide which methods of a class are
+    profiled. Methods are included if they match any of the
+    inclusion patterns (or if no inclusion patterns are given)
+    and match none of the exclusion patterns. Decisions are
+    cached per (class name, method) pair in an LRU cache
+
+    Arguments:
+        inclusions: list of inclusion patterns
+        exclusions: list of exclusion patterns
+        cache_size: int maximum number of cached decisions
+    """
+
+    def __init__(self, inclusions: list = [], exclusions: list = [], cache_size: int = 4096):
+
+        self.inclusion = compile_patterns(inclusions, 'OCTOPUS_INCLUSION_PATTERNS')
+        self.exclusion = compile_patterns(exclusions, 'OCTOPUS_EXCLUSION_PATTERNS')
+
+        self.is_included = functools.lru_cache(maxsize=cache_size)(self._is_included)
+
+    def _is_included(self, class_name: str, method: str) -> bool:
+
+        names = (method, f'{class_name}.{method}') if class_name else (method,)
+
+        if self.inclusion is not None and not any(self.inclusion.match(name) for name in names):
+            return False
+
+        if self.exclusion is not None and any(self.exclusion.match(name) for name in names):
+            return False
+
+        return True
+
+    def filter(self, methods: list, class_name: str = '') -> list:
+        """Function used to filter a list of methods
+
+        Arguments:
+            methods: list of method names
+            class_name: str name of class the methods belong to
+
+        Returns:
+            list of included method names
+        """
+
+        return [method for method in methods if self.is_included(class_name, method)]
+
+METHOD_FILTER = MethodFilter(OCTOPUS_INCLUSION_PATTERNS, OCTOPUS_EXCLUSION_PATTERNS, OCTOPUS_FILTER_CACHE_SIZE)
 
 def filter_on_inclusion(expressions: list, methods: list) -> list:
     """Helper function used to filter expressions
     based on inclusion"""
-    
-    filtered_methods = set()
-    
-    for expression in expressions:
-        valid_methods = [method for method in methods if matches_expression(expression, method)]
-        
-        filtered_methods += set(valid_methods)
-    
-    return filtered_methods
+
+    pattern = compile_patterns(expressions)
+
+    if pattern is None:
+        return list(methods)
+
+    return [method for method in methods if pattern.match(method)]
 
 def filter_on_exclusion(expressions: list, methods: list) -> list:
     """Helper function used to filter expressions
     based on exclusion"""
-    
-    filtered_methods = set()
-    
-    for expression in expressions:
-        valid_methods = [method for method in methods if not matches_expression(expression, method)]
-        
-        filtered_methods += set(valid_methods)
-    
-    return filtered_methods
 
+    pattern = compile_patterns(expressions)
+
+    if pattern is None:
+        return list(methods)
+
+    return [method for method in methods if not pattern.match(method)]
+
+@functools.lru_cache(maxsize=256)
 def matches_expression(pattern: str, method: str) -> bool:
     """Helper function used to determine if a
     particular method name matches a given RE
     expression"""
-    
-    return True
 
-def filter_methods(methods: list) -> list:
+    return re.match(translate_pattern(pattern), method) is not None
+
+def filter_methods(methods: list, class_name: str = '') -> list:
     """Helper method used to filter function names
     based on a regex expressions specified by the
     user in the environment variables"""
-    
-    if OCTOPUS_INCLUSION_PATTERNS:
-        methods = filter_on_inclusion(OCTOPUS_INCLUSION_PATTERNS, methods)
-        
-    elif OCTOPUS_EXCLUSION_PATTERNS:
-        methods = filter_on_exclusion(OCTOPUS_EXCLUSION_PATTERNS, methods)        
-            
-    return methods
 
+    return METHOD_FILTER.filter(methods, class_name)
@@ -4,28 +4,40 @@ to connect to the jaeger service"""
 import logging 
 import os
 
-import opentracing
-import jaeger_client
+from Octopus.tracing import lifecycle
 
 logger = logging.getLogger('octopus.jaeger')
 
 
-def get_tracer() -> jaeger_client.Config: # pragma: no cover
+def get_tracer() -> 'jaeger_client.Tracer': # pragma: no cover
     """Function used to retrieve Jaeger Tracer.
     The Jaeger Host and Port can be specified in
     the environment variables, else the default
     connection to localhost at UDP port 6831
-    will be used"""
+    will be used. The scope manager is selected
+    with the JAEGER_SCOPE_MANAGER variable, and the
+    span sink with the JAEGER_SPAN_SINK variable.
+    jaeger_client is imported once the tracer is created"""
+
+    import jaeger_client
+    import jaeger_client.reporter
+    
+    from Octopus.tracing import aggregator
+    from Octopus.tracing import reporter
+    from Octopus.tracing import sampling
+    from Octopus.tracing import scope
 
     service_name = os.environ.get('SERVICE_NAME')
     
     logger.info('Getting Tracer for service %s', service_name)
 
+    # get sampling strategies from environment variables
+    sampler = sampling.get_route_sampler(os.environ.get('JAEGER_SAMPLER_TYPE', 'const'), 
+                                         os.environ.get('JAEGER_SAMPLER_PARAM', 1),
+                                         sampling.parse_route_strategies(os.environ.get('JAEGER_ROUTE_SAMPLING', '')))
+
     jaeger_config = {
-        'sampler': {
-            'type': 'const',
-            'param': 1
-        },
+        'sampler': sampler,
         'logging': True
     } 
     
@@ -34,29 +46,35 @@ def get_tracer() -> jaeger_client.Config: # pragma: no cover
 
     logger.debug('Creating Jaeger Tracer for %s:%s', jaeger_host, jaeger_port)
 
-    jaeger_config['local_agent'] = {'reporting_host': jaeger_host, 'reporting_port': int(jaeger_port)}
+    def agent_reporter() -> reporter.BatchingReporter:
+        return reporter.BatchingReporter(jaeger_host, int(jaeger_port),
+                                         queue_size=int(os.environ.get('JAEGER_REPORTER_QUEUE_SIZE', 1000)),
+                                         max_batch_bytes=int(os.environ.get('JAEGER_REPORTER_MAX_BATCH_BYTES', reporter.MAX_PACKET_SIZE)),
+                                         flush_interval=float(os.environ.get('JAEGER_REPORTER_FLUSH_INTERVAL', 1.0)),
+                                         drop_policy=os.environ.get('JAEGER_REPORTER_DROP_POLICY', 'oldest'))
+
+    # spans are sent to the agent and/or kept by the in-process aggregator
+    span_reporter = aggregator.get_span_reporter(os.environ.get('JAEGER_SPAN_SINK', 'agent'), agent_reporter,
+                                                 max_spans=int(os.environ.get('JAEGER_AGGREGATOR_MAX_SPANS', 1000)))
 
     # create jaeger client config object and return tracer
-    _config = jaeger_client.Config(config=jaeger_config, service_name=service_name, validate=True)
+    scope_manager = scope.get_scope_manager(os.environ.get('JAEGER_SCOPE_MANAGER', 'thread'))
 
-    return _config.initialize_tracer()
+    _config = jaeger_client.Config(config=jaeger_config, service_name=service_name, scope_manager=scope_manager, validate=True)
 
-class TracerProxy:
+    if _config.logging:
+        span_reporter = jaeger_client.reporter.CompositeReporter(span_reporter, jaeger_client.reporter.LoggingReporter())
+
+    return _config.create_tracer(reporter=span_reporter, sampler=_config.sampler)
+
+class TracerProxy(lifecycle.LazyTracer):
     """Wrapper used to lazy loading of Jaeger Tracing object.
     The Jaeger Tracer will not initialize until an attribute
-    of the tracer is directly referenced"""
-    
-    _tracer = None
-    
-    def initialize(self):
-        self._tracer = get_tracer()
+    of the tracer is directly referenced. The tracer is
+    recreated in the child process after a fork (see lifecycle)"""
     
-    def __getattr__(self, attr):
-        
-        if not self._tracer:
-            self._tracer = get_tracer()
-            
-        return getattr(self._tracer, attr)
+    def create(self) -> 'jaeger_client.Tracer':
+        return get_tracer()
     
 TRACER = TracerProxy()
 
@@ -0,0 +1,193 @@
+"""Module containing the lifecycle of the lazily created jaeger tracers. A
+tracer owns a reporter thread and a UDP socket, neither of which survive a
+fork: if the tracer is created in the master process of a pre-forking server
+(i.e. gunicorn with preload_app), forked workers inherit a tracer whose
+reporter thread no longer exists, and spans are queued but never sent. The
+LazyTracer therefore discards its tracer in the child process after a fork,
+and the next access creates a new tracer in the worker. Tracers are warmed
+up explicitly with warm_up(), which moves the construction cost out of the
+first request, and are flushed and closed with shutdown() when the process
+exits
+
+    # gunicorn.conf.py
+    from Octopus.bottle.jaeger_tracing.tracing import post_worker_init, worker_exit
+"""
+
+import abc
+import atexit
+import logging
+import os
+import threading
+
+logger = logging.getLogger('octopus.lifecycle')
+
+# proxies reset after a fork and closed on shutdown
+PROXIES = []
+
+# functions resetting per-process state after a fork
+AFTER_FORK = []
+
+
+class LazyTracer(abc.ABC):
+    """Wrapper used to lazy loading of Jaeger Tracing object.
+    The Jaeger Tracer will not initialize until an attribute
+    of the tracer is directly referenced, or until the tracer
+    is warmed up. The tracer is created by the create()
+    function, which must be implemented by subclasses"""
+
+    _tracer = None
+
+    def __init__(self):
+
+        self._lock = threading.Lock()
+        self._closed = False
+
+        register(self)
+
+    @abc.abstractmethod
+    def create(self) -> object:
+        """Function used to create the underlying tracer"""
+
+    def initialize(self):
+        self._tracer = self.create()
+
+    def get(self) -> object:
+        """Function used to retrieve the underlying tracer. Hot
+        paths should call methods on the returned tracer, which
+        avoids the attribute lookup through the proxy"""
+
+        tracer = self._tracer
+
+        if tracer is None:
+            with self._lock:
+                if self._tracer is None:
+                    self._tracer = self.create()
+
+                tracer = self._tracer
+
+        return tracer
+
+    def warm_up(self) -> object:
+        """Function used to create the tracer ahead of the
+        first request, i.e. in the post-fork hook of a worker
+
+        Returns:
+            underlying tracer
+        """
+
+        tracer = self.get()
+
+        logger.info('warmed up tracer of service %s in process %s', tracer.service_name, os.getpid())
+
+        return tracer
+
+    def reset(self):
+        """Function used to discard the tracer inherited from
+        the parent process. The tracer is not closed, since its
+        queued spans belong to the parent process"""
+
+        self._lock = threading.Lock()
+        self._tracer = None
+        self._closed = False
+
+    def shutdown(self):
+        """Function used to flush all queued spans and close
+        the reporter of the tracer. Spans finished after the
+        shutdown are dropped by the reporter"""
+
+        with self._lock:
+            tracer, closed, self._closed = self._tracer, self._closed, True
+
+        if tracer is None or closed:
+            return
+
+        logger.info('closing tracer of service %s in process %s', tracer.service_name, os.getpid())
+
+        try:
+            tracer.sampler.close()
+        except Exception:
+            logger.exception('unable to close sampler of service %s', tracer.service_name)
+
+        close_reporter(tracer.reporter)
+
+    def __getattr__(self, attr):
+
+        # private attributes are not forwarded, i.e. before __init__ has run
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+
+        return getattr(self.get(), attr)
+
+    def __repr__(self):
+        return self._tracer.__repr__()
+
+    def __str__(self):
+        return str(self._tracer)
+
+
+def close_reporter(reporter: object):
+    """Function used to close a span reporter and all reporters
+    wrapped by it. Tracer.close() is not used, since composite
+    reporters (and the base reporter) create tornado futures,
+    which fail outside of the main thread before the wrapped
+    reporters are closed. Reporters without a close() of their
+    own are skipped
+
+    Arguments:
+        reporter: jaeger span reporter
+    """
+
+    from jaeger_client.reporter import BaseReporter, CompositeReporter
+
+    if isinstance(reporter, CompositeReporter):
+        for child in reporter.reporters:
+            close_reporter(child)
+
+    # reporters wrapping a single reporter, i.e. the slow request CollectingReporter
+    elif isinstance(getattr(reporter, 'reporter', None), BaseReporter):
+        close_reporter(reporter.reporter)
+
+    elif type(reporter).close is not BaseReporter.close:
+        try:
+            reporter.close()
+        except Exception:
+            logger.exception('unable to close reporter %s', type(reporter).__name__)
+
+def register(proxy: LazyTracer) -> LazyTracer:
+    """Function used to register a tracer proxy, which is
+    reset after a fork and closed on shutdown"""
+
+    PROXIES.append(proxy)
+
+    return proxy
+
+def register_after_fork(func: object) -> object:
+    """Function used to register a function resetting
+    per-process state in the child process of a fork"""
+
+    AFTER_FORK.append(func)
+
+    return func
+
+def reset_after_fork():
+    """Function executed in the child process after a fork"""
+
+    for proxy in PROXIES:
+        proxy.reset()
+
+    for func in AFTER_FORK:
+        func()
+
+def shutdown():
+    """Function used to flush and close all tracers of the
+    process. Executed on exit of the interpreter, and by the
+    worker_exit hook of gunicorn"""
+
+    for proxy in PROXIES:
+        proxy.shutdown()
+
+# fork hooks are not available on windows
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_after_fork)
+
+atexit.register(shutdown)
@@ -1,8 +1,11 @@
 """Module containing a series of helper functions used
 to carry out the profiling of python functions"""
 
-import logging 
+import functools
+import inspect
+import logging
 import os
+import weakref
 
 from Octopus.tracing import decorators
 from Octopus.tracing import helpers
@@ -10,30 +13,154 @@ from Octopus.tracing import helpers
 logger = logging.getLogger('octopus.tracing')
 
 ENABLE_OCTOPUS = os.environ.get('ENABLE_OCTOPUS', 'false').lower() in ['true', 't']
-DIRECT_OMISSIONS = os.environ.get('OCTOPUS_DIRECT_OMISSIONS').split(',')
+DIRECT_OMISSIONS = [name for name in os.environ.get('OCTOPUS_DIRECT_OMISSIONS', '').split(',') if name]
+
+# filtered method names of each profiled class, keyed by exclusions
+_PROFILED_METHODS = weakref.WeakKeyDictionary()
+
+def is_magic_method(func: str) -> bool:
+    """Helper function used to determine if a method is magic"""
+
+    return func[:2] == '__' and func[len(func) - 2:] == '__'
 
 def profiled_instance(obj: object, exclusions: list = []):
     """Helper function used to apply decorator to instance
     of an object/class"""
-    
+
     # only apply octopus if environment variable configured to true
     if not ENABLE_OCTOPUS:
         logger.warning('octopus tracing is disabled')
-        
+
         return obj
-    
-    def is_magic_method(func: str) -> bool:
-        """Closure used to determine if a method is magic"""
-        
-        return func[:2] == '__' and func[len(func) - 2:] == '__'
-    
-    # get all methods that belong to instance and fillter on magic methods
-    methods = [func for func in dir(obj) if callable(getattr(obj, func)) and not is_magic_method(func)]
-    
+
+    # get all methods that belong to instance and fillter on magic methods and patterns
+    methods = [func for func in dir(obj) if not is_magic_method(func) and callable(getattr(obj, func))]
+    methods = helpers.filter_methods(methods, obj.__class__.__name__)
+
     logger.info('applying octopus tracing to functions %s', ','.join(methods))
-    
+
     for method in methods:
         if method not in DIRECT_OMISSIONS:
             setattr(obj, method, decorators.profiled_method(obj.__class__.__name__)(getattr(obj, method)))
-        
-    return obj
\ No newline at end of file
+
+    return obj
+
+def get_profiled_methods(cls: type, exclusions: tuple = ()) -> tuple:
+    """Helper function used to retrieve the names of all methods
+    of a class that are profiled. Magic methods, direct omissions,
+    exclusions and the configured inclusion/exclusion patterns are
+    filtered, and the result is cached per class and exclusions
+
+    Arguments:
+        cls: class to retrieve methods from
+        exclusions: tuple of method names to exclude
+
+    Returns:
+        tuple of method names
+    """
+
+    exclusions = tuple(exclusions)
+    cached = _PROFILED_METHODS.setdefault(cls, {})
+
+    methods = cached.get(exclusions)
+
+    if methods is None:
+        methods = []
+
+        for name in dir(cls):
+            if is_magic_method(name) or name in DIRECT_OMISSIONS or name in exclusions:
+                continue
+
+            attr = inspect.getattr_static(cls, name)
+
+            if isinstance(attr, (staticmethod, classmethod)) or inspect.isfunction(attr):
+                methods.append(name)
+
+        methods = cached[exclusions] = tuple(helpers.filter_methods(methods, cls.__name__))
+
+    return methods
+
+def profile_function(func: object, class_name: str) -> object:
+    """Helper function used to wrap a plain function in the
+    profiled_method decorator. Functions that have already been
+    profiled (i.e. by a decorated base class) are returned unchanged"""
+
+    if getattr(func, '__octopus_profiled__', False):
+        return func
+
+    wrapper = functools.update_wrapper(decorators.profiled_method(class_name)(func), func)
+    wrapper.__octopus_profiled__ = True
+
+    return wrapper
+
+def profiled_class(cls: type = None, exclusions: tuple = ()):
+    """Class decorator used to profile all methods of a class.
+    In contrast to profiled_instance(), methods are instrumented
+    once when the class is defined, which means that creating
+    instances of the class carries no additional cost. The
+    decorator can be used with or without arguments
+
+        @profiled_class
+        class Service: ...
+
+        @profiled_class(exclusions=['health'])
+        class Service: ...
+
+    Arguments:
+        cls: class to profile
+        exclusions: tuple of method names to exclude
+
+    Returns:
+        profiled class
+    """
+
+    if cls is None:
+        return functools.partial(profiled_class, exclusions=exclusions)
+
+    # only apply octopus if environment variable configured to true
+    if not ENABLE_OCTOPUS:
+        logger.debug('octopus tracing is disabled. skipping class %s', cls.__name__)
+
+        return cls
+
+    # exclusions of profiled base classes also apply to subclasses
+    exclusions = tuple(exclusions) + tuple(getattr(cls, '__octopus_exclusions__', ()))
+    cls.__octopus_exclusions__ = exclusions
+
+    methods = get_profiled_methods(cls, exclusions)
+
+    logger.info('applying octopus tracing to functions %s of class %s', ','.join(methods), cls.__name__)
+
+    for name in methods:
+        attr = inspect.getattr_static(cls, name)
+        func = getattr(attr, '__func__', attr)
+
+        # methods inherited from profiled base classes are already wrapped
+        if getattr(func, '__octopus_profiled__', False):
+            continue
+
+        if isinstance(attr, (staticmethod, classmethod)):
+            setattr(cls, name, type(attr)(profile_function(func, cls.__name__)))
+        else:
+            setattr(cls, name, profile_function(func, cls.__name__))
+
+    return cls
+
+
+class ProfiledMeta(type):
+    """Metaclass used to profile all methods of a class and
+    its subclasses when they are defined. Exclusions can be
+    passed as a class keyword argument
+
+        class Service(metaclass=ProfiledMeta, exclusions=['health']): ...
+    """
+
+    def __new__(mcs, name: str, bases: tuple, namespace: dict, exclusions: tuple = (), **kwargs: dict):
+
+        cls = super().__new__(mcs, name, bases, namespace, **kwargs)
+
+        return profiled_class(cls, exclusions=exclusions)
+
+    def __init__(cls, name: str, bases: tuple, namespace: dict, exclusions: tuple = (), **kwargs: dict):
+
+        super().__init__(name, bases, namespace, **kwargs)
@@ -0,0 +1,411 @@
+"""Module containing the propagation of span contexts in request headers.
+Extracting a span context through the tracer requires a mapping of headers,
+which in a WSGI application is a view over the environ that translates and
+compares each key on access. The Propagator reads the few keys used by its
+formats directly from the WSGI environ, and parses header values with cached
+codecs, which means that repeated values (i.e. fan-out requests of the same
+parent span) are only parsed once. Supported formats are
+
+    'jaeger'        uber-trace-id header and uberctx-* baggage headers
+    'w3c'           W3C traceparent and tracestate headers
+    'b3'            B3 multi headers (X-B3-TraceId, X-B3-SpanId, ...)
+    'b3-single'     B3 single header (b3)
+
+Contexts are extracted with the first format found in the request, and are
+injected in all configured formats. Both B3 formats accept single and multi
+headers on extraction. B3 headers carrying only a sampling state (i.e. 'b3: 0')
+are extracted as a context without trace, which starts a new trace that
+honours an upstream deny decision; accept decisions are left to the sampler. The W3C tracestate is carried in the baggage of the
+span context, which propagates it to child spans. Jaeger baggage headers have
+no fixed names, and are found by scanning all keys of the environ, which is
+the dominant cost of extraction. The scan can be disabled if baggage is not
+used"""
+
+import functools
+import logging
+import urllib.parse
+
+logger = logging.getLogger('octopus.propagation')
+
+# span context flags (see jaeger_client.constants). jaeger_client is only
+# imported once a propagator is created, i.e. if tracing is enabled
+SAMPLED_FLAG = 0x01
+DEBUG_FLAG = 0x02
+
+PROPAGATION_FORMATS = ['jaeger', 'w3c', 'b3', 'b3-single']
+
+DEFAULT_FORMATS = ('jaeger',)
+
+# B3 sampling states
+B3_SAMPLING_STATES = ('0', '1', 'd', 'true', 'false')
+
+# baggage key of the W3C tracestate
+TRACESTATE_KEY = 'tracestate'
+
+# maximum number of header values kept by each codec
+MAX_CACHED_HEADERS = 1024
+
+# prefix of jaeger baggage headers in the WSGI environ
+BAGGAGE_PREFIX = 'HTTP_UBERCTX_'
+
+
+def validate_formats(formats: tuple):
+    """Function used to validate a sequence of propagation
+    formats. A ValueError is raised for unknown formats"""
+
+    if not formats:
+        raise ValueError('at least one propagation format is required')
+
+    for propagation_format in formats:
+        if propagation_format not in PROPAGATION_FORMATS:
+            raise ValueError(f'unknown propagation format {propagation_format}. must be one of {PROPAGATION_FORMATS}')
+
+def get_environ(headers: dict) -> dict:
+    """Function used to convert a mapping of request headers
+    into the keys used by the WSGI environ
+
+    Arguments:
+        headers: dict of request headers
+
+    Returns:
+        dict mapping environ keys to header values
+    """
+
+    return {'HTTP_' + key.upper().replace('-', '_'): value for key, value in headers.items()}
+
+def format_id(value: int) -> str:
+    """Function used to format a trace ID as 16 hex
+    digits, or 32 hex digits for 128 bit trace IDs"""
+
+    return f'{value:016x}' if value < 1 << 64 else f'{value:032x}'
+
+#############################################
+# Define cached codecs of header values
+#############################################
+
+@functools.lru_cache(maxsize=MAX_CACHED_HEADERS)
+def parse_uber_trace_id(value: str) -> tuple:
+    """Function used to parse an uber-trace-id header
+    in format {trace_id}:{span_id}:{parent_id}:{flags}
+
+    Returns:
+        tuple of (trace_id, span_id, parent_id, flags) or None
+        if the header is invalid
+    """
+
+    parts = urllib.parse.unquote(value).split(':')
+
+    if len(parts) != 4:
+        return None
+
+    try:
+        trace_id, span_id, parent_id, flags = (int(part, 16) for part in parts)
+    except ValueError:
+        return None
+
+    if not trace_id or not span_id:
+        return None
+
+    return trace_id, span_id, parent_id or None, flags
+
+@functools.lru_cache(maxsize=MAX_CACHED_HEADERS)
+def parse_traceparent(value: str) -> tuple:
+    """Function used to parse a W3C traceparent header
+    in format {version}-{trace_id}-{parent_id}-{flags}.
+    Headers of future versions may carry additional fields
+
+    Returns:
+        tuple of (trace_id, span_id, parent_id, flags) or None
+        if the header is invalid
+    """
+
+    value = value.strip()
+    parts = value.split('-')
+
+    if len(parts) < 4 or len(parts[0]) != 2 or len(parts[1]) != 32 or len(parts[2]) != 16 or len(parts[3]) != 2:
+        return None
+
+    if parts[0] == 'ff' or (parts[0] == '00' and len(parts) != 4):
+        return None
+
+    try:
+        int(parts[0], 16)
+        trace_id, span_id, flags = int(parts[1], 16), int(parts[2], 16), int(parts[3], 16)
+    except ValueError:
+        return None
+
+    if not trace_id or not span_id:
+        return None
+
+    return trace_id, span_id, None, SAMPLED_FLAG if flags & 0x01 else 0
+
+def get_b3_flags(sampled: str, debug: str = None) -> int:
+    """Function used to convert the B3 sampling state
+    and debug flag into jaeger flags"""
+
+    if debug == '1' or sampled == 'd':
+        return SAMPLED_FLAG | DEBUG_FLAG
+
+    return SAMPLED_FLAG if sampled in ('1', 'true') else 0
+
+@functools.lru_cache(maxsize=MAX_CACHED_HEADERS)
+def parse_b3(trace_id: str, span_id: str, parent_id: str, sampled: str, debug: str) -> tuple:
+    """Function used to parse the values of the B3 multi headers.
+    Headers without trace and span ID only carry a sampling state
+
+    Returns:
+        tuple of (trace_id, span_id, parent_id, flags), where the IDs
+        are None if only a sampling state is given, or None if the
+        headers are invalid
+    """
+
+    if trace_id is None and span_id is None:
+        if debug == '1' or sampled in B3_SAMPLING_STATES:
+            return None, None, None, get_b3_flags(sampled, debug)
+
+        return None
+
+    if trace_id is None or span_id is None:
+        return None
+
+    try:
+        context = int(trace_id, 16), int(span_id, 16), int(parent_id, 16) if parent_id else None
+    except ValueError:
+        return None
+
+    if not context[0] or not context[1]:
+        return None
+
+    return (*context, get_b3_flags(sampled, debug))
+
+@functools.lru_cache(maxsize=MAX_CACHED_HEADERS)
+def parse_b3_single(value: str) -> tuple:
+    """Function used to parse a B3 single header in format
+    {trace_id}-{span_id}-{sampled}-{parent_id}, where the
+    sampling state and parent ID are optional. The header
+    may also consist of a sampling state only
+
+    Returns:
+        tuple of (trace_id, span_id, parent_id, flags), where the IDs
+        are None if only a sampling state is given, or None if the
+        header is invalid
+    """
+
+    parts = value.strip().split('-')
+
+    if len(parts) == 1:
+        return parse_b3(None, None, None, parts[0], None)
+
+    if len(parts) > 4:
+        return None
+
+    return parse_b3(parts[0], parts[1], parts[3] if len(parts) > 3 else None, parts[2] if len(parts) > 2 else None, None)
+
+def get_baggage(environ: dict) -> dict:
+    """Function used to extract jaeger baggage from the
+    uberctx-* and jaeger-baggage headers of a request"""
+
+    baggage = None
+
+    for key, value in environ.items():
+        if key.startswith(BAGGAGE_PREFIX):
+            if baggage is None:
+                baggage = {}
+
+            baggage[key[len(BAGGAGE_PREFIX):].lower().replace('_', '-')] = urllib.parse.unquote(value)
+
+    header = environ.get('HTTP_JAEGER_BAGGAGE')
+
+    if header:
+        for item in header.split(','):
+            key, separator, value = item.partition('=')
+
+            if separator:
+                if baggage is None:
+                    baggage = {}
+
+                baggage[key.strip()] = value.strip()
+
+    return baggage
+
+#############################################
+# Define propagator used by the tracing code
+#############################################
+
+class Propagator:
+    """Propagator used to extract and inject span contexts
+    in one or more header formats
+
+    Arguments:
+        formats: sequence of propagation formats
+        baggage: bool extract jaeger baggage headers
+    """
+
+    def __init__(self, formats: tuple = DEFAULT_FORMATS, baggage: bool = True):
+
+        validate_formats(formats)
+
+        import jaeger_client
+
+        self.formats = tuple(formats)
+        self.baggage = baggage
+
+        self._span_context = jaeger_client.SpanContext
+
+        self._extractors = []
+
+        for propagation_format in self.formats:
+            extractor = {
+                'jaeger': self.extract_jaeger,
+                'w3c': self.extract_w3c,
+                'b3': self.extract_b3,
+                'b3-single': self.extract_b3
+            }[propagation_format]
+
+            if extractor not in self._extractors:
+                self._extractors.append(extractor)
+
+    def extract(self, environ: dict) -> 'jaeger_client.SpanContext':
+        """Function used to extract the span context of a
+        request from its WSGI environ
+
+        Arguments:
+            environ: dict WSGI environ of request
+
+        Returns:
+            jaeger_client.SpanContext or None if the request
+            does not carry a valid span context
+        """
+
+        for extractor in self._extractors:
+            context = extractor(environ)
+
+            if context is not None:
+                return context
+
+        return None
+
+    def extract_jaeger(self, environ: dict) -> 'jaeger_client.SpanContext':
+
+        value = environ.get('HTTP_UBER_TRACE_ID')
+
+        if value is None:
+            debug_id = environ.get('HTTP_JAEGER_DEBUG_ID')
+
+            return self._span_context.with_debug_id(debug_id) if debug_id else None
+
+        context = parse_uber_trace_id(value)
+
+        if context is None:
+            logger.debug('ignoring invalid uber-trace-id header %s', value)
+            return None
+
+        return self._span_context(*context, baggage=get_baggage(environ) if self.baggage else None)
+
+    def extract_w3c(self, environ: dict) -> 'jaeger_client.SpanContext':
+
+        value = environ.get('HTTP_TRACEPARENT')
+
+        if value is None:
+            return None
+
+        context = parse_traceparent(value)
+
+        if context is None:
+            logger.debug('ignoring invalid traceparent header %s', value)
+            return None
+
+        tracestate = environ.get('HTTP_TRACESTATE')
+
+        return self._span_context(*context, baggage={TRACESTATE_KEY: tracestate} if tracestate else None)
+
+    def extract_b3(self, environ: dict) -> 'jaeger_client.SpanContext':
+
+        value = environ.get('HTTP_B3')
+
+        if value is not None:
+            context = parse_b3_single(value)
+
+        else:
+            trace_id, span_id, sampled, debug = (environ.get('HTTP_X_B3_TRACEID'), environ.get('HTTP_X_B3_SPANID'),
+                                                 environ.get('HTTP_X_B3_SAMPLED'), environ.get('HTTP_X_B3_FLAGS'))
+
+            if trace_id is None and span_id is None and sampled is None and debug is None:
+                return None
+
+            context = parse_b3(trace_id, span_id, environ.get('HTTP_X_B3_PARENTSPANID'), sampled, debug)
+
+        if context is None:
+            logger.debug('ignoring invalid b3 headers')
+            return None
+
+        # a context without trace starts a new trace, which is not sampled. upstream
+        # deny decisions are therefore propagated, while accept decisions are left
+        # to the sampler, since the tracer only forces sampling of debug IDs
+        if context[0] is None:
+            return self._span_context(*context) if not context[3] & SAMPLED_FLAG else None
+
+        return self._span_context(*context)
+
+    def inject(self, context: 'jaeger_client.SpanContext', headers: dict) -> dict:
+        """Function used to inject a span context into the
+        headers of an outgoing request in all formats
+
+        Arguments:
+            context: span context to inject
+            headers: dict of request headers
+
+        Returns:
+            dict of request headers
+        """
+
+        trace_id, span_id, parent_id, flags = context.trace_id, context.span_id, context.parent_id, context.flags or 0
+
+        for propagation_format in self.formats:
+            if propagation_format == 'jaeger':
+                headers['uber-trace-id'] = f'{trace_id:x}:{span_id:x}:{parent_id or 0:x}:{flags:x}'
+
+                for key, value in context.baggage.items():
+                    if key != TRACESTATE_KEY:
+                        headers[f'uberctx-{key}'] = urllib.parse.quote(value)
+
+            elif propagation_format == 'w3c':
+                headers['traceparent'] = f'00-{trace_id:032x}-{span_id:016x}-{flags & SAMPLED_FLAG:02x}'
+
+                tracestate = context.baggage.get(TRACESTATE_KEY)
+
+                if tracestate:
+                    headers['tracestate'] = tracestate
+
+            elif propagation_format == 'b3':
+                headers['X-B3-TraceId'] = format_id(trace_id)
+                headers['X-B3-SpanId'] = f'{span_id:016x}'
+
+                if parent_id:
+                    headers['X-B3-ParentSpanId'] = f'{parent_id:016x}'
+
+                if flags & DEBUG_FLAG:
+                    headers['X-B3-Flags'] = '1'
+                else:
+                    headers['X-B3-Sampled'] = '1' if flags & SAMPLED_FLAG else '0'
+
+            else:
+                sampled = 'd' if flags & DEBUG_FLAG else '1' if flags & SAMPLED_FLAG else '0'
+                headers['b3'] = f'{format_id(trace_id)}-{span_id:016x}-{sampled}' + (f'-{parent_id:016x}' if parent_id else '')
+
+        return headers
+
+@functools.lru_cache(maxsize=None)
+def get_propagator(formats: tuple = DEFAULT_FORMATS, baggage: bool = True) -> Propagator:
+    """Function used to retrieve the propagator of a tuple
+    of propagation formats. Propagators are created once
+
+    Arguments:
+        formats: tuple of propagation formats
+        baggage: bool extract jaeger baggage headers
+
+    Returns:
+        Propagator instance
+    """
+
+    return Propagator(formats, baggage)
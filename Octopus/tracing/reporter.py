@@ -0,0 +1,238 @@
+"""Module containing the span reporter used by the jaeger tracers. Spans
+are placed on a bounded in-memory queue and sent to the jaeger agent in
+batches by a background flush thread. Batches are limited in size so that
+each batch fits into a single UDP packet. If the queue is full, either the
+oldest or the newest spans are dropped. The queue depth and the number of
+sent and dropped spans are exported as prometheus metrics"""
+
+import collections
+import concurrent.futures
+import logging
+import socket
+import threading
+
+import prometheus_client
+
+from jaeger_client import thrift
+from jaeger_client.reporter import BaseReporter
+from jaeger_client.thrift_gen.agent import Agent
+from thrift.Thrift import TMessageType
+from thrift.protocol import TCompactProtocol
+from thrift.transport import TTransport
+
+logger = logging.getLogger('octopus.reporter')
+
+DROP_POLICIES = ['oldest', 'newest']
+
+# maximum size of a UDP packet accepted by the jaeger agent
+MAX_PACKET_SIZE = 65000
+
+# bytes reserved for the list header of the spans in a batch
+BATCH_OVERHEAD = 16
+
+QUEUE_LENGTH = prometheus_client.Gauge('jaeger_reporter_queue_length', 'number of spans waiting to be sent to the jaeger agent', ['service'], multiprocess_mode='livesum')
+SENT_SPANS = prometheus_client.Counter('jaeger_reporter_sent_spans_total', 'number of spans sent to the jaeger agent', ['service'])
+DROPPED_SPANS = prometheus_client.Counter('jaeger_reporter_dropped_spans_total', 'number of spans dropped by the reporter', ['service', 'reason'])
+
+
+def serialize(obj: object) -> bytes:
+    """Function used to serialize a thrift object
+    with the compact protocol used by the agent"""
+
+    buffer = TTransport.TMemoryBuffer()
+    obj.write(TCompactProtocol.TCompactProtocol(buffer))
+
+    return buffer.getvalue()
+
+def serialize_batch(batch: object) -> bytes:
+    """Function used to serialize a batch of spans into
+    an emitBatch message for the jaeger agent"""
+
+    buffer = TTransport.TMemoryBuffer()
+    protocol = TCompactProtocol.TCompactProtocol(buffer)
+
+    protocol.writeMessageBegin('emitBatch', TMessageType.ONEWAY, 0)
+    Agent.emitBatch_args(batch=batch).write(protocol)
+    protocol.writeMessageEnd()
+
+    return buffer.getvalue()
+
+
+class BatchingReporter(BaseReporter):
+    """Span reporter used to send spans to the jaeger agent
+    over UDP. Spans are queued in memory and flushed by a
+    background thread, either once every flush interval or
+    once the queue is half full
+
+    Arguments:
+        host: str host of jaeger agent
+        port: int port of jaeger agent
+        queue_size: int maximum number of queued spans
+        max_batch_bytes: int maximum size of a single batch in bytes
+        flush_interval: float interval between flushes in seconds
+        drop_policy: str either 'oldest' or 'newest'. Determines which
+            spans are dropped when the queue is full
+    """
+
+    def __init__(self, host: str, port: int, queue_size: int = 1000, max_batch_bytes: int = MAX_PACKET_SIZE,
+                 flush_interval: float = 1.0, drop_policy: str = 'oldest'):
+
+        if drop_policy not in DROP_POLICIES:
+            raise ValueError(f'invalid drop policy {drop_policy}. must be one of {DROP_POLICIES}')
+
+        self.address = (host, int(port))
+        self.queue_size = queue_size
+        self.max_batch_bytes = min(max_batch_bytes, MAX_PACKET_SIZE)
+        self.flush_interval = flush_interval
+        self.drop_policy = drop_policy
+
+        self._queue = collections.deque()
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._stopped = False
+
+        self._process = None
+        self._service_name = ''
+        self._queue_length = None
+
+        self._socket = self._create_socket(host, port)
+
+        self._thread = threading.Thread(target=self._run, name='octopus-span-reporter', daemon=True)
+        self._thread.start()
+
+    def _create_socket(self, host: str, port: int) -> socket.socket:
+        """Function used to create the UDP socket used to
+        send batches to the agent"""
+
+        family = socket.AF_INET
+
+        try:
+            family = socket.getaddrinfo(host, port, type=socket.SOCK_DGRAM)[0][0]
+        except socket.gaierror:
+            logger.warning('unable to resolve jaeger agent host %s', host)
+
+        return socket.socket(family, socket.SOCK_DGRAM)
+
+    def set_process(self, service_name: str, tags: dict, max_length: int):
+        self._process = thrift.make_process(service_name=service_name, tags=tags, max_length=max_length)
+        self._service_name = service_name
+        self._queue_length = QUEUE_LENGTH.labels(service=service_name)
+
+    def report_span(self, span: object):
+
+        with self._condition:
+            if self._stopped:
+                self._drop(1, 'stopped')
+                return
+
+            if len(self._queue) >= self.queue_size:
+                if self.drop_policy == 'newest':
+                    self._drop(1, 'queue_full')
+                    return
+
+                self._queue.popleft()
+                self._drop(1, 'queue_full')
+
+            self._queue.append(span)
+
+            # the queue depth is set as spans are queued, which exposes a growing backlog between flushes
+            if self._queue_length is not None:
+                self._queue_length.set(len(self._queue))
+
+            if len(self._queue) * 2 >= self.queue_size:
+                self._condition.notify()
+
+    def _drop(self, count: int, reason: str):
+        DROPPED_SPANS.labels(service=self._service_name, reason=reason).inc(count)
+
+    def _run(self):
+        """Function executed by the flush thread"""
+
+        while True:
+            with self._condition:
+                if not self._stopped and len(self._queue) * 2 < self.queue_size:
+                    self._condition.wait(self.flush_interval)
+
+                stopped = self._stopped
+
+            self.flush()
+
+            if stopped:
+                return
+
+    def flush(self):
+        """Function used to send all queued spans to the
+        jaeger agent in batches of at most max_batch_bytes"""
+
+        with self._flush_lock:
+            with self._condition:
+                spans = list(self._queue)
+                self._queue.clear()
+
+                if self._queue_length is not None:
+                    self._queue_length.set(0)
+
+            if not spans or self._process is None:
+                return
+
+            try:
+                thrift_spans = thrift.make_jaeger_batch(spans=spans, process=self._process).spans
+            except Exception as err:
+                logger.error('failed to convert spans for jaeger agent: %s', err)
+                self._drop(len(spans), 'send_error')
+                return
+
+            base_size = len(serialize_batch(thrift.make_jaeger_batch(spans=[], process=self._process))) + BATCH_OVERHEAD
+
+            batch, batch_size = [], base_size
+
+            for thrift_span in thrift_spans:
+                span_size = len(serialize(thrift_span))
+
+                if base_size + span_size > self.max_batch_bytes:
+                    logger.warning('dropping span %s exceeding maximum batch size', thrift_span.operationName)
+                    self._drop(1, 'too_large')
+                    continue
+
+                if batch_size + span_size > self.max_batch_bytes:
+                    self._send(batch)
+                    batch, batch_size = [], base_size
+
+                batch.append(thrift_span)
+                batch_size += span_size
+
+            if batch:
+                self._send(batch)
+
+    def _send(self, spans: list):
+        """Function used to send a single batch of thrift spans"""
+
+        batch = thrift.make_jaeger_batch(spans=[], process=self._process)
+        batch.spans = spans
+
+        try:
+            self._socket.sendto(serialize_batch(batch), self.address)
+            SENT_SPANS.labels(service=self._service_name).inc(len(spans))
+
+        except OSError as err:
+            logger.error('failed to send spans to jaeger agent: %s', err)
+            self._drop(len(spans), 'send_error')
+
+    def close(self) -> concurrent.futures.Future:
+        """Function used to stop the flush thread. All
+        queued spans are sent before the thread exits. The
+        returned future is already resolved, since the base
+        reporter creates a tornado future, which requires an
+        event loop in the closing thread"""
+
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+
+        self._thread.join()
+        self._socket.close()
+
+        future = concurrent.futures.Future()
+        future.set_result(True)
+
+        return future
@@ -0,0 +1,180 @@
+"""Module containing the samplers used to configure head sampling of
+jaeger tracers. Sampling strategies are given as a sampler type and
+parameter, and can be overridden for individual routes/operations
+
+    'probabilistic:0.01'      samples 1% of traces
+    'ratelimiting:10'         samples at most 10 traces per second
+    'const:1'                 samples every trace
+
+Per-route strategies are given as a comma separated list of route=strategy
+pairs, for example 'GET /items=probabilistic:0.01,POST /items=const:1'"""
+
+import logging
+
+from jaeger_client.sampler import Sampler
+from jaeger_client.sampler import ConstSampler
+from jaeger_client.sampler import ProbabilisticSampler
+from jaeger_client.sampler import RateLimitingSampler
+
+logger = logging.getLogger('octopus.sampling')
+
+SAMPLER_TYPES = ['const', 'probabilistic', 'ratelimiting']
+
+# maximum number of operation names resolved by the RouteSampler
+MAX_CACHED_OPERATIONS = 1024
+
+
+def get_sampler(sampler_type: str, param: float) -> Sampler:
+    """Function used to create a jaeger sampler from
+    a sampler type and parameter
+
+    Arguments:
+        sampler_type: str giving one of 'const', 'probabilistic' or 'ratelimiting'
+        param: float giving sampling decision, rate or traces per second
+
+    Returns:
+        instance of jaeger_client.sampler.Sampler
+    """
+
+    sampler_type = sampler_type.lower().replace('_', '').replace('-', '')
+
+    if sampler_type == 'const':
+        return ConstSampler(decision=bool(float(param)))
+
+    elif sampler_type == 'probabilistic':
+        return ProbabilisticSampler(rate=float(param))
+
+    elif sampler_type == 'ratelimiting':
+        return RateLimitingSampler(max_traces_per_second=float(param))
+
+    raise ValueError(f'unknown sampler type {sampler_type}. must be one of {SAMPLER_TYPES}')
+
+def parse_strategy(strategy: str) -> Sampler:
+    """Function used to create a sampler from a strategy
+    string in the format <type>:<param>
+
+    Arguments:
+        strategy: str giving sampling strategy
+
+    Returns:
+        instance of jaeger_client.sampler.Sampler
+    """
+
+    sampler_type, _, param = strategy.strip().partition(':')
+
+    if not param:
+        raise ValueError(f'invalid sampling strategy {strategy}. must be in format <type>:<param>')
+
+    return get_sampler(sampler_type, float(param))
+
+def parse_route_strategies(value: str) -> dict:
+    """Function used to parse per-route sampling strategies
+    from a comma separated string of route=strategy pairs
+
+    Arguments:
+        value: str giving route strategies
+
+    Returns:
+        dict mapping route to strategy string
+    """
+
+    strategies = {}
+
+    for item in value.split(','):
+        if not item.strip():
+            continue
+
+        route, _, strategy = item.rpartition('=')
+
+        if not route.strip():
+            raise ValueError(f'invalid route sampling strategy {item}. must be in format <route>=<type>:<param>')
+
+        strategies[route.strip()] = strategy.strip()
+
+    return strategies
+
+def get_operation_name(route: str) -> str:
+    """Function used to convert a route given as '<METHOD> <rule>'
+    into the operation name used by the trace() wrapper. Routes
+    given without method are returned unchanged"""
+
+    method, _, rule = route.partition(' ')
+
+    if rule and method.isalpha():
+        return f'{method.upper()} - {rule.strip()}'
+
+    return route
+
+
+class RouteSampler(Sampler):
+    """Sampler used to apply separate sampling strategies to
+    individual routes. The operation name of each root span
+    is matched against the configured routes, either on the full
+    operation name (i.e. 'GET - /items') or on the route rule
+    alone (i.e. '/items'). Operations that match no route are
+    sampled by the default sampler. Note that sampling decisions
+    are only made for root spans; child spans inherit the
+    decision of their parent
+
+    Arguments:
+        default: sampler used for unmatched operations
+        route_samplers: dict mapping route to sampler
+    """
+
+    def __init__(self, default: Sampler, route_samplers: dict):
+        super().__init__()
+
+        self.default = default
+        self.route_samplers = {get_operation_name(route): sampler for route, sampler in route_samplers.items()}
+
+        self._operations = {}
+
+    def get_operation_sampler(self, operation: str) -> Sampler:
+        """Function used to resolve the sampler for a
+        given operation. Resolved samplers are cached"""
+
+        sampler = self._operations.get(operation)
+
+        if sampler is None:
+            sampler = self.route_samplers.get(operation) or self.route_samplers.get(operation.partition(' - ')[2]) or self.default
+
+            if len(self._operations) < MAX_CACHED_OPERATIONS:
+                self._operations[operation] = sampler
+
+        return sampler
+
+    def is_sampled(self, trace_id: int, operation: str = ''):
+        return self.get_operation_sampler(operation).is_sampled(trace_id, operation)
+
+    def close(self):
+        self.default.close()
+
+        for sampler in self.route_samplers.values():
+            sampler.close()
+
+    def __str__(self) -> str:
+        return f'RouteSampler({self.default}, {self.route_samplers})'
+
+def get_route_sampler(sampler_type: str, param: float, route_strategies: dict = {}) -> Sampler:
+    """Function used to create the sampler of a tracer from
+    the default sampling strategy and per-route overrides. If
+    no per-route strategies are given, the default sampler is
+    returned directly
+
+    Arguments:
+        sampler_type: str giving default sampler type
+        param: float giving default sampler parameter
+        route_strategies: dict mapping route to strategy string
+
+    Returns:
+        instance of jaeger_client.sampler.Sampler
+    """
+
+    default = get_sampler(sampler_type, param)
+
+    if not route_strategies:
+        return default
+
+    logger.debug('using per-route sampling strategies %s', route_strategies)
+
+    return RouteSampler(default, {route: parse_strategy(strategy) for route, strategy in route_strategies.items()})
@@ -0,0 +1,54 @@
+"""Module containing the scope managers used by the jaeger tracers. The
+scope manager tracks the active span of the current unit of concurrency.
+The default thread-local scope manager shares the active span between all
+greenlets or coroutines running on a single thread, which means that spans
+bleed between concurrent requests on gevent or asyncio servers
+
+    'thread'        active span per thread (default)
+    'contextvars'   active span per context, i.e. per asyncio task
+    'gevent'        active span per greenlet. requires gevent
+"""
+
+import logging
+
+from opentracing import ScopeManager
+
+logger = logging.getLogger('octopus.scope')
+
+SCOPE_MANAGERS = ['thread', 'contextvars', 'gevent']
+
+
+def get_scope_manager(scope_manager: str = 'thread') -> ScopeManager:
+    """Function used to create an opentracing scope manager
+    from its name. Scope managers are imported lazily, since
+    the gevent scope manager requires gevent to be installed
+
+    Arguments:
+        scope_manager: str giving one of 'thread', 'contextvars' or 'gevent'
+
+    Returns:
+        instance of opentracing.ScopeManager
+    """
+
+    scope_manager = scope_manager.lower().strip()
+
+    if scope_manager == 'thread':
+        from opentracing.scope_managers import ThreadLocalScopeManager
+
+        return ThreadLocalScopeManager()
+
+    elif scope_manager == 'contextvars':
+        from opentracing.scope_managers.contextvars import ContextVarsScopeManager
+
+        return ContextVarsScopeManager()
+
+    elif scope_manager == 'gevent':
+        try:
+            from opentracing.scope_managers.gevent import GeventScopeManager
+
+        except ImportError as err:
+            raise ValueError(f'gevent scope manager requires gevent to be installed: {err}')
+
+        return GeventScopeManager()
+
+    raise ValueError(f'unknown scope manager {scope_manager}. must be one of {SCOPE_MANAGERS}')
@@ -0,0 +1,151 @@
+"""Module containing the quantile sketch used to aggregate span durations.
+The DDSketch maps each value onto a logarithmic bucket, which guarantees a
+relative error of the returned quantiles. The sketch used here covers a
+fixed range of values with a fixed number of buckets, which means that its
+memory is independent of the number of values added. Values below the range
+are counted in a zero bucket, and values above the range are counted in the
+last bucket. Sketches with the same parameters are merged by adding their
+bucket counts
+
+    relative accuracy   range               buckets
+    0.01                1us - 10000s        1152
+    0.02                1us - 10000s         577
+"""
+
+import array
+import math
+
+DEFAULT_RELATIVE_ACCURACY = 0.01
+DEFAULT_MIN_VALUE = 1e-6
+DEFAULT_MAX_VALUE = 1e4
+
+
+class DDSketch:
+    """Fixed range DDSketch. The bucket counts can be held in
+    any sequence of integers supporting item assignment (i.e.
+    an array or a memoryview of a shared file)
+
+    Arguments:
+        relative_accuracy: float relative accuracy of quantiles
+        min_value: float smallest value distinguished from zero
+        max_value: float largest value distinguished by the sketch
+        counts: optional sequence of bucket counts of length get_size()
+    """
+
+    __slots__ = ['relative_accuracy', 'min_value', 'max_value', 'counts', 'zero_count', 'count', 'sum', '_gamma', '_log_gamma', '_offset']
+
+    def __init__(self, relative_accuracy: float = DEFAULT_RELATIVE_ACCURACY, min_value: float = DEFAULT_MIN_VALUE,
+                 max_value: float = DEFAULT_MAX_VALUE, counts: object = None):
+
+        if not 0 < relative_accuracy < 1:
+            raise ValueError('relative accuracy must be between 0 and 1')
+
+        if not 0 < min_value < max_value:
+            raise ValueError('sketch range must be positive and non-empty')
+
+        self.relative_accuracy = relative_accuracy
+        self.min_value = min_value
+        self.max_value = max_value
+
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._offset = math.ceil(math.log(min_value) / self._log_gamma)
+
+        size = self.get_size()
+
+        if counts is None:
+            counts = array.array('Q', bytes(8 * size))
+
+        elif len(counts) != size:
+            raise ValueError(f'sketch requires {size} bucket counts')
+
+        self.counts = counts
+        self.zero_count = 0
+        self.count = 0
+        self.sum = 0.0
+
+    def get_size(self) -> int:
+        """Function used to retrieve the number of buckets"""
+
+        return math.ceil(math.log(self.max_value) / self._log_gamma) - self._offset + 1
+
+    def get_index(self, value: float) -> int:
+        """Function used to retrieve the bucket index of a
+        value. -1 is returned for values below the range"""
+
+        if value < self.min_value:
+            return -1
+
+        return min(math.ceil(math.log(value) / self._log_gamma) - self._offset, len(self.counts) - 1)
+
+    def get_value(self, index: int) -> float:
+        """Function used to retrieve the representative
+        value of a bucket"""
+
+        return 2 * self._gamma ** (index + self._offset) / (self._gamma + 1)
+
+    def add(self, value: float):
+        """Function used to add a value to the sketch"""
+
+        index = self.get_index(value)
+
+        if index < 0:
+            self.zero_count += 1
+        else:
+            self.counts[index] += 1
+
+        self.count += 1
+        self.sum += value
+
+    def merge(self, other: object):
+        """Function used to merge another sketch with the
+        same parameters into the sketch"""
+
+        if (other.relative_accuracy, other.min_value, other.max_value) != (self.relative_accuracy, self.min_value, self.max_value):
+            raise ValueError('unable to merge sketches with different parameters')
+
+        counts = self.counts
+
+        for index, count in enumerate(other.counts):
+            if count:
+                counts[index] += count
+
+        self.zero_count += other.zero_count
+        self.count += other.count
+        self.sum += other.sum
+
+    def quantile(self, q: float) -> float:
+        """Function used to retrieve a quantile of the
+        values added to the sketch
+
+        Arguments:
+            q: float quantile between 0 and 1
+
+        Returns:
+            float value of quantile or None if the sketch is empty
+        """
+
+        if not 0 <= q <= 1:
+            raise ValueError('quantile must be between 0 and 1')
+
+        if not self.count:
+            return None
+
+        rank = q * (self.count - 1)
+
+        if rank < self.zero_count:
+            return 0.0
+
+        cumulative = self.zero_count
+
+        for index, count in enumerate(self.counts):
+            cumulative += count
+
+            if cumulative > rank:
+                return self.get_value(index)
+
+        return self.get_value(len(self.counts) - 1)
+
+    @property
+    def mean(self) -> float:
+        return self.sum / self.count if self.count else None
@@ -0,0 +1,371 @@
+"""Module containing the capture of slow requests. Head sampling decides
+whether a trace is sent to jaeger before the duration of the request is
+known, which means that the rare slow requests are usually dropped. Requests
+exceeding the latency threshold of their route are kept in a fixed-size
+in-memory ring buffer regardless of the sampling decision. Each entry holds
+the method, route, timings and tags of the request, the child spans of
+sampled requests and optionally a snapshot of the stack of the handling
+thread, taken once the request exceeds its threshold. The memory used by the
+buffer is bounded by the number of entries and their total serialized size
+
+Thresholds are given in seconds per route, either on the full operation name
+(i.e. 'GET /items') or on the route rule alone (i.e. '/items'), in the same
+format as the per-route sampling strategies"""
+
+import collections
+import json
+import logging
+import sys
+import threading
+import time
+import traceback
+
+from jaeger_client.reporter import BaseReporter
+
+from Octopus.tracing import sampling
+
+logger = logging.getLogger('octopus.slow_requests')
+
+# maximum number of child spans kept per request
+MAX_CHILDREN = 50
+
+# maximum number of operation names resolved to thresholds
+MAX_CACHED_OPERATIONS = 1024
+
+
+def get_tag_values(tags: list) -> dict:
+    """Function used to convert the thrift tags of
+    a jaeger span into a dict of tag values"""
+
+    values = {}
+
+    for tag in tags:
+        for attr in ('vStr', 'vDouble', 'vBool', 'vLong'):
+            value = getattr(tag, attr, None)
+
+            if value is not None:
+                values[tag.key] = value
+                break
+
+    return values
+
+
+class SlowRequestBuffer:
+    """Ring buffer of slow requests. Entries are serialized
+    to JSON when added, and the oldest entries are evicted
+    once either the number of entries or their total size
+    exceeds the limits. Entries larger than the byte limit
+    are stored without child spans and stack
+
+    Arguments:
+        max_entries: int maximum number of entries
+        max_bytes: int maximum total size of serialized entries
+    """
+
+    def __init__(self, max_entries: int = 100, max_bytes: int = 1048576):
+
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+        self._entries = collections.deque()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def add(self, entry: dict):
+        """Function used to add an entry to the buffer
+
+        Arguments:
+            entry: dict describing a slow request
+        """
+
+        data = json.dumps(entry, default=str).encode()
+
+        if len(data) > self.max_bytes:
+            entry = dict(entry, children=[], stack=None, truncated=True)
+            data = json.dumps(entry, default=str).encode()
+
+            if len(data) > self.max_bytes:
+                logger.warning('dropping slow request %s exceeding buffer size', entry.get('operation_name'))
+                return
+
+        with self._lock:
+            self._entries.append(data)
+            self._size += len(data)
+
+            while len(self._entries) > self.max_entries or self._size > self.max_bytes:
+                self._size -= len(self._entries.popleft())
+
+    def to_json(self) -> bytes:
+        """Function used to serialize the buffer as a JSON
+        array, ordered from newest to oldest entry"""
+
+        with self._lock:
+            entries = list(self._entries)
+
+        return b'[' + b','.join(reversed(entries)) + b']'
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class InFlightRequest:
+    """State of a request tracked by the SlowRequestCapture"""
+
+    __slots__ = ['span', 'ident', 'start', 'deadline', 'threshold', 'children', 'stack']
+
+    def __init__(self, span: object, start: float, threshold: float):
+
+        self.span = span
+        self.ident = threading.get_ident()
+        self.start = start
+        self.deadline = time.monotonic() + threshold
+        self.threshold = threshold
+        self.children = []
+        self.stack = None
+
+
+class SlowRequestCapture:
+    """Capture of requests exceeding the latency threshold of
+    their route. Child spans of sampled requests are collected
+    by the CollectingReporter. If stacks are captured, a
+    watchdog thread snapshots the stack of each request once
+    it exceeds its threshold
+
+    Arguments:
+        threshold: float default threshold in seconds. 0 disables
+            capture of routes without threshold
+        thresholds: dict mapping routes to thresholds in seconds
+        max_entries: int maximum number of buffered requests
+        max_bytes: int maximum total size of buffered requests
+        capture_stacks: bool snapshot the stack of slow requests
+    """
+
+    def __init__(self, threshold: float = 0, thresholds: dict = {}, max_entries: int = 100, max_bytes: int = 1048576,
+                 capture_stacks: bool = False):
+
+        self.threshold = threshold
+        self.thresholds = {sampling.get_operation_name(route): value for route, value in thresholds.items()}
+        self.capture_stacks = capture_stacks
+
+        self.buffer = SlowRequestBuffer(max_entries, max_bytes)
+
+        self._operations = {}
+        self._lock = threading.Lock()
+
+        # in-flight requests keyed by (trace_id, span_id) of their root span, and
+        # grouped by trace. one trace can fan out into concurrent requests
+        self._in_flight = {}
+        self._traces = {}
+        self._watchdog = None
+
+    def get_threshold(self, operation: str) -> float:
+        """Function used to resolve the threshold of an
+        operation. Resolved thresholds are cached"""
+
+        threshold = self._operations.get(operation)
+
+        if threshold is None:
+            threshold = self.thresholds.get(operation)
+
+            if threshold is None:
+                threshold = self.thresholds.get(operation.partition(' - ')[2], self.threshold)
+
+            if len(self._operations) < MAX_CACHED_OPERATIONS:
+                self._operations[operation] = threshold
+
+        return threshold
+
+    def begin(self, span: object, start: float) -> InFlightRequest:
+        """Function used to start tracking a request
+
+        Arguments:
+            span: root span of request
+            start: float start time of request in seconds since the epoch
+
+        Returns:
+            InFlightRequest or None if the route has no threshold
+        """
+
+        threshold = self.get_threshold(span.operation_name)
+
+        if not threshold:
+            return None
+
+        request = InFlightRequest(span, start, threshold)
+
+        with self._lock:
+            self._in_flight[span.trace_id, span.span_id] = request
+
+            # tuples are replaced rather than mutated, which allows spans to be collected without the lock
+            self._traces[span.trace_id] = self._traces.get(span.trace_id, ()) + (request,)
+
+        if self.capture_stacks and self._watchdog is None:
+            self.start_watchdog()
+
+        return request
+
+    def finish(self, request: InFlightRequest, end: float, method: str, path: str, tags: dict = {}, error: Exception = None):
+        """Function used to finish tracking a request. The
+        request is added to the buffer if it exceeded the
+        threshold of its route
+
+        Arguments:
+            request: InFlightRequest returned by begin()
+            end: float end time of request in seconds since the epoch
+            method: str request method
+            path: str request path
+            tags: dict tags of unsampled requests
+            error: exception raised by the request if any
+        """
+
+        trace_id, span_id = request.span.trace_id, request.span.span_id
+
+        with self._lock:
+            if self._in_flight.pop((trace_id, span_id), None) is request:
+                requests = tuple(other for other in self._traces.get(trace_id, ()) if other is not request)
+
+                if requests:
+                    self._traces[trace_id] = requests
+                else:
+                    self._traces.pop(trace_id, None)
+
+        duration = end - request.start
+
+        if duration < request.threshold:
+            return
+
+        span = request.span
+        sampled = span.is_sampled()
+
+        self.buffer.add({
+            'trace_id': f'{span.trace_id:x}',
+            'span_id': f'{span.span_id:x}',
+            'sampled': sampled,
+            'operation_name': span.operation_name,
+            'method': method,
+            'route': span.operation_name.partition(' - ')[2],
+            'path': path,
+            'start': request.start,
+            'duration': duration,
+            'threshold': request.threshold,
+            'error': repr(error) if error is not None else None,
+            'tags': get_tag_values(span.tags) if sampled else tags,
+            'children': request.children,
+            'stack': request.stack
+        })
+
+    def get_request(self, span: object) -> InFlightRequest:
+        """Function used to find the tracked request owning a
+        child span. Direct children are found by their parent
+        ID. Deeper descendants are reported before their parent
+        spans, and are attributed to the request handled by the
+        reporting thread instead. None is returned if the span
+        cannot be attributed to a single request
+
+        Arguments:
+            span: finished span
+
+        Returns:
+            InFlightRequest owning the span or None
+        """
+
+        requests = self._traces.get(span.trace_id)
+
+        if requests is None or (span.trace_id, span.span_id) in self._in_flight:
+            return None
+
+        request = self._in_flight.get((span.trace_id, span.parent_id))
+
+        if request is not None:
+            return request
+
+        ident = threading.get_ident()
+        owners = [request for request in requests if request.ident == ident]
+
+        # requests sharing a thread (i.e. greenlets or asyncio tasks) cannot be told apart
+        return owners[0] if len(owners) == 1 else None
+
+    def collect_span(self, span: object):
+        """Function used to collect a finished child span
+        of a tracked request"""
+
+        # child spans are reported before the root span of the request
+        request = self.get_request(span)
+
+        if request is None or len(request.children) >= MAX_CHILDREN:
+            return
+
+        request.children.append({
+            'operation_name': span.operation_name,
+            'span_id': f'{span.span_id:x}',
+            'parent_id': f'{span.parent_id or 0:x}',
+            'offset': span.start_time - request.start,
+            'duration': (span.end_time or span.start_time) - span.start_time,
+            'tags': get_tag_values(span.tags)
+        })
+
+    def start_watchdog(self):
+        """Function used to start the watchdog thread
+        used to snapshot the stacks of slow requests"""
+
+        with self._lock:
+            if self._watchdog is not None:
+                return
+
+            self._watchdog = threading.Thread(target=self.watch, name='octopus-slow-requests', daemon=True)
+            self._watchdog.start()
+
+    def watch(self):
+        """Function executed by the watchdog thread"""
+
+        interval = min([value for value in [self.threshold, *self.thresholds.values()] if value] or [1.0]) / 2
+
+        while True:
+            time.sleep(min(max(interval, 0.01), 1.0))
+
+            now = time.monotonic()
+
+            with self._lock:
+                overdue = [request for request in self._in_flight.values() if request.stack is None and now >= request.deadline]
+
+            if not overdue:
+                continue
+
+            frames = sys._current_frames()
+
+            for request in overdue:
+                frame = frames.get(request.ident)
+
+                if frame is not None:
+                    request.stack = traceback.format_stack(frame)
+
+
+class CollectingReporter(BaseReporter):
+    """Reporter used to collect the child spans of requests
+    tracked by a SlowRequestCapture. Spans are passed on to
+    the wrapped reporter
+
+    Arguments:
+        reporter: jaeger reporter spans are passed on to
+        capture: SlowRequestCapture collecting child spans
+    """
+
+    def __init__(self, reporter: object, capture: SlowRequestCapture):
+
+        self.reporter = reporter
+        self.capture = capture
+
+    def set_process(self, service_name: str, tags: dict, max_length: int):
+        self.reporter.set_process(service_name, tags, max_length)
+
+    def report_span(self, span: object):
+
+        try:
+            self.capture.collect_span(span)
+        except Exception:
+            logger.exception('unable to collect span %s', span.operation_name)
+
+        self.reporter.report_span(span)
+
+    def close(self):
+        return self.reporter.close()
@@ -0,0 +1,14 @@
+"""Module containing the standard span tags set by the tracing code (see
+opentracing.ext.tags). The tags are defined here rather than imported from
+opentracing, which means that modules tagging spans on each request can be
+imported without loading opentracing if tracing is disabled"""
+
+HTTP_METHOD = 'http.method'
+HTTP_URL = 'http.url'
+HTTP_STATUS_CODE = 'http.status_code'
+
+SPAN_KIND = 'span.kind'
+SPAN_KIND_RPC_SERVER = 'server'
+SPAN_KIND_RPC_CLIENT = 'client'
+
+ERROR = 'error'
@@ -0,0 +1,332 @@
+"""Module containing WSGI middleware that traces requests and records request
+metrics for any WSGI application. In contrast to the bottle plugins, which
+stop timing once the route callback returns, the middleware measures the
+full lifetime of a response, including the time spent streaming the body.
+The span of a request is only finished once the response iterable has been
+exhausted or closed, and the time to first byte, total latency and number of
+bytes sent are recorded for each route
+
+    app = OctopusMiddleware(bottle.default_app(), jaeger_config={'service_name': 'demo'},
+                            prometheus_config={'service_name': 'demo'})
+
+Tracing and metrics are enabled with the ENABLE_JAEGER_TRACING and
+ENABLE_PROMETHEUS_METRICS environment variables. Note that the middleware
+replaces the bottle plugins, and should not be combined with them"""
+
+import logging
+import time
+
+import Octopus.bottle.jaeger_tracing.jaeger_config as tracing_config
+import Octopus.bottle.prometheus.prometheus_config as metrics_config
+
+from Octopus.tracing import tags
+
+LOGGER = logging.getLogger('octopus.wsgi')
+
+
+def get_bottle_route(environ: dict) -> str:
+    """Function used to resolve the route rule of a
+    request handled by a bottle application"""
+
+    route = environ.get('bottle.route')
+
+    return route.rule if route is not None else None
+
+
+class RouteMetrics:
+    """Metric children of a single route. Children of route
+    rules are bound once and reused, while children of raw
+    request paths are resolved through the cardinality limiters
+
+    Arguments:
+        route: str route rule or request path
+        bound: bool route is a route rule
+    """
+
+    __slots__ = ['latency', 'time_to_first_byte', 'response_bytes', 'exemplars', 'count']
+
+    def __init__(self, route: str, bound: bool):
+
+        from Octopus.bottle.prometheus import prometheus_metrics
+
+        service = metrics_config.PROMETHEUS_CONFIG.service_name
+
+        if bound:
+            self.latency = prometheus_metrics.get_request_latency().labels(endpoint=route, service=service)
+            self.time_to_first_byte = prometheus_metrics.get_time_to_first_byte().labels(endpoint=route, service=service)
+            self.response_bytes = prometheus_metrics.RESPONSE_BYTES.labels(endpoint=route, service=service)
+            self.count = prometheus_metrics.bind_request_counter(route)
+        else:
+            self.latency = prometheus_metrics.get_limiter(prometheus_metrics.get_request_latency()).labels(endpoint=route, service=service)
+            self.time_to_first_byte = prometheus_metrics.get_limiter(prometheus_metrics.get_time_to_first_byte()).labels(endpoint=route, service=service)
+            self.response_bytes = prometheus_metrics.get_limiter(prometheus_metrics.RESPONSE_BYTES).labels(endpoint=route, service=service)
+
+            limiter = prometheus_metrics.get_limiter(prometheus_metrics.REQUEST_COUNT)
+
+            def count(method: str, user: str, http_code: str):
+                limiter.labels(method=method, endpoint=route, service=service, user=user, http_code=http_code).inc()
+
+            self.count = count
+
+        self.exemplars = prometheus_metrics.get_exemplar_limiter(self.latency)
+
+
+class RequestState:
+    """State of a single request tracked by the middleware. The
+    start time is the wall clock time used to timestamp the span,
+    while durations are measured from the monotonic timer"""
+
+    __slots__ = ['environ', 'start', 'timer', 'span', 'status', 'bytes_sent', 'first_byte', 'finished']
+
+    def __init__(self, environ: dict, start: float, timer: float, span: object):
+
+        self.environ = environ
+        self.start = start
+        self.timer = timer
+        self.span = span
+
+        self.status = '500 Internal Server Error'
+        self.bytes_sent = 0
+        self.first_byte = None
+        self.finished = False
+
+    def sent(self, size: int):
+        """Function used to record a chunk of the response body"""
+
+        if size and self.first_byte is None:
+            self.first_byte = time.perf_counter()
+
+        self.bytes_sent += size
+
+
+class InstrumentedResponse:
+    """Wrapper around the response iterable of an application.
+    Chunks are counted as they are handed to the server, and
+    the request is finished once the iterable is exhausted
+    or closed. The span of the request is active while the
+    body is produced, which means that work done by streaming
+    generators is traced within the request"""
+
+    def __init__(self, middleware: object, result: object, state: RequestState):
+
+        self._middleware = middleware
+        self._result = result
+        self._iterator = iter(result)
+        self._state = state
+
+    def __iter__(self):
+        return self
+
+    def __next__(self) -> bytes:
+
+        # the end of the body is signalled with None rather than StopIteration, which
+        # would otherwise be raised through the active scope and tag the span as an error
+        try:
+            if self._state.span is None:
+                chunk = next(self._iterator, None)
+            else:
+                with self._middleware.tracer.scope_manager.activate(self._state.span, finish_on_close=False):
+                    chunk = next(self._iterator, None)
+
+        except Exception as err:
+            self._middleware.finish(self._state, err)
+            raise
+
+        if chunk is None:
+            self._middleware.finish(self._state)
+            raise StopIteration
+
+        self._state.sent(len(chunk))
+
+        return chunk
+
+    def close(self):
+        """Function called by the server once the response
+        has been sent, or if the client disconnected"""
+
+        try:
+            if hasattr(self._result, 'close'):
+                self._result.close()
+        finally:
+            self._middleware.finish(self._state)
+
+
+class OctopusMiddleware:
+    """WSGI middleware used to trace requests and record request
+    metrics. Metrics are labelled with the route rule if it can be
+    resolved (by default from bottle applications), and with the
+    request path through the cardinality limiters otherwise. Note
+    that the sampling decision of a span is made on the request
+    path, and the span is renamed to the route rule once finished
+
+    Arguments:
+        app: WSGI application to wrap
+        jaeger_config: dict containing jaeger_host, jaeger_port,
+            service name and module name variables
+        prometheus_config: dict containing service name and metrics list
+        route_resolver: optional function resolving the route rule of
+            a request from its WSGI environment. Called after the
+            application has handled the request
+    """
+
+    def __init__(self, app: object, jaeger_config: dict = None, prometheus_config: dict = None, route_resolver: object = None):
+
+        self.app = app
+        self.route_resolver = route_resolver or get_bottle_route
+
+        self.tracer = None
+        self.metrics = False
+
+        if tracing_config.ENABLE_JAEGER_TRACING:
+            if jaeger_config is not None or tracing_config.JAEGER_CONFIG is None:
+                tracing_config.set_jaeger_config(dict(jaeger_config or {}))
+
+            from Octopus.bottle.jaeger_tracing import tracing
+
+            self.tracing, self.tracer = tracing, tracing.TRACER
+
+        if metrics_config.ENABLE_PROMETHEUS_METRICS:
+            if prometheus_config is not None or metrics_config.PROMETHEUS_CONFIG is None:
+                metrics_config.set_prometheus_config(dict(prometheus_config or {}))
+
+            from Octopus.bottle.prometheus import prometheus_metrics
+
+            self.metrics = True
+            self.in_progress = prometheus_metrics.IN_PROGRESS.labels(service=metrics_config.PROMETHEUS_CONFIG.service_name)
+
+        self._routes = {}
+
+    def __call__(self, environ: dict, start_response: object) -> object:
+
+        if self.tracer is None and not self.metrics:
+            return self.app(environ, start_response)
+
+        if self.metrics:
+            self.in_progress.inc()
+
+        start, timer, span = time.time(), time.perf_counter(), None
+
+        if self.tracer is not None:
+            tracer = self.tracer.get()
+
+            # extract parent span. if no parent span is present in the request
+            # headers, the request is traced with a new span
+            parent = self.tracing.extract_context(environ)
+            span = tracer.start_span(f'{environ["REQUEST_METHOD"]} - {environ.get("PATH_INFO", "/")}', child_of=parent, start_time=start)
+
+        state = RequestState(environ, start, timer, span)
+
+        def instrumented_start_response(status: str, headers: list, exc_info: tuple = None) -> object:
+
+            state.status = status
+            write = start_response(status, headers, exc_info)
+
+            def instrumented_write(data: bytes):
+                state.sent(len(data))
+                return write(data)
+
+            return instrumented_write
+
+        try:
+            if span is None:
+                result = self.app(environ, instrumented_start_response)
+            else:
+                previous = self.tracing.set_active_route(span.operation_name)
+
+                try:
+                    with self.tracer.scope_manager.activate(span, finish_on_close=False):
+                        result = self.app(environ, instrumented_start_response)
+                finally:
+                    self.tracing.reset_active_route(previous)
+
+        except Exception as err:
+            self.finish(state, err)
+            raise
+
+        return InstrumentedResponse(self, result, state)
+
+    def get_route_metrics(self, environ: dict) -> RouteMetrics:
+        """Function used to retrieve the metric children of
+        the route of a request"""
+
+        route = self.route_resolver(environ)
+
+        if route is None:
+            return RouteMetrics(environ.get('PATH_INFO', '/'), bound=False)
+
+        metrics = self._routes.get(route)
+
+        if metrics is None:
+            metrics = self._routes.setdefault(route, RouteMetrics(route, bound=True))
+
+        return metrics
+
+    def finish(self, state: RequestState, error: Exception = None):
+        """Function used to finish the span and record the
+        metrics of a request. Requests are only finished once"""
+
+        if state.finished:
+            return
+
+        state.finished, elapsed = True, time.perf_counter() - state.timer
+        end = state.start + elapsed
+
+        environ, span = state.environ, state.span
+        request_method = environ['REQUEST_METHOD']
+
+        try:
+            if span is not None:
+                self.finish_span(state, span, error, end)
+
+            if self.metrics:
+                metrics = self.get_route_metrics(environ)
+
+                # attach the trace ID of sampled spans as an exemplar if due
+                if metrics.exemplars is not None and span is not None and span.is_sampled() and metrics.exemplars.is_due(elapsed):
+                    metrics.latency.observe(elapsed, {'trace_id': f'{span.trace_id:x}'})
+                else:
+                    metrics.latency.observe(elapsed)
+
+                if state.first_byte is not None:
+                    metrics.time_to_first_byte.observe(state.first_byte - state.timer)
+
+                metrics.response_bytes.inc(state.bytes_sent)
+                metrics.count(request_method, environ.get('HTTP_X_AUTHENTICATED_USERID', 'none'), state.status)
+
+        except Exception:
+            LOGGER.exception('unable to record request %s %s', request_method, environ.get('PATH_INFO'))
+
+        finally:
+            if self.metrics:
+                self.in_progress.dec()
+
+    def finish_span(self, state: RequestState, span: object, error: Exception, end: float):
+        """Function used to tag and finish the span of a request"""
+
+        environ = state.environ
+
+        if span.is_sampled():
+            route = self.route_resolver(environ)
+
+            if route is not None:
+                span.set_operation_name(f'{environ["REQUEST_METHOD"]} - {route}')
+
+            user_id = environ.get('HTTP_X_AUTHENTICATED_USERID')
+
+            if user_id:
+                span.set_tag('user', user_id)
+
+            span.set_tag(tags.HTTP_METHOD, environ['REQUEST_METHOD'])
+            span.set_tag(tags.HTTP_URL, environ.get('PATH_INFO', '/'))
+            span.set_tag(tags.SPAN_KIND, tags.SPAN_KIND_RPC_SERVER)
+            span.set_tag(tags.HTTP_STATUS_CODE, state.status.split(' ', 1)[0])
+            span.set_tag('http.response_bytes', state.bytes_sent)
+
+            if state.first_byte is not None:
+                span.set_tag('http.time_to_first_byte', state.first_byte - state.timer)
+
+            if error is not None:
+                span.set_tag(tags.ERROR, True)
+                span.log_kv({'event': 'error', 'error.object': error})
+
+        span.finish(finish_time=end)
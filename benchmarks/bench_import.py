@@ -0,0 +1,98 @@
+"""Benchmark measuring the import time of the Octopus entry points with all
+instrumentation disabled, which is the cost paid by CLI jobs and short-lived
+workers that import the library without tracing or metrics. Each module is
+imported in a fresh interpreter with -X importtime, and the heavy optional
+dependencies loaded by the import are recorded. The script exits with a
+non-zero code if a disabled entry point loads a heavy dependency
+
+    python -m benchmarks.bench_import --output import.json
+    python -m benchmarks.bench_import --compare import.json
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+from benchmarks import harness
+
+MODULES = [
+    'Octopus.tracing.octopus',
+    'Octopus.bottle.jaeger_tracing.tracing',
+    'Octopus.bottle.jaeger_tracing.tracing_plugin',
+    'Octopus.bottle.prometheus.prometheus_plugin',
+    'Octopus.bottle.platform_metrics.platform_metrics',
+    'Octopus.wsgi.middleware'
+]
+
+# dependencies that are only imported once a feature is enabled
+HEAVY_MODULES = ['jaeger_client', 'opentracing', 'thrift', 'tornado', 'requests', 'prometheus_client']
+
+# environment variables enabling instrumentation, removed from the environment of each import
+ENABLE_VARIABLES = ['ENABLE_OCTOPUS', 'ENABLE_JAEGER_TRACING', 'ENABLE_PROMETHEUS_METRICS', 'ENABLE_PLATFORM_METRICS',
+                    'ENABLE_JAEGER_WITH_PROMETHEUS']
+
+
+def import_module(module: str) -> tuple:
+    """Function used to import a module in a fresh interpreter
+
+    Arguments:
+        module: str giving module name
+
+    Returns:
+        tuple of cumulative import time in nanoseconds and
+        list of heavy dependencies loaded by the import
+    """
+
+    environ = {key: value for key, value in os.environ.items() if key not in ENABLE_VARIABLES}
+    code = f'import json, sys, {module}; print(json.dumps([name for name in {HEAVY_MODULES!r} if name in sys.modules]))'
+
+    process = subprocess.run([sys.executable, '-X', 'importtime', '-c', code], env=environ, capture_output=True, text=True, check=True)
+
+    for line in process.stderr.splitlines():
+        fields = [field.strip() for field in line.split('|')]
+
+        if len(fields) == 3 and fields[2] == module:
+            return int(fields[1]) * 1000, json.loads(process.stdout)
+
+    raise RuntimeError(f'unable to find import time of {module}')
+
+def run(repeat: int) -> list:
+    """Function used to measure the import time of all
+    entry points. The fastest of all runs is reported
+
+    Returns:
+        list of result dicts
+    """
+
+    results = []
+
+    for module in MODULES:
+        timings, heavy_modules = [], []
+
+        for _ in range(repeat):
+            import_ns, heavy_modules = import_module(module)
+            timings.append(import_ns)
+
+        results.append({
+            'name': module,
+            'instrumentation': 'disabled',
+            'per_call_ns': min(timings),
+            'heavy_modules': heavy_modules
+        })
+
+    return results
+
+if __name__ == '__main__':
+
+    args = harness.get_parser(__doc__).parse_args()
+    results = run(args.repeat)
+
+    exit_code = harness.report('import', results, args)
+
+    for result in results:
+        if result['heavy_modules']:
+            harness.LOGGER.error('%s imports %s with instrumentation disabled', result['name'], ', '.join(result['heavy_modules']))
+            exit_code = 1
+
+    sys.exit(exit_code)
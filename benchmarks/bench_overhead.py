@@ -0,0 +1,126 @@
+"""Benchmark measuring the per-call overhead of the Octopus instrumentation
+wrappers against a bare call. Each wrapper is measured alone and stacked,
+with tracing enabled and disabled. Prometheus wrappers are measured both
+unbound and bound to a route rule, as applied by the plugin, and the
+stacked wrappers are compared against the fused PlatformMetrics wrapper.
+Spans are reported to an in-process fake reporter, which means that no
+jaeger agent is required
+
+    python -m benchmarks.bench_overhead --output overhead.json
+    python -m benchmarks.bench_overhead --compare overhead.json
+"""
+
+import sys
+
+import Octopus.bottle.jaeger_tracing.jaeger_config as jaeger_config
+import Octopus.bottle.prometheus.prometheus_config as prometheus_config
+
+from Octopus.bottle.jaeger_tracing import tracing
+from Octopus.bottle.platform_metrics import instrumentation
+from Octopus.bottle.prometheus import prometheus_metrics
+from Octopus.tracing import decorators
+from Octopus.tracing import jaeger
+
+from benchmarks import harness
+
+URL = 'http://localhost/benchmark'
+ROUTE = '/benchmark'
+
+
+def target(*args: tuple, **kwargs: dict) -> dict:
+    """Bare callback wrapped by the instrumentation"""
+
+    return {'success': True, 'http_code': 200}
+
+def request_function(url: str, *args: tuple, **kwargs: dict) -> dict:
+    """Bare request function passed to tracing.traced_request()"""
+
+    return {'success': True, 'http_code': 200}
+
+def configure(tracing_enabled: bool):
+    """Function used to configure the jaeger and prometheus
+    modules for a benchmark run. If tracing is disabled, the
+    tracers do not sample any spans"""
+
+    jaeger_config.JAEGER_CONFIG = jaeger_config.JaegerConfig(service_name='benchmark')
+    jaeger_config.ENABLE_JAEGER_TRACING = tracing_enabled
+
+    prometheus_config.PROMETHEUS_CONFIG = prometheus_config.PrometheusConfig(service_name='benchmark')
+
+    tracing.TRACER._tracer = harness.get_fake_tracer(sampled=tracing_enabled)
+    jaeger.TRACER._tracer = harness.get_fake_tracer(sampled=tracing_enabled)
+
+def get_scenarios() -> dict:
+    """Function used to build the wrapped callables that are
+    measured. Bare calls are used as the baseline
+
+    Returns:
+        dict mapping scenario name to (baseline, wrapped) callables
+    """
+
+    stacked = tracing.trace('/benchmark')(
+        prometheus_metrics.prometheus_request_latency(
+            prometheus_metrics.prometheus_request_counter(
+                prometheus_metrics.prometheus_in_progress_requests(target))))
+
+    # wrappers applied by the Prometheus plugin are bound to the route rule
+    stacked_bound = tracing.trace('/benchmark')(
+        prometheus_metrics.prometheus_request_latency(
+            prometheus_metrics.prometheus_request_counter(
+                prometheus_metrics.prometheus_in_progress_requests(target, route=ROUTE), route=ROUTE), route=ROUTE))
+
+    # fused wrapper applied by the PlatformMetrics plugin
+    fused = instrumentation.instrument_route(target, ROUTE, trace=True, metrics=['latency', 'request_count', 'processing_requests'])
+
+    traced_request = lambda: tracing.traced_request(request_function, URL, request_method='GET')
+
+    return {
+        'profiled_method': (target, decorators.profiled_method('Benchmark')(target)),
+        'trace': (target, tracing.trace('/benchmark')(target)),
+        'traced_request': (lambda: request_function(URL), traced_request),
+        'prometheus_request_latency': (target, prometheus_metrics.prometheus_request_latency(target)),
+        'prometheus_request_counter': (target, prometheus_metrics.prometheus_request_counter(target)),
+        'prometheus_in_progress_requests': (target, prometheus_metrics.prometheus_in_progress_requests(target)),
+        'prometheus_request_latency_bound': (target, prometheus_metrics.prometheus_request_latency(target, route=ROUTE)),
+        'prometheus_request_counter_bound': (target, prometheus_metrics.prometheus_request_counter(target, route=ROUTE)),
+        'prometheus_in_progress_requests_bound': (target, prometheus_metrics.prometheus_in_progress_requests(target, route=ROUTE)),
+        'stacked': (target, stacked),
+        'stacked_bound': (target, stacked_bound),
+        'platform_fused': (target, fused)
+    }
+
+def run(repeat: int, min_time: float) -> list:
+    """Function used to run all scenarios with tracing
+    enabled and disabled
+
+    Returns:
+        list of result dicts
+    """
+
+    results = []
+
+    harness.bind_request(headers={'X-Authenticated-Userid': 'benchmark-user'})
+
+    for tracing_enabled in [True, False]:
+        configure(tracing_enabled)
+
+        # traced requests are only traced within an active parent span
+        with tracing.TRACER.start_active_span('benchmark'):
+            for name, (baseline, wrapped) in get_scenarios().items():
+                baseline_ns = harness.measure(baseline, repeat=repeat, min_time=min_time)
+                wrapped_ns = harness.measure(wrapped, repeat=repeat, min_time=min_time)
+
+                results.append({
+                    'name': name,
+                    'tracing': 'enabled' if tracing_enabled else 'disabled',
+                    'baseline_ns': baseline_ns,
+                    'per_call_ns': wrapped_ns,
+                    'overhead_ns': wrapped_ns - baseline_ns
+                })
+    return results
+
+if __name__ == '__main__':
+
+    args = harness.get_parser(__doc__).parse_args()
+
+    sys.exit(harness.report('overhead', run(args.repeat, args.min_time), args))
@@ -0,0 +1,83 @@
+"""Benchmark comparing the construction cost of objects profiled per
+instance with octopus.profiled_instance() against objects of classes
+profiled once with octopus.profiled_class(). Construction time and the
+memory allocated per instance are measured
+
+    python -m benchmarks.bench_profiled_class --output profiled_class.json
+"""
+
+import sys
+import tracemalloc
+
+from Octopus.tracing import octopus
+
+from benchmarks import harness
+
+INSTANCES = 1000
+
+
+def make_class(name: str, methods: int = 20) -> type:
+    """Function used to create a class with a number
+    of plain methods"""
+
+    namespace = {f'method_{index}': lambda self: None for index in range(methods)}
+
+    return type(name, (object,), namespace)
+
+def measure_memory(factory: object) -> float:
+    """Function used to measure the memory allocated
+    per instance created by a factory
+
+    Returns:
+        float giving bytes per instance
+    """
+
+    tracemalloc.start()
+
+    instances = [factory() for _ in range(INSTANCES)]
+    size, _ = tracemalloc.get_traced_memory()
+
+    tracemalloc.stop()
+
+    del instances
+
+    return size / INSTANCES
+
+def run(repeat: int, min_time: float) -> list:
+    """Function used to measure construction of plain,
+    per-instance profiled and per-class profiled objects
+
+    Returns:
+        list of result dicts
+    """
+
+    octopus.ENABLE_OCTOPUS = True
+
+    plain_class = make_class('Plain')
+    instance_class = make_class('PerInstance')
+    profiled_class = octopus.profiled_class(make_class('PerClass'))
+
+    factories = {
+        'plain': plain_class,
+        'profiled_instance': lambda: octopus.profiled_instance(instance_class()),
+        'profiled_class': profiled_class
+    }
+
+    results = []
+
+    for name, factory in factories.items():
+        results.append({
+            'name': name,
+            'per_call_ns': harness.measure(factory, repeat=repeat, min_time=min_time),
+            'bytes_per_instance': measure_memory(factory)
+        })
+    return results
+
+if __name__ == '__main__':
+
+    args = harness.get_parser(__doc__).parse_args()
+
+    # suppress per-instance logging of profiled_instance
+    octopus.logger.disabled = True
+
+    sys.exit(harness.report('profiled_class', run(args.repeat, args.min_time), args))
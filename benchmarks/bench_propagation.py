@@ -0,0 +1,109 @@
+"""Benchmark comparing the per-request cost of extracting the parent span
+context through the tracer, which reads a bottle header view over the WSGI
+environ, against the Propagator, which reads the environ directly. Requests
+carry a typical set of headers, and each propagation format is measured with
+and without a parent context. The cost of injecting a span context into the
+headers of an outgoing request is measured for both as well. Jaeger headers
+are additionally measured without extraction of baggage headers
+
+    python -m benchmarks.bench_propagation --output propagation.json
+    python -m benchmarks.bench_propagation --compare propagation.json
+"""
+
+import sys
+
+import bottle
+import opentracing
+
+from Octopus.tracing import propagation
+
+from benchmarks import harness
+
+# headers sent by a typical client, in addition to the propagation headers
+HEADERS = {
+    'Host': 'localhost',
+    'User-Agent': 'python-requests/2.25.1',
+    'Accept': '*/*',
+    'Accept-Encoding': 'gzip, deflate',
+    'Connection': 'keep-alive',
+    'X-Authenticated-Userid': 'benchmark-user',
+    'X-Forwarded-For': '10.0.0.1'
+}
+
+PARENT_HEADERS = {
+    'jaeger': {'uber-trace-id': '5f0c3a1b2d4e6f70:1a2b3c4d5e6f7081:0:1'},
+    'w3c': {'traceparent': '00-0af7651916cd43dd8448eb211c80319c-b7ad6b7169203331-01', 'tracestate': 'vendor=value'},
+    'b3': {'X-B3-TraceId': '5f0c3a1b2d4e6f70', 'X-B3-SpanId': '1a2b3c4d5e6f7081', 'X-B3-Sampled': '1'},
+    'b3-single': {'b3': '5f0c3a1b2d4e6f70-1a2b3c4d5e6f7081-1'}
+}
+
+
+def get_environ(headers: dict) -> dict:
+    """Function used to create the WSGI environ of a
+    request carrying a set of headers"""
+
+    environ = harness.bind_request(headers={**HEADERS, **headers})
+    environ.pop('bottle.request.headers', None)
+
+    return environ
+
+def run(repeat: int, min_time: float) -> list:
+    """Function used to measure extraction and injection
+    of span contexts in all propagation formats
+
+    Returns:
+        list of result dicts
+    """
+
+    results = []
+
+    tracer = harness.get_fake_tracer()
+    span = tracer.start_span('benchmark')
+
+    scenarios = [(propagation_format, True) for propagation_format in PARENT_HEADERS] + [('jaeger', False)]
+
+    for propagation_format, baggage in scenarios:
+        propagator = propagation.get_propagator((propagation_format,), baggage)
+        parent_headers = PARENT_HEADERS[propagation_format]
+
+        for parent in ['present', 'absent']:
+            environ = get_environ(parent_headers if parent == 'present' else {})
+
+            # the tracer only extracts jaeger headers, which are used as the baseline of all formats
+            baseline_environ = get_environ(PARENT_HEADERS['jaeger'] if parent == 'present' else {})
+
+            baseline = lambda: tracer.extract(opentracing.Format.HTTP_HEADERS, bottle.WSGIHeaderDict(baseline_environ))
+            extract = lambda: propagator.extract(environ)
+
+            baseline_ns = harness.measure(baseline, repeat=repeat, min_time=min_time)
+            per_call_ns = harness.measure(extract, repeat=repeat, min_time=min_time)
+
+            results.append({
+                'name': 'extract',
+                'format': propagation_format,
+                'parent': parent,
+                'baggage': 'enabled' if baggage else 'disabled',
+                'baseline_ns': baseline_ns,
+                'per_call_ns': per_call_ns,
+                'speedup': baseline_ns / per_call_ns
+            })
+
+        baseline_ns = harness.measure(lambda: tracer.inject(span, opentracing.Format.HTTP_HEADERS, {}), repeat=repeat, min_time=min_time)
+        per_call_ns = harness.measure(lambda: propagator.inject(span.context, {}), repeat=repeat, min_time=min_time)
+
+        results.append({
+            'name': 'inject',
+            'format': propagation_format,
+            'baggage': 'enabled' if baggage else 'disabled',
+            'baseline_ns': baseline_ns,
+            'per_call_ns': per_call_ns,
+            'speedup': baseline_ns / per_call_ns
+        })
+
+    return results
+
+if __name__ == '__main__':
+
+    args = harness.get_parser(__doc__).parse_args()
+
+    sys.exit(harness.report('propagation', run(args.repeat, args.min_time), args))
@@ -0,0 +1,191 @@
+"""Module containing helpers shared by the benchmark scripts. Benchmarks
+measure the per-call cost of a callable with timeit, run against an
+in-process fake reporter instead of a jaeger agent and write their results
+as JSON, which allows results to be compared between releases"""
+
+import argparse
+import datetime
+import io
+import json
+import logging
+import platform
+import sys
+import timeit
+
+import bottle
+import jaeger_client
+
+from jaeger_client.reporter import BaseReporter
+from jaeger_client.sampler import ConstSampler
+
+LOGGER = logging.getLogger('octopus.benchmarks')
+
+
+class CountingReporter(BaseReporter):
+    """Fake span reporter used in place of the jaeger agent.
+    Spans are counted and discarded, which keeps memory constant
+    over long benchmark runs"""
+
+    def __init__(self):
+        self.spans = 0
+
+    def report_span(self, span: object):
+        self.spans += 1
+
+def get_fake_tracer(sampled: bool = True) -> jaeger_client.Tracer:
+    """Function used to create a jaeger tracer that reports
+    to a CountingReporter
+
+    Arguments:
+        sampled: bool sampling decision of the tracer
+
+    Returns:
+        instance of jaeger_client.Tracer
+    """
+
+    return jaeger_client.Tracer(service_name='benchmark', reporter=CountingReporter(), sampler=ConstSampler(sampled))
+
+def bind_request(path: str = '/benchmark', method: str = 'GET', headers: dict = {}) -> dict:
+    """Function used to bind a fake WSGI environment to the
+    thread-local bottle request and response objects, which
+    allows bottle wrappers to be called outside of a server
+
+    Arguments:
+        path: str giving request path
+        method: str giving request method
+        headers: dict of request headers
+
+    Returns:
+        bound WSGI environment
+    """
+
+    environ = {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http'
+    }
+
+    for key, value in headers.items():
+        environ['HTTP_' + key.upper().replace('-', '_')] = value
+
+    bottle.request.bind(environ)
+    bottle.response.bind()
+
+    return environ
+
+def measure(func: object, repeat: int = 5, min_time: float = 0.2) -> float:
+    """Function used to measure the per-call cost of a
+    callable. The number of calls per run is calibrated
+    so that each run takes at least min_time seconds, and
+    the best of all runs is returned
+
+    Arguments:
+        func: callable to measure
+        repeat: int number of runs
+        min_time: float minimum duration of a single run
+
+    Returns:
+        float giving per-call time in nanoseconds
+    """
+
+    timer = timeit.Timer(func)
+
+    number = 1
+    while timer.timeit(number) < min_time:
+        number *= 2
+
+    return min(timer.repeat(repeat=repeat, number=number)) / number * 1e9
+
+def get_parser(description: str) -> argparse.ArgumentParser:
+    """Function used to create the argument parser shared
+    by all benchmark scripts"""
+
+    parser = argparse.ArgumentParser(description=description)
+
+    parser.add_argument('--output', help='file to write JSON results to. results are written to stdout if not given')
+    parser.add_argument('--compare', help='JSON results of a previous run to compare against')
+    parser.add_argument('--threshold', type=float, default=1.25, help='maximum allowed slowdown ratio when comparing')
+    parser.add_argument('--repeat', type=int, default=5, help='number of runs per benchmark')
+    parser.add_argument('--min-time', type=float, default=0.2, help='minimum duration of a single run in seconds')
+
+    return parser
+
+def get_key(result: dict) -> tuple:
+    """Function used to identify a result across runs"""
+
+    return tuple(sorted((key, value) for key, value in result.items() if isinstance(value, str)))
+
+def compare_results(results: list, baseline: list, threshold: float) -> list:
+    """Function used to compare benchmark results with
+    the results of a previous run
+
+    Arguments:
+        results: list of current results
+        baseline: list of baseline results
+        threshold: float giving maximum allowed slowdown ratio
+
+    Returns:
+        list of results that regressed beyond the threshold
+    """
+
+    baseline = {get_key(result): result for result in baseline}
+    regressions = []
+
+    for result in results:
+        previous = baseline.get(get_key(result))
+
+        if previous is None or not previous.get('per_call_ns'):
+            continue
+
+        result['baseline_per_call_ns'] = previous['per_call_ns']
+        result['ratio'] = result['per_call_ns'] / previous['per_call_ns']
+
+        if result['ratio'] > threshold:
+            regressions.append(result)
+
+    return regressions
+
+def report(benchmark: str, results: list, args: argparse.Namespace) -> int:
+    """Function used to write the results of a benchmark as JSON
+    and compare them with a previous run if requested
+
+    Arguments:
+        benchmark: str giving benchmark name
+        results: list of result dicts
+        args: parsed command line arguments
+
+    Returns:
+        int exit code. non-zero if results regressed
+    """
+
+    regressions = []
+
+    if args.compare:
+        with open(args.compare) as baseline:
+            regressions = compare_results(results, json.load(baseline)['results'], args.threshold)
+
+    output = {
+        'benchmark': benchmark,
+        'timestamp': datetime.datetime.utcnow().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'results': results,
+        'regressions': regressions
+    }
+
+    if args.output:
+        with open(args.output, 'w') as output_file:
+            json.dump(output, output_file, indent=2)
+    else:
+        json.dump(output, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+
+    for regression in regressions:
+        LOGGER.error('regression in %s: %.2fx slower than baseline', get_key(regression), regression['ratio'])
+
+    return 1 if regressions else 0
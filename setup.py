@@ -7,7 +7,7 @@ setup(
   description='',
   author='Pascal Sauerborn',
   author_email='pascal.sauerborn@gmail.com',
-  packages=find_packages(),
+  packages=find_packages(exclude=['benchmarks', 'benchmarks.*', 'tests', 'tests.*']),
   install_requires=[
     'opentracing',
     'jaeger_client',
@@ -0,0 +1,45 @@
+"""Helpers shared by the tests"""
+
+import io
+import sys
+
+import jaeger_client
+
+from jaeger_client.reporter import InMemoryReporter
+from jaeger_client.sampler import ConstSampler
+
+from Octopus.tracing import lifecycle
+
+
+class InMemoryTracer(lifecycle.LazyTracer):
+    """Tracer proxy creating a sampled tracer that keeps
+    finished spans in memory"""
+
+    def __init__(self):
+
+        super().__init__()
+
+        self.reporter = InMemoryReporter()
+
+    def create(self) -> jaeger_client.Tracer:
+        return jaeger_client.Tracer(service_name='test', reporter=self.reporter, sampler=ConstSampler(True))
+
+
+def get_environ(path: str = '/a', method: str = 'GET') -> dict:
+    """Function used to create the WSGI environ of a request"""
+
+    return {
+        'REQUEST_METHOD': method,
+        'PATH_INFO': path,
+        'QUERY_STRING': '',
+        'SERVER_NAME': 'localhost',
+        'SERVER_PORT': '80',
+        'wsgi.input': io.BytesIO(),
+        'wsgi.errors': sys.stderr,
+        'wsgi.url_scheme': 'http'
+    }
+
+def get_tags(span: jaeger_client.Span) -> dict:
+    """Function used to map the tags of a span by key"""
+
+    return {tag.key: tag for tag in span.tags}
@@ -0,0 +1,178 @@
+"""Tests of the in-process span aggregator"""
+
+import unittest
+
+from unittest import mock
+
+import jaeger_client
+
+from jaeger_client.reporter import CompositeReporter, InMemoryReporter
+from jaeger_client.sampler import ConstSampler
+
+from Octopus.tracing import aggregator
+
+
+class TestTraceAggregator(unittest.TestCase):
+
+    def setUp(self):
+
+        patcher = mock.patch.object(aggregator, 'AGGREGATOR', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.agent_reporter = mock.Mock(return_value=InMemoryReporter())
+
+        span_reporter = aggregator.get_span_reporter('memory', self.agent_reporter, max_spans=5)
+        self.tracer = jaeger_client.Tracer(service_name='test', reporter=span_reporter, sampler=ConstSampler(True))
+
+        self.aggregator = aggregator.get_aggregator()
+
+    def finish(self, operation: str, duration: float, error: bool = False, child_of: object = None) -> jaeger_client.Span:
+        """Function used to finish a span with a given duration"""
+
+        span = self.tracer.start_span(operation, child_of=child_of, start_time=1000.0)
+
+        if error:
+            span.set_tag('error', True)
+
+        span.finish(finish_time=1000.0 + duration)
+
+        return span
+
+    def get_operations(self) -> dict:
+        return {operation['operation']: operation for operation in self.aggregator.get_operations()}
+
+    def test_memory_sink_does_not_create_agent_reporter(self):
+
+        self.assertIs(self.tracer.reporter, self.aggregator)
+        self.agent_reporter.assert_not_called()
+
+    def test_operations_ordered_by_total_duration(self):
+
+        for _ in range(3):
+            self.finish('GET - /fast', 0.01)
+
+        self.finish('GET - /slow', 1.0)
+
+        operations = self.aggregator.get_operations()
+
+        self.assertEqual([operation['operation'] for operation in operations], ['GET - /slow', 'GET - /fast'])
+        self.assertEqual(operations[1]['service'], 'test')
+        self.assertEqual(operations[1]['count'], 3)
+        self.assertAlmostEqual(operations[1]['mean'], 0.01)
+        self.assertAlmostEqual(operations[0]['max'], 1.0)
+
+    def test_quantiles(self):
+
+        for index in range(1, 101):
+            self.finish('GET - /items', index / 100)
+
+        operation = self.get_operations()['GET - /items']
+
+        self.assertAlmostEqual(operation['p50'], 0.5, delta=0.5 * 0.02)
+        self.assertAlmostEqual(operation['p90'], 0.9, delta=0.9 * 0.02)
+        self.assertAlmostEqual(operation['p99'], 0.99, delta=0.99 * 0.02)
+        self.assertAlmostEqual(operation['max'], 1.0)
+
+    def test_errors_are_counted(self):
+
+        self.finish('GET - /items', 0.1, error=True)
+        self.finish('GET - /items', 0.1)
+
+        self.assertEqual(self.get_operations()['GET - /items']['errors'], 1)
+
+    def test_operation_overflow(self):
+
+        self.aggregator.max_operations = 2
+
+        self.finish('GET - /a', 0.1)
+        self.finish('GET - /b', 0.1)
+        self.finish('GET - /c', 0.1)
+        self.finish('GET - /d', 0.1, error=True)
+        self.finish('GET - /a', 0.1)
+
+        operations = self.get_operations()
+
+        self.assertEqual(set(operations), {'GET - /a', 'GET - /b', aggregator.OVERFLOW_OPERATION})
+        self.assertEqual(operations['GET - /a']['count'], 2)
+        self.assertEqual(operations[aggregator.OVERFLOW_OPERATION]['count'], 2)
+        self.assertEqual(operations[aggregator.OVERFLOW_OPERATION]['errors'], 1)
+
+    def test_recent_spans(self):
+
+        parent = self.finish('GET - /items', 0.2)
+        self.finish('query', 0.1, child_of=parent)
+
+        for index in range(5):
+            self.finish(f'GET - /{index}', 0.1)
+
+        spans = self.aggregator.get_spans()
+
+        # the ring buffer keeps the most recent spans, newest first
+        self.assertEqual([span['operation'] for span in spans], [f'GET - /{index}' for index in reversed(range(5))])
+        self.assertEqual(len(self.aggregator.get_spans(limit=2)), 2)
+        self.assertEqual([span['operation'] for span in self.aggregator.get_spans(operation='GET - /3')], ['GET - /3'])
+
+    def test_span_details(self):
+
+        parent = self.finish('GET - /items', 0.2)
+        child = self.finish('query', 0.1, error=True, child_of=parent)
+
+        span, _ = self.aggregator.get_spans()
+
+        self.assertEqual(span['trace_id'], f'{parent.trace_id:x}')
+        self.assertEqual(span['span_id'], f'{child.span_id:x}')
+        self.assertEqual(span['parent_id'], f'{parent.span_id:x}')
+        self.assertAlmostEqual(span['duration'], 0.1)
+        self.assertTrue(span['error'])
+        self.assertEqual(span['tags']['error'], True)
+
+    def test_reset(self):
+
+        self.finish('GET - /items', 0.1)
+        self.aggregator.reset()
+
+        self.assertEqual(self.aggregator.get_operations(), [])
+        self.assertEqual(self.aggregator.get_spans(), [])
+
+
+class TestGetSpanReporter(unittest.TestCase):
+
+    def setUp(self):
+
+        patcher = mock.patch.object(aggregator, 'AGGREGATOR', None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.agent = InMemoryReporter()
+
+    def test_agent(self):
+
+        self.assertIs(aggregator.get_span_reporter('agent', lambda: self.agent), self.agent)
+        self.assertIsNone(aggregator.AGGREGATOR)
+
+    def test_both(self):
+
+        span_reporter = aggregator.get_span_reporter('both', lambda: self.agent)
+
+        self.assertIsInstance(span_reporter, CompositeReporter)
+        self.assertEqual(span_reporter.reporters, (self.agent, aggregator.get_aggregator()))
+
+        tracer = jaeger_client.Tracer(service_name='test', reporter=span_reporter, sampler=ConstSampler(True))
+        tracer.start_span('GET - /items').finish()
+
+        self.assertEqual(len(self.agent.get_spans()), 1)
+        self.assertEqual(aggregator.get_aggregator().get_operations()[0]['operation'], 'GET - /items')
+
+    def test_aggregator_shared_by_tracers(self):
+
+        self.assertIs(aggregator.get_span_reporter('memory', None), aggregator.get_span_reporter('both', lambda: self.agent).reporters[1])
+
+    def test_unknown_sink(self):
+
+        with self.assertRaises(ValueError):
+            aggregator.get_span_reporter('file', lambda: self.agent)
+
+
+if __name__ == '__main__':
+    unittest.main()
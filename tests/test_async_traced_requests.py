@@ -0,0 +1,117 @@
+"""Tests of the asyncio traced request client against a local HTTP server"""
+
+import asyncio
+import http.server
+import threading
+import time
+import unittest
+
+from unittest import mock
+
+import Octopus.bottle.jaeger_tracing.jaeger_config as config
+
+from Octopus.bottle.jaeger_tracing import async_traced_requests
+from Octopus.bottle.jaeger_tracing import tracing
+from Octopus.tracing import lifecycle
+
+from tests.helpers import InMemoryTracer
+
+
+class RecordingHandler(http.server.BaseHTTPRequestHandler):
+    """Request handler recording the headers of each request.
+    Requests to /slow are answered after a delay"""
+
+    def do_GET(self):
+
+        self.server.requests.append((self.path, dict(self.headers)))
+
+        if self.path == '/slow':
+            time.sleep(0.5)
+
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+        self.wfile.write(b'ok')
+
+    def log_message(self, *args: tuple):
+        pass
+
+
+class TestAsyncTracedSession(unittest.TestCase):
+
+    def setUp(self):
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), RecordingHandler)
+        self.server.requests = []
+
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+        self.tracer = InMemoryTracer()
+        self.addCleanup(lifecycle.PROXIES.remove, self.tracer)
+
+        for patcher in [mock.patch.object(config, 'ENABLE_JAEGER_TRACING', True), mock.patch.object(tracing, 'TRACER', self.tracer)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        config.set_jaeger_config({'service_name': 'test'})
+
+    def test_traced_gather_parents_requests(self):
+
+        async def gather() -> list:
+            async with async_traced_requests.AsyncTracedSession(max_workers=4) as session:
+                return await async_traced_requests.traced_gather('aggregate', *(session.get(f'{self.url}/item/{index}') for index in range(3)))
+
+        responses = asyncio.run(gather())
+
+        self.assertEqual([response.status_code for response in responses], [200, 200, 200])
+
+        spans = self.tracer.reporter.get_spans()
+        gather_span, = [span for span in spans if span.operation_name == 'aggregate']
+        request_spans = [span for span in spans if span is not gather_span]
+
+        self.assertEqual(len(request_spans), 3)
+
+        for span in request_spans:
+            self.assertEqual(span.trace_id, gather_span.trace_id)
+            self.assertEqual(span.parent_id, gather_span.span_id)
+
+        # each request carries the context of the gather span
+        self.assertEqual(len(self.server.requests), 3)
+
+        for path, headers in self.server.requests:
+            trace_id, span_id, _, flags = headers['uber-trace-id'].split(':')
+
+            self.assertEqual(int(trace_id, 16), gather_span.trace_id)
+            self.assertEqual(int(span_id, 16), gather_span.span_id)
+            self.assertEqual(int(flags, 16) & 0x01, 1)
+
+    def test_close_does_not_block_event_loop(self):
+
+        async def close() -> tuple:
+            session = async_traced_requests.AsyncTracedSession(max_workers=2)
+            request = asyncio.ensure_future(session.get(f'{self.url}/slow'))
+
+            await asyncio.sleep(0.1)
+
+            closing = asyncio.ensure_future(session.aclose())
+
+            # the event loop keeps running while the in-flight request finishes
+            await asyncio.sleep(0.05)
+            closed_early = closing.done()
+
+            await closing
+
+            return closed_early, (await request).status_code
+
+        closed_early, status_code = asyncio.run(close())
+
+        self.assertFalse(closed_early)
+        self.assertEqual(status_code, 200)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+"""Tests of the method filter patterns"""
+
+import re
+import unittest
+
+from Octopus.tracing import helpers
+
+
+class TestCompilePatterns(unittest.TestCase):
+
+    def test_no_patterns(self):
+
+        self.assertIsNone(helpers.compile_patterns([]))
+
+    def test_regex_patterns_match_start_of_name(self):
+
+        pattern = helpers.compile_patterns(['get_.*', 're:set_'])
+
+        self.assertIsInstance(pattern, re.Pattern)
+        self.assertTrue(pattern.match('get_item'))
+        self.assertTrue(pattern.match('set_item'))
+        self.assertFalse(pattern.match('item_get_'))
+
+    def test_glob_patterns(self):
+
+        pattern = helpers.compile_patterns(['glob:*_internal', 'glob:ItemService.*'])
+
+        self.assertTrue(pattern.match('load_internal'))
+        self.assertTrue(pattern.match('ItemService.get'))
+        self.assertFalse(pattern.match('load_internal_data'))
+        self.assertFalse(pattern.match('OrderService.get'))
+
+    def test_inline_global_flags(self):
+
+        pattern = helpers.compile_patterns(['(?i)get', 'set_.*'])
+
+        self.assertTrue(pattern.match('GET_item'))
+        self.assertTrue(pattern.match('set_item'))
+
+        # the flag only applies to its own pattern
+        self.assertFalse(pattern.match('SET_item'))
+
+    def test_backreferences_are_not_renumbered(self):
+
+        pattern = helpers.compile_patterns(['(get)_x', r'(a)_\1'])
+
+        self.assertTrue(pattern.match('get_x'))
+        self.assertTrue(pattern.match('a_a'))
+        self.assertFalse(pattern.match('a_get'))
+
+    def test_invalid_patterns_are_skipped(self):
+
+        with self.assertLogs('octopus.helpers', 'ERROR') as logs:
+            pattern = helpers.compile_patterns(['get_(', 'set_.*'], 'OCTOPUS_INCLUSION_PATTERNS')
+
+        self.assertIn('OCTOPUS_INCLUSION_PATTERNS', logs.output[0])
+        self.assertTrue(pattern.match('set_item'))
+        self.assertFalse(pattern.match('get_('))
+
+    def test_only_invalid_patterns(self):
+
+        with self.assertLogs('octopus.helpers', 'ERROR'):
+            self.assertIsNone(helpers.compile_patterns(['[']))
+
+
+class TestMethodFilter(unittest.TestCase):
+
+    def test_no_patterns_include_all_methods(self):
+
+        method_filter = helpers.MethodFilter()
+
+        self.assertEqual(method_filter.filter(['get', 'set']), ['get', 'set'])
+
+    def test_inclusion_and_exclusion_both_apply(self):
+
+        method_filter = helpers.MethodFilter(['get_.*'], ['glob:*_internal'])
+
+        self.assertEqual(method_filter.filter(['get_item', 'get_internal', 'set_item']), ['get_item'])
+
+    def test_qualified_names(self):
+
+        method_filter = helpers.MethodFilter(['glob:ItemService.*'], ['ItemService.delete'])
+
+        self.assertEqual(method_filter.filter(['get', 'delete'], 'ItemService'), ['get'])
+        self.assertEqual(method_filter.filter(['get', 'delete'], 'OrderService'), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,79 @@
+"""Tests of the tracer lifecycle against a local UDP listener"""
+
+import socket
+import threading
+import unittest
+
+from unittest import mock
+
+import jaeger_client
+import jaeger_client.reporter
+
+from jaeger_client.sampler import ConstSampler
+
+from Octopus.tracing import lifecycle
+from Octopus.tracing import reporter
+
+from tests.test_reporter import read_batch
+
+
+class AgentTracer(lifecycle.LazyTracer):
+    """Tracer proxy creating a tracer that reports to a local
+    listener through a logging composite reporter, as created
+    by get_tracer()"""
+
+    def __init__(self, port: int):
+
+        super().__init__()
+
+        self.port = port
+
+    def create(self) -> jaeger_client.Tracer:
+
+        span_reporter = reporter.BatchingReporter('127.0.0.1', self.port, flush_interval=60)
+        span_reporter = jaeger_client.reporter.CompositeReporter(span_reporter, jaeger_client.reporter.LoggingReporter())
+
+        return jaeger_client.Tracer(service_name='test-lifecycle', reporter=span_reporter, sampler=ConstSampler(True))
+
+
+class TestShutdown(unittest.TestCase):
+
+    def setUp(self):
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.settimeout(2)
+        self.addCleanup(self.listener.close)
+
+        self.tracer = AgentTracer(self.listener.getsockname()[1])
+        self.addCleanup(lifecycle.PROXIES.remove, self.tracer)
+
+    def test_shutdown_from_worker_thread_flushes_spans(self):
+
+        self.tracer.get().start_span('queued').finish()
+
+        # worker threads have no tornado event loop
+        with mock.patch.object(lifecycle, 'PROXIES', [self.tracer]):
+            thread = threading.Thread(target=lifecycle.shutdown)
+            thread.start()
+            thread.join()
+
+        packet, _ = self.listener.recvfrom(reporter.MAX_PACKET_SIZE)
+
+        self.assertEqual(read_batch(packet), ['queued'])
+
+    def test_shutdown_closes_tracer_once(self):
+
+        tracer = self.tracer.get()
+
+        with mock.patch.object(reporter.BatchingReporter, 'close') as close:
+            self.tracer.shutdown()
+            self.tracer.shutdown()
+
+        close.assert_called_once_with()
+
+        tracer.reporter.reporters[0].close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,74 @@
+"""Tests of the WSGI middleware"""
+
+import unittest
+
+from unittest import mock
+
+import Octopus.bottle.jaeger_tracing.jaeger_config as tracing_config
+
+from Octopus.tracing import lifecycle
+from Octopus.wsgi import middleware
+
+from tests.helpers import InMemoryTracer, get_environ, get_tags
+
+
+class TestInstrumentedResponse(unittest.TestCase):
+
+    def setUp(self):
+
+        patcher = mock.patch.object(tracing_config, 'ENABLE_JAEGER_TRACING', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        tracing_config.set_jaeger_config({'service_name': 'test'})
+
+        self.tracer = InMemoryTracer()
+        self.addCleanup(lifecycle.PROXIES.remove, self.tracer)
+
+    def call(self, app: object) -> list:
+        """Function used to call the middleware and consume
+        the response in the same way as a WSGI server"""
+
+        instrumented = middleware.OctopusMiddleware(app)
+        instrumented.tracer = self.tracer
+
+        result = instrumented(get_environ(), lambda status, headers, exc_info=None: None)
+
+        try:
+            return list(result)
+        finally:
+            result.close()
+
+    def test_successful_response_is_not_tagged_as_error(self):
+
+        def app(environ: dict, start_response: object) -> list:
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+            return [b'ok']
+
+        self.assertEqual(self.call(app), [b'ok'])
+
+        span, = self.tracer.reporter.get_spans()
+        tags = get_tags(span)
+
+        self.assertNotIn('error', tags)
+        self.assertEqual(tags['http.status_code'].vStr, '200')
+        self.assertEqual(tags['http.response_bytes'].vLong, 2)
+
+    def test_streaming_error_is_tagged_as_error(self):
+
+        def app(environ: dict, start_response: object) -> object:
+            start_response('200 OK', [('Content-Type', 'text/plain')])
+
+            yield b'partial'
+            raise ValueError('stream failed')
+
+        with self.assertRaises(ValueError):
+            self.call(app)
+
+        span, = self.tracer.reporter.get_spans()
+
+        self.assertTrue(get_tags(span)['error'].vBool)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,186 @@
+"""Tests of the profiling of classes"""
+
+import gc
+import unittest
+import weakref
+
+from unittest import mock
+
+from Octopus.tracing import helpers
+from Octopus.tracing import jaeger
+from Octopus.tracing import lifecycle
+from Octopus.tracing import octopus
+
+from tests.helpers import InMemoryTracer
+
+
+class ProfiledTestCase(unittest.TestCase):
+    """Test case profiling classes with a tracer that keeps
+    finished spans in memory"""
+
+    def setUp(self):
+
+        self.tracer = InMemoryTracer()
+        self.addCleanup(lifecycle.PROXIES.remove, self.tracer)
+
+        for patcher in [mock.patch.object(octopus, 'ENABLE_OCTOPUS', True), mock.patch.object(octopus, 'DIRECT_OMISSIONS', ['omitted']),
+                        mock.patch.object(helpers, 'METHOD_FILTER', helpers.MethodFilter()), mock.patch.object(jaeger, 'TRACER', self.tracer)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def get_operations(self) -> list:
+        return [span.operation_name for span in self.tracer.reporter.get_spans()]
+
+    def assertProfiled(self, cls: type, *names: tuple):
+
+        for name in names:
+            self.assertTrue(getattr(getattr(cls, name), '__octopus_profiled__', False), name)
+
+    def assertNotProfiled(self, cls: type, *names: tuple):
+
+        for name in names:
+            self.assertFalse(getattr(getattr(cls, name), '__octopus_profiled__', False), name)
+
+
+def make_service() -> type:
+    """Function used to create an unprofiled service class"""
+
+    class Service:
+
+        value = 1
+
+        def __init__(self):
+            self.calls = 0
+
+        def get(self, key: str) -> str:
+            self.calls += 1
+            return key
+
+        def health(self) -> bool:
+            return True
+
+        def omitted(self):
+            pass
+
+        @staticmethod
+        def parse(value: str) -> int:
+            return int(value)
+
+        @classmethod
+        def create(cls) -> object:
+            return cls()
+
+        @property
+        def name(self) -> str:
+            return 'service'
+
+    return Service
+
+
+class TestProfiledClass(ProfiledTestCase):
+
+    def test_decorator_without_arguments(self):
+
+        Service = octopus.profiled_class(make_service())
+
+        self.assertProfiled(Service, 'get', 'health', 'parse', 'create')
+        self.assertNotProfiled(Service, 'omitted', '__init__')
+        self.assertIsInstance(Service.__dict__['name'], property)
+
+        service = Service.create()
+
+        self.assertEqual(service.get('a'), 'a')
+        self.assertEqual(Service.parse('2'), 2)
+        self.assertEqual(service.name, 'service')
+        self.assertEqual(self.get_operations(), ['Service - create', 'Service - get', 'Service - parse'])
+
+    def test_decorator_with_arguments(self):
+
+        Service = octopus.profiled_class(exclusions=['health'])(make_service())
+
+        self.assertProfiled(Service, 'get')
+        self.assertNotProfiled(Service, 'health', 'omitted')
+        self.assertEqual(Service.__octopus_exclusions__, ('health',))
+
+    def test_wrapped_methods_keep_metadata(self):
+
+        Service = octopus.profiled_class(make_service())
+
+        self.assertEqual(Service.get.__name__, 'get')
+        self.assertEqual(Service.get.__qualname__, 'make_service.<locals>.Service.get')
+
+    def test_disabled(self):
+
+        with mock.patch.object(octopus, 'ENABLE_OCTOPUS', False):
+            Service = octopus.profiled_class(make_service())
+
+        self.assertNotProfiled(Service, 'get')
+
+    def test_methods_filtered_by_patterns(self):
+
+        with mock.patch.object(helpers, 'METHOD_FILTER', helpers.MethodFilter(['get', 'health'], ['Service.health'])):
+            Service = octopus.profiled_class(make_service())
+
+        self.assertProfiled(Service, 'get')
+        self.assertNotProfiled(Service, 'health', 'parse')
+
+
+class TestProfiledMeta(ProfiledTestCase):
+
+    def test_metaclass_profiles_subclasses(self):
+
+        class Base(metaclass=octopus.ProfiledMeta, exclusions=['health']):
+
+            def get(self):
+                pass
+
+            def health(self):
+                pass
+
+        class Child(Base):
+
+            def put(self):
+                pass
+
+            def health(self):
+                pass
+
+        self.assertProfiled(Child, 'get', 'put')
+        self.assertNotProfiled(Child, 'health')
+
+        # inherited methods are only wrapped once
+        self.assertIs(Child.get, Base.get)
+
+        Child().get()
+
+        self.assertEqual(self.get_operations(), ['Base - get'])
+
+
+class TestGetProfiledMethods(ProfiledTestCase):
+
+    def test_methods_cached_per_class_and_exclusions(self):
+
+        Service = make_service()
+
+        methods = octopus.get_profiled_methods(Service)
+
+        self.assertEqual(methods, ('create', 'get', 'health', 'parse'))
+        self.assertEqual(octopus.get_profiled_methods(Service, ['health']), ('create', 'get', 'parse'))
+        self.assertIs(octopus.get_profiled_methods(Service, ()), methods)
+        self.assertEqual(set(octopus._PROFILED_METHODS[Service]), {(), ('health',)})
+
+    def test_cache_is_released_with_class(self):
+
+        Service = make_service()
+        octopus.get_profiled_methods(Service)
+
+        reference = weakref.ref(Service)
+
+        del Service
+        gc.collect()
+
+        self.assertIsNone(reference())
+
+
+if __name__ == '__main__':
+    unittest.main()
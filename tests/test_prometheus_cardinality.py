@@ -0,0 +1,125 @@
+"""Tests of the cardinality limiter of the request metrics"""
+
+import unittest
+
+from unittest import mock
+
+import prometheus_client
+
+from Octopus.bottle.prometheus import prometheus_cardinality
+
+LABELS = ['method', 'endpoint', 'service', 'user', 'http_code']
+PRESERVED_LABELS = ['method', 'service', 'http_code']
+
+
+class TestCardinalityLimiter(unittest.TestCase):
+
+    def setUp(self):
+
+        self.registry = prometheus_client.CollectorRegistry()
+        self.counter = prometheus_client.Counter('requests', 'number of requests', LABELS, registry=self.registry)
+
+        patcher = mock.patch.object(prometheus_cardinality.time, 'monotonic', return_value=0.0)
+        self.monotonic = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create(self, max_series: int = 2, expiry: float = 0) -> prometheus_cardinality.CardinalityLimiter:
+        return prometheus_cardinality.CardinalityLimiter(self.counter, max_series=max_series, expiry=expiry, preserved_labels=PRESERVED_LABELS)
+
+    def inc(self, limiter: prometheus_cardinality.CardinalityLimiter, endpoint: str, method: str = 'GET', http_code: str = '200'):
+        limiter.labels(method=method, endpoint=endpoint, service='test', user='none', http_code=http_code).inc()
+
+    def get_series(self) -> dict:
+        """Function used to map the label values of all series
+        in the registry to their values"""
+
+        return {tuple(sample.labels[name] for name in LABELS): sample.value
+                for metric in self.registry.collect() for sample in metric.samples if sample.name == 'requests_total'}
+
+    def test_children_are_reused(self):
+
+        limiter = self.create()
+
+        self.inc(limiter, '/a')
+        self.inc(limiter, '/a')
+
+        self.assertEqual(len(limiter), 1)
+        self.assertEqual(self.get_series(), {('GET', '/a', 'test', 'none', '200'): 2})
+
+    def test_new_series_overflow_once_max_series_reached(self):
+
+        limiter = self.create(max_series=2)
+
+        self.inc(limiter, '/a')
+        self.inc(limiter, '/b')
+
+        with self.assertLogs('octopus.bottle.prometheus', 'WARNING'):
+            self.inc(limiter, '/c', method='POST', http_code='500')
+
+        self.inc(limiter, '/d', method='POST', http_code='500')
+        self.inc(limiter, '/e')
+
+        # existing series are still recorded
+        self.inc(limiter, '/a')
+
+        self.assertEqual(self.get_series(), {
+            ('GET', '/a', 'test', 'none', '200'): 2,
+            ('GET', '/b', 'test', 'none', '200'): 1,
+            ('POST', 'overflow', 'test', 'overflow', '500'): 2,
+            ('GET', 'overflow', 'test', 'overflow', '200'): 1
+        })
+
+    def test_no_limit(self):
+
+        limiter = self.create(max_series=0)
+
+        for index in range(10):
+            self.inc(limiter, f'/{index}')
+
+        self.assertEqual(len(limiter), 10)
+
+    def test_idle_series_are_expired(self):
+
+        limiter = self.create(max_series=0, expiry=10)
+
+        self.inc(limiter, '/a')
+
+        self.monotonic.return_value = 5.0
+        self.inc(limiter, '/b')
+
+        self.monotonic.return_value = 12.0
+        self.inc(limiter, '/c')
+
+        # /a was idle for longer than the expiry, /b was used within the expiry
+        self.assertEqual(set(self.get_series()), {('GET', '/b', 'test', 'none', '200'), ('GET', '/c', 'test', 'none', '200')})
+        self.assertEqual(len(limiter), 2)
+
+    def test_used_series_are_not_expired(self):
+
+        limiter = self.create(max_series=0, expiry=10)
+
+        self.inc(limiter, '/a')
+        self.inc(limiter, '/b')
+
+        self.monotonic.return_value = 9.0
+        self.inc(limiter, '/a')
+
+        self.monotonic.return_value = 15.0
+        self.inc(limiter, '/c')
+
+        self.assertEqual(set(self.get_series()), {('GET', '/a', 'test', 'none', '200'), ('GET', '/c', 'test', 'none', '200')})
+
+    def test_expired_series_make_room_for_new_series(self):
+
+        limiter = self.create(max_series=1, expiry=10)
+
+        self.inc(limiter, '/a')
+
+        self.monotonic.return_value = 10.0
+        self.inc(limiter, '/b')
+
+        self.assertEqual(set(self.get_series()), {('GET', '/b', 'test', 'none', '200')})
+
+
+if __name__ == '__main__':
+    unittest.main()
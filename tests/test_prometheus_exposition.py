@@ -0,0 +1,146 @@
+"""Tests of the renderer of the /metrics route"""
+
+import gzip
+import unittest
+
+from unittest import mock
+
+import prometheus_client
+
+from prometheus_client import exposition
+
+from Octopus.bottle.prometheus import prometheus_exposition
+
+OPENMETRICS = 'application/openmetrics-text'
+
+# content type of the prometheus text format served to clients without Accept header
+TEXT_CONTENT_TYPE = exposition.choose_encoder(None)[1]
+
+
+class TestAcceptsGzip(unittest.TestCase):
+
+    def test_accepted(self):
+
+        for value in ['gzip', 'deflate, gzip', 'GZIP;q=0.5', 'x-gzip', '*', 'br;q=1.0, *;q=0.1', 'gzip; q=1']:
+            self.assertTrue(prometheus_exposition.accepts_gzip(value), value)
+
+    def test_refused(self):
+
+        for value in ['', 'identity', 'deflate, br', 'gzip;q=0', 'gzip;q=0.0, deflate', 'gzip;q=invalid', '*;q=0']:
+            self.assertFalse(prometheus_exposition.accepts_gzip(value), value)
+
+    def test_explicit_gzip_takes_precedence_over_wildcard(self):
+
+        self.assertFalse(prometheus_exposition.accepts_gzip('gzip;q=0, *'))
+        self.assertTrue(prometheus_exposition.accepts_gzip('*;q=0, gzip'))
+
+
+class TestMetricsRenderer(unittest.TestCase):
+
+    def setUp(self):
+
+        self.registry = prometheus_client.CollectorRegistry()
+        self.counter = prometheus_client.Counter('requests', 'number of requests', registry=self.registry)
+
+        patcher = mock.patch.object(prometheus_exposition.time, 'monotonic', return_value=100.0)
+        self.monotonic = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_prometheus_format_by_default(self):
+
+        status, headers, body = prometheus_exposition.MetricsRenderer(self.registry).render()
+
+        self.assertEqual(status, 200)
+        self.assertEqual(headers['Content-Type'], TEXT_CONTENT_TYPE)
+        self.assertEqual(body, exposition.generate_latest(self.registry))
+        self.assertNotIn(b'# EOF', body)
+
+    def test_openmetrics_negotiated_from_accept_header(self):
+
+        status, headers, body = prometheus_exposition.MetricsRenderer(self.registry).render(accept=OPENMETRICS)
+
+        self.assertTrue(headers['Content-Type'].startswith(OPENMETRICS))
+        self.assertTrue(body.endswith(b'# EOF\n'))
+
+    def test_openmetrics_disabled(self):
+
+        _, headers, _ = prometheus_exposition.MetricsRenderer(self.registry, enable_openmetrics=False).render(accept=OPENMETRICS)
+
+        self.assertEqual(headers['Content-Type'], TEXT_CONTENT_TYPE)
+
+    def test_output_is_cached_for_ttl(self):
+
+        renderer = prometheus_exposition.MetricsRenderer(self.registry, ttl=10)
+
+        _, _, body = renderer.render()
+        self.counter.inc()
+
+        self.monotonic.return_value = 109.0
+        self.assertEqual(renderer.render()[2], body)
+
+        self.monotonic.return_value = 110.0
+        self.assertNotEqual(renderer.render()[2], body)
+        self.assertIn(b'requests_total 1.0', renderer.render()[2])
+
+    def test_formats_are_cached_separately(self):
+
+        renderer = prometheus_exposition.MetricsRenderer(self.registry, ttl=10)
+
+        self.assertNotEqual(renderer.render()[2], renderer.render(accept=OPENMETRICS)[2])
+
+    def test_no_caching_without_ttl(self):
+
+        renderer = prometheus_exposition.MetricsRenderer(self.registry)
+
+        renderer.render()
+        self.counter.inc()
+
+        self.assertIn(b'requests_total 1.0', renderer.render()[2])
+
+    def test_matching_etag_returns_not_modified(self):
+
+        renderer = prometheus_exposition.MetricsRenderer(self.registry, ttl=10)
+
+        _, headers, _ = renderer.render()
+        status, not_modified_headers, body = renderer.render(if_none_match=f'"other", {headers["ETag"]}')
+
+        self.assertEqual((status, body), (304, b''))
+        self.assertEqual(not_modified_headers['ETag'], headers['ETag'])
+
+    def test_changed_output_has_new_etag(self):
+
+        renderer = prometheus_exposition.MetricsRenderer(self.registry)
+
+        _, headers, _ = renderer.render()
+        self.counter.inc()
+
+        status, changed_headers, _ = renderer.render(if_none_match=headers['ETag'])
+
+        self.assertEqual(status, 200)
+        self.assertNotEqual(changed_headers['ETag'], headers['ETag'])
+
+    def test_gzip(self):
+
+        renderer = prometheus_exposition.MetricsRenderer(self.registry)
+
+        _, headers, body = renderer.render(accept_encoding='gzip, deflate')
+
+        self.assertEqual(headers['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(body), exposition.generate_latest(self.registry))
+
+    def test_gzip_refused(self):
+
+        _, headers, body = prometheus_exposition.MetricsRenderer(self.registry).render(accept_encoding='gzip;q=0')
+
+        self.assertNotIn('Content-Encoding', headers)
+        self.assertEqual(body, exposition.generate_latest(self.registry))
+
+    def test_gzip_disabled(self):
+
+        _, headers, _ = prometheus_exposition.MetricsRenderer(self.registry, enable_gzip=False).render(accept_encoding='gzip')
+
+        self.assertNotIn('Content-Encoding', headers)
+
+
+if __name__ == '__main__':
+    unittest.main()
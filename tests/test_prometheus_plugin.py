@@ -0,0 +1,59 @@
+"""Tests of the prometheus plugin"""
+
+import unittest
+
+from unittest import mock
+
+import bottle
+
+import Octopus.bottle.jaeger_tracing.jaeger_config as jaeger_config
+import Octopus.bottle.prometheus.prometheus_config as config
+
+from Octopus.bottle.jaeger_tracing.tracing_plugin import JaegerTracing
+from Octopus.bottle.prometheus import prometheus_metrics
+from Octopus.bottle.prometheus import prometheus_plugin
+
+
+class TestPluginOrder(unittest.TestCase):
+
+    def setUp(self):
+
+        # the plugin module only imports the metrics module if metrics are enabled at import
+        for patcher in [mock.patch.object(config, 'ENABLE_PROMETHEUS_METRICS', True),
+                        mock.patch.object(jaeger_config, 'ENABLE_JAEGER_TRACING', True),
+                        mock.patch.object(prometheus_plugin, 'prometheus_metrics', prometheus_metrics, create=True)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def setup_plugin(self, app: bottle.Bottle, metrics: list):
+        """Function used to set up a Prometheus plugin on an
+        application, as done by bottle before installing it"""
+
+        prometheus_plugin.Prometheus({'service_name': 'test', 'metrics': metrics}).setup(app)
+
+    def test_warns_without_tracing_plugin(self):
+
+        with self.assertLogs('octopus.bottle.prometheus', 'WARNING') as logs:
+            self.setup_plugin(bottle.Bottle(), ['latency', 'resource_usage'])
+
+        self.assertIn('latency exemplars and resource usage tags will not be attached', logs.output[-1])
+
+    def test_warns_for_resource_usage_without_exemplars(self):
+
+        with self.assertLogs('octopus.bottle.prometheus', 'WARNING') as logs:
+            self.setup_plugin(bottle.Bottle(), ['request_count', 'resource_usage'])
+
+        self.assertIn('resource usage tags will not be attached', logs.output[-1])
+        self.assertNotIn('exemplars', logs.output[-1])
+
+    def test_no_warning_with_tracing_plugin_installed_first(self):
+
+        app = bottle.Bottle()
+        app.plugins.append(mock.Mock(spec=JaegerTracing))
+
+        with self.assertNoLogs('octopus.bottle.prometheus', 'WARNING'):
+            self.setup_plugin(app, ['latency', 'resource_usage'])
+
+
+if __name__ == '__main__':
+    unittest.main()
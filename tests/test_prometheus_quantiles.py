@@ -0,0 +1,205 @@
+"""Tests of the sketch files and collector of the quantile metric"""
+
+import json
+import os
+import tempfile
+import unittest
+
+from unittest import mock
+
+from Octopus.bottle.prometheus import prometheus_quantiles
+from Octopus.tracing import sketch
+
+
+def get_key(relative_accuracy: float = 0.01, labels: dict = None, quantiles: list = [0.5, 0.99]) -> str:
+    """Function used to create the key of a latency series"""
+
+    return prometheus_quantiles.get_key('latency', 'request latency', relative_accuracy, quantiles, labels or {'endpoint': '/a'})
+
+def get_sketch(values: list, relative_accuracy: float = 0.01) -> sketch.DDSketch:
+    """Function used to create a sketch of a list of values"""
+
+    values_sketch = sketch.DDSketch(relative_accuracy)
+
+    for value in values:
+        values_sketch.add(value)
+
+    return values_sketch
+
+
+class SketchFileTestCase(unittest.TestCase):
+    """Test case writing sketch files to a temporary directory"""
+
+    def setUp(self):
+
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+
+        self.path = directory.name
+
+    def get_filename(self, pid: object) -> str:
+        return os.path.join(self.path, f'quantile_{pid}.sketch')
+
+    def write(self, pid: object, series: dict):
+        """Function used to write a sketch file with the given
+        mapping of series keys to observed values"""
+
+        sketch_file = prometheus_quantiles.SketchFile(self.get_filename(pid))
+
+        try:
+            for key, values in series.items():
+                sketch_file.write(key, get_sketch(values, json.loads(key)[2]))
+        finally:
+            sketch_file.close()
+
+
+class TestSketchFile(SketchFileTestCase):
+
+    def test_observe_round_trip(self):
+
+        key, mapping = get_key(), sketch.DDSketch(0.01)
+        sketch_file = prometheus_quantiles.SketchFile(self.get_filename(1))
+
+        try:
+            for value in [0, 0.1, 0.1, 2.5]:
+                sketch_file.observe(key, len(mapping.counts), mapping.get_index(value), value)
+        finally:
+            sketch_file.close()
+
+        (read_key, count, zero_count, total, counts), = prometheus_quantiles.read_sketch_file(self.get_filename(1))
+
+        self.assertEqual(read_key, key)
+        self.assertEqual((count, zero_count, total), (4, 1, 2.7))
+        self.assertEqual(counts[mapping.get_index(0.1)], 2)
+        self.assertEqual(counts[mapping.get_index(2.5)], 1)
+
+    def test_reopened_file_appends_to_existing_series(self):
+
+        key, other = get_key(), get_key(labels={'endpoint': '/b'})
+
+        self.write(1, {key: [1.0]})
+        self.write(1, {other: [2.0]})
+
+        series = {entry[0]: entry[1] for entry in prometheus_quantiles.read_sketch_file(self.get_filename(1))}
+
+        self.assertEqual(series, {key: 1, other: 1})
+
+    def test_files_grow_beyond_initial_size(self):
+
+        keys = [get_key(labels={'endpoint': f'/{index}'}) for index in range(200)]
+
+        self.write(1, {key: [1.0] for key in keys})
+
+        self.assertGreater(os.path.getsize(self.get_filename(1)), prometheus_quantiles.INITIAL_FILE_SIZE)
+        self.assertEqual([entry[0] for entry in prometheus_quantiles.read_sketch_file(self.get_filename(1))], keys)
+
+    def test_merge_process_and_archive_files(self):
+
+        key, other = get_key(), get_key(labels={'endpoint': '/b'})
+
+        self.write(1, {key: [0.1, 0.2]})
+        self.write(2, {key: [0.3], other: [5.0]})
+        self.write(prometheus_quantiles.ARCHIVE_NAME, {key: [0.4, 0.5]})
+
+        files = [self.get_filename(pid) for pid in [1, 2, prometheus_quantiles.ARCHIVE_NAME, 3]]
+        merged = prometheus_quantiles.merge_sketch_files(files)
+
+        self.assertEqual(set(merged), {key, other})
+        self.assertEqual(merged[key].count, 5)
+        self.assertAlmostEqual(merged[key].sum, 1.5)
+        self.assertAlmostEqual(merged[key].quantile(1.0), 0.5, delta=0.01)
+        self.assertEqual(merged[other].count, 1)
+
+    def test_archive_sketch_file(self):
+
+        key = get_key()
+
+        self.write(1, {key: [0.1]})
+        self.write(prometheus_quantiles.ARCHIVE_NAME, {key: [0.2]})
+
+        prometheus_quantiles.archive_sketch_file(1, self.path)
+
+        self.assertFalse(os.path.exists(self.get_filename(1)))
+        self.assertEqual(os.listdir(self.path), [f'quantile_{prometheus_quantiles.ARCHIVE_NAME}.sketch'])
+
+        merged = prometheus_quantiles.merge_sketch_files([self.get_filename(prometheus_quantiles.ARCHIVE_NAME)])
+
+        self.assertEqual(merged[key].count, 2)
+        self.assertAlmostEqual(merged[key].sum, 0.3)
+
+    def test_archive_of_missing_file(self):
+
+        prometheus_quantiles.archive_sketch_file(1, self.path)
+
+        self.assertEqual(os.listdir(self.path), [])
+
+
+class TestQuantileCollector(SketchFileTestCase):
+
+    def setUp(self):
+
+        super().setUp()
+
+        patcher = mock.patch.dict(prometheus_quantiles.PARAMETERS, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.collector = prometheus_quantiles.QuantileCollector(None, self.path)
+
+    def collect(self) -> dict:
+        """Function used to map the samples of the collected
+        metrics by sample name and quantile"""
+
+        return {(sample.name, sample.labels.get('quantile')): sample.value for metric in self.collector.collect() for sample in metric.samples}
+
+    def touch(self, pid: object, mtime: float):
+        os.utime(self.get_filename(pid), (mtime, mtime))
+
+    def test_collect_merges_files(self):
+
+        self.write(1, {get_key(): [0.1]})
+        self.write(2, {get_key(): [0.2, 0.3]})
+
+        samples = self.collect()
+
+        self.assertEqual(samples[('latency_count', None)], 3)
+        self.assertAlmostEqual(samples[('latency', '0.5')], 0.2, delta=0.01)
+
+    def test_configured_parameters_are_preferred(self):
+
+        prometheus_quantiles.Quantile('latency', 'request latency', ['endpoint'], quantiles=[0.5, 0.99], relative_accuracy=0.01, path=self.path)
+
+        self.write(1, {get_key(): [0.1]})
+        self.write(2, {get_key(relative_accuracy=0.05): [0.2, 0.3]})
+        self.touch(1, 1000)
+
+        with self.assertLogs('octopus.bottle.prometheus', 'WARNING'):
+            samples = self.collect()
+
+        self.assertEqual(samples[('latency_count', None)], 1)
+
+    def test_process_files_are_preferred_over_archive(self):
+
+        self.write(1, {get_key(): [0.1]})
+        self.write(prometheus_quantiles.ARCHIVE_NAME, {get_key(relative_accuracy=0.05): [0.2, 0.3]})
+        self.touch(1, 1000)
+
+        with self.assertLogs('octopus.bottle.prometheus', 'WARNING'):
+            samples = self.collect()
+
+        self.assertEqual(samples[('latency_count', None)], 1)
+
+    def test_most_recent_file_is_preferred(self):
+
+        self.write(1, {get_key(relative_accuracy=0.05): [0.1]})
+        self.write(2, {get_key(): [0.2, 0.3]})
+        self.touch(1, 1000)
+
+        with self.assertLogs('octopus.bottle.prometheus', 'WARNING'):
+            samples = self.collect()
+
+        self.assertEqual(samples[('latency_count', None)], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
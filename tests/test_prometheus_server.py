@@ -0,0 +1,59 @@
+"""Tests of the metrics side listener"""
+
+import time
+import unittest
+import urllib.request
+
+from Octopus.bottle.prometheus import prometheus_server
+
+
+class TestMetricsListener(unittest.TestCase):
+
+    def setUp(self):
+
+        prometheus_server.register_handler('/ping', lambda environ: (200, {'Content-Type': 'text/plain'}, b'pong'))
+        self.addCleanup(prometheus_server.HANDLERS.pop, '/ping')
+
+    def start(self, port: int, retry_interval: float) -> prometheus_server.MetricsListener:
+
+        listener = prometheus_server.start_server('127.0.0.1', port, retry_interval=retry_interval)
+        self.addCleanup(listener.shutdown)
+
+        return listener
+
+    def test_port_is_taken_over_once_released(self):
+
+        first = self.start(0, retry_interval=0)
+        port = first.server.server_port
+
+        second = self.start(port, retry_interval=0.05)
+
+        self.assertIsNone(second.server)
+
+        first.shutdown()
+
+        deadline = time.monotonic() + 5
+
+        while second.server is None and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+        self.assertIsNotNone(second.server)
+
+        with urllib.request.urlopen(f'http://127.0.0.1:{port}/ping', timeout=5) as response:
+            self.assertEqual(response.read(), b'pong')
+
+    def test_shutdown_stops_retries(self):
+
+        first = self.start(0, retry_interval=0)
+        second = self.start(first.server.server_port, retry_interval=0.05)
+
+        second.shutdown()
+        first.shutdown()
+
+        time.sleep(0.2)
+
+        self.assertIsNone(second.server)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,189 @@
+"""Tests of the propagation of span contexts in request headers"""
+
+import unittest
+
+import jaeger_client
+
+from jaeger_client.sampler import ConstSampler
+
+from Octopus.tracing import propagation
+
+TRACE_ID = 0x463ac35c9f6413ad
+TRACE_ID_128 = 0x463ac35c9f6413ad48485a3953bb6124
+SPAN_ID = 0xa2fb4a1d1a96d312
+PARENT_ID = 0x0020000000000001
+
+
+def get_context(trace_id: int = TRACE_ID, parent_id: int = PARENT_ID, flags: int = propagation.SAMPLED_FLAG, baggage: dict = None) -> jaeger_client.SpanContext:
+    return jaeger_client.SpanContext(trace_id, SPAN_ID, parent_id, flags, baggage=baggage)
+
+
+class TestRoundTrip(unittest.TestCase):
+
+    def round_trip(self, propagation_format: str, context: jaeger_client.SpanContext) -> tuple:
+        """Function used to inject a context in a format and
+        extract it from the resulting WSGI environ
+
+        Returns:
+            tuple of (injected headers, extracted context)
+        """
+
+        propagator = propagation.Propagator((propagation_format,))
+        headers = propagator.inject(context, {})
+
+        return headers, propagator.extract(propagation.get_environ(headers))
+
+    def assertContext(self, context: jaeger_client.SpanContext, trace_id: int, parent_id: int, flags: int):
+        self.assertEqual((context.trace_id, context.span_id, context.parent_id, context.flags), (trace_id, SPAN_ID, parent_id, flags))
+
+    def test_jaeger(self):
+
+        headers, context = self.round_trip('jaeger', get_context(baggage={'user-id': 'a b'}))
+
+        self.assertEqual(headers['uber-trace-id'], f'{TRACE_ID:x}:{SPAN_ID:x}:{PARENT_ID:x}:1')
+        self.assertContext(context, TRACE_ID, PARENT_ID, propagation.SAMPLED_FLAG)
+        self.assertEqual(context.baggage, {'user-id': 'a b'})
+
+    def test_jaeger_not_sampled(self):
+
+        _, context = self.round_trip('jaeger', get_context(flags=0))
+
+        self.assertContext(context, TRACE_ID, PARENT_ID, 0)
+
+    def test_w3c(self):
+
+        headers, context = self.round_trip('w3c', get_context(trace_id=TRACE_ID_128, baggage={propagation.TRACESTATE_KEY: 'vendor=value'}))
+
+        self.assertEqual(headers['traceparent'], f'00-{TRACE_ID_128:032x}-{SPAN_ID:016x}-01')
+        self.assertEqual(headers['tracestate'], 'vendor=value')
+
+        # the parent ID is not carried by the W3C format
+        self.assertContext(context, TRACE_ID_128, None, propagation.SAMPLED_FLAG)
+        self.assertEqual(context.baggage, {propagation.TRACESTATE_KEY: 'vendor=value'})
+
+    def test_w3c_pads_64_bit_trace_ids(self):
+
+        headers, context = self.round_trip('w3c', get_context())
+
+        self.assertEqual(headers['traceparent'].split('-')[1], f'{TRACE_ID:032x}')
+        self.assertEqual(context.trace_id, TRACE_ID)
+
+    def test_b3(self):
+
+        headers, context = self.round_trip('b3', get_context(trace_id=TRACE_ID_128))
+
+        self.assertEqual(headers['X-B3-TraceId'], f'{TRACE_ID_128:032x}')
+        self.assertEqual(headers['X-B3-Sampled'], '1')
+        self.assertContext(context, TRACE_ID_128, PARENT_ID, propagation.SAMPLED_FLAG)
+
+    def test_b3_debug(self):
+
+        headers, context = self.round_trip('b3', get_context(flags=propagation.SAMPLED_FLAG | propagation.DEBUG_FLAG))
+
+        self.assertEqual(headers['X-B3-Flags'], '1')
+        self.assertNotIn('X-B3-Sampled', headers)
+        self.assertContext(context, TRACE_ID, PARENT_ID, propagation.SAMPLED_FLAG | propagation.DEBUG_FLAG)
+
+    def test_b3_single(self):
+
+        headers, context = self.round_trip('b3-single', get_context())
+
+        self.assertEqual(headers['b3'], f'{TRACE_ID:016x}-{SPAN_ID:016x}-1-{PARENT_ID:016x}')
+        self.assertContext(context, TRACE_ID, PARENT_ID, propagation.SAMPLED_FLAG)
+
+    def test_b3_single_without_parent(self):
+
+        headers, context = self.round_trip('b3-single', get_context(parent_id=None, flags=0))
+
+        self.assertEqual(headers['b3'], f'{TRACE_ID:016x}-{SPAN_ID:016x}-0')
+        self.assertContext(context, TRACE_ID, None, 0)
+
+    def test_inject_all_formats(self):
+
+        headers = propagation.Propagator(('jaeger', 'w3c', 'b3', 'b3-single')).inject(get_context(), {})
+
+        self.assertEqual(set(headers), {'uber-trace-id', 'traceparent', 'X-B3-TraceId', 'X-B3-SpanId', 'X-B3-ParentSpanId', 'X-B3-Sampled', 'b3'})
+
+    def test_first_format_found_is_extracted(self):
+
+        propagator = propagation.Propagator(('w3c', 'jaeger'))
+        environ = propagation.get_environ({'uber-trace-id': f'{TRACE_ID:x}:{SPAN_ID:x}:0:1'})
+
+        self.assertContext(propagator.extract(environ), TRACE_ID, None, propagation.SAMPLED_FLAG)
+
+
+class TestInvalidHeaders(unittest.TestCase):
+
+    def extract(self, formats: tuple, headers: dict) -> jaeger_client.SpanContext:
+        return propagation.Propagator(formats).extract(propagation.get_environ(headers))
+
+    def test_no_headers(self):
+
+        self.assertIsNone(self.extract(('jaeger', 'w3c', 'b3'), {}))
+
+    def test_invalid_uber_trace_id(self):
+
+        for value in ['abc', '1:2:3', 'x:1:0:1', '0:1:0:1', '1:0:0:1']:
+            self.assertIsNone(self.extract(('jaeger',), {'uber-trace-id': value}), value)
+
+    def test_invalid_traceparent(self):
+
+        for value in [f'00-{TRACE_ID_128:032x}-{SPAN_ID:016x}', f'ff-{TRACE_ID_128:032x}-{SPAN_ID:016x}-01',
+                      f'00-{0:032x}-{SPAN_ID:016x}-01', f'00-{TRACE_ID_128:032x}-{SPAN_ID:016x}-01-extra',
+                      f'00-{TRACE_ID:016x}-{SPAN_ID:016x}-01']:
+            self.assertIsNone(self.extract(('w3c',), {'traceparent': value}), value)
+
+    def test_future_traceparent_version(self):
+
+        context = self.extract(('w3c',), {'traceparent': f'01-{TRACE_ID_128:032x}-{SPAN_ID:016x}-01-extra'})
+
+        self.assertEqual(context.trace_id, TRACE_ID_128)
+
+    def test_invalid_b3(self):
+
+        for headers in [{'b3': 'abc'}, {'b3': f'{TRACE_ID:x}-xyz-1'}, {'b3': 'a-b-c-d-e'}, {'X-B3-TraceId': f'{TRACE_ID:x}'},
+                        {'X-B3-TraceId': 'xyz', 'X-B3-SpanId': f'{SPAN_ID:x}'}]:
+            self.assertIsNone(self.extract(('b3',), headers), headers)
+
+    def test_invalid_headers_do_not_prevent_other_formats(self):
+
+        context = self.extract(('jaeger', 'b3'), {'uber-trace-id': 'abc', 'b3': f'{TRACE_ID:x}-{SPAN_ID:x}-1'})
+
+        self.assertEqual(context.trace_id, TRACE_ID)
+
+
+class TestSamplingOnlyHeaders(unittest.TestCase):
+
+    def setUp(self):
+
+        self.tracer = jaeger_client.Tracer(service_name='test', reporter=jaeger_client.reporter.NullReporter(), sampler=ConstSampler(True))
+
+    def extract(self, headers: dict) -> jaeger_client.SpanContext:
+        return propagation.Propagator(('b3',)).extract(propagation.get_environ(headers))
+
+    def test_deny_starts_unsampled_trace(self):
+
+        for headers in [{'b3': '0'}, {'X-B3-Sampled': '0'}, {'X-B3-Sampled': 'false'}]:
+            context = self.extract(headers)
+
+            self.assertIsNotNone(context, headers)
+            self.assertFalse(context.has_trace)
+
+            span = self.tracer.start_span('request', child_of=context)
+
+            self.assertFalse(span.is_sampled(), headers)
+            self.assertIsNotNone(span.trace_id)
+
+    def test_accept_is_left_to_sampler(self):
+
+        for headers in [{'b3': '1'}, {'b3': 'd'}, {'X-B3-Sampled': '1'}, {'X-B3-Flags': '1'}]:
+            self.assertIsNone(self.extract(headers), headers)
+
+    def test_invalid_sampling_state(self):
+
+        self.assertIsNone(self.extract({'b3': '2'}))
+        self.assertIsNone(self.extract({'X-B3-Sampled': 'maybe'}))
+
+
+if __name__ == '__main__':
+    unittest.main()
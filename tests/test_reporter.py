@@ -0,0 +1,125 @@
+"""Tests of the batching span reporter against a local UDP listener"""
+
+import socket
+import unittest
+
+import jaeger_client
+import prometheus_client
+
+from jaeger_client.sampler import ConstSampler
+from jaeger_client.thrift_gen.agent import Agent
+from thrift.protocol import TCompactProtocol
+from thrift.transport import TTransport
+
+from Octopus.tracing import reporter
+
+
+def read_batch(packet: bytes) -> list:
+    """Function used to deserialize the emitBatch message
+    of a packet into the operation names of its spans"""
+
+    protocol = TCompactProtocol.TCompactProtocol(TTransport.TMemoryBuffer(packet))
+    protocol.readMessageBegin()
+
+    args = Agent.emitBatch_args()
+    args.read(protocol)
+
+    return [span.operationName for span in args.batch.spans]
+
+
+class TestBatchingReporter(unittest.TestCase):
+
+    def setUp(self):
+
+        self.listener = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.listener.bind(('127.0.0.1', 0))
+        self.listener.settimeout(2)
+        self.addCleanup(self.listener.close)
+
+    def create(self, service_name: str, **kwargs: dict) -> tuple:
+        """Function used to create a tracer reporting to the
+        listener. Spans are only flushed on close, since the
+        flush interval is longer than any test"""
+
+        span_reporter = reporter.BatchingReporter('127.0.0.1', self.listener.getsockname()[1], flush_interval=60, **kwargs)
+        tracer = jaeger_client.Tracer(service_name=service_name, reporter=span_reporter, sampler=ConstSampler(True))
+
+        return tracer, span_reporter
+
+    def report(self, tracer: jaeger_client.Tracer, span_reporter: reporter.BatchingReporter, count: int):
+        """Function used to finish a number of spans. The queue
+        is held while spans are reported, which keeps the flush
+        thread from sending spans once the queue is half full"""
+
+        with span_reporter._condition:
+            for index in range(count):
+                tracer.start_span(f'span-{index}').finish()
+
+    def receive(self, count: int) -> list:
+        """Function used to receive packets until the given
+        number of spans has been received
+
+        Returns:
+            list of packets, each given as list of operation names
+        """
+
+        packets = []
+
+        while sum(len(packet) for packet in packets) < count:
+            packet, _ = self.listener.recvfrom(reporter.MAX_PACKET_SIZE)
+            packets.append(read_batch(packet))
+
+        return packets
+
+    def get_sample(self, name: str, labels: dict) -> float:
+        return prometheus_client.REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_spans_are_batched_into_packets(self):
+
+        tracer, span_reporter = self.create('test-batching', max_batch_bytes=400)
+
+        self.report(tracer, span_reporter, 10)
+        span_reporter.close()
+
+        packets = self.receive(10)
+
+        self.assertGreater(len(packets), 1)
+        self.assertEqual([name for packet in packets for name in packet], [f'span-{index}' for index in range(10)])
+        self.assertEqual(self.get_sample('jaeger_reporter_sent_spans_total', {'service': 'test-batching'}), 10)
+
+    def test_queue_length_is_set_as_spans_are_queued(self):
+
+        tracer, span_reporter = self.create('test-queue-length', queue_size=100)
+
+        self.report(tracer, span_reporter, 3)
+
+        self.assertEqual(self.get_sample('jaeger_reporter_queue_length', {'service': 'test-queue-length'}), 3)
+
+        span_reporter.close()
+        self.receive(3)
+
+        self.assertEqual(self.get_sample('jaeger_reporter_queue_length', {'service': 'test-queue-length'}), 0)
+
+    def test_drop_oldest(self):
+
+        tracer, span_reporter = self.create('test-drop-oldest', queue_size=3, drop_policy='oldest')
+
+        self.report(tracer, span_reporter, 5)
+        span_reporter.close()
+
+        self.assertEqual(self.receive(3), [['span-2', 'span-3', 'span-4']])
+        self.assertEqual(self.get_sample('jaeger_reporter_dropped_spans_total', {'service': 'test-drop-oldest', 'reason': 'queue_full'}), 2)
+
+    def test_drop_newest(self):
+
+        tracer, span_reporter = self.create('test-drop-newest', queue_size=3, drop_policy='newest')
+
+        self.report(tracer, span_reporter, 5)
+        span_reporter.close()
+
+        self.assertEqual(self.receive(3), [['span-0', 'span-1', 'span-2']])
+        self.assertEqual(self.get_sample('jaeger_reporter_dropped_spans_total', {'service': 'test-drop-newest', 'reason': 'queue_full'}), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
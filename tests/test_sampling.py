@@ -0,0 +1,169 @@
+"""Tests of the sampling strategies and the sampling of traced routes"""
+
+import unittest
+
+from unittest import mock
+
+import bottle
+import jaeger_client
+
+from jaeger_client.reporter import InMemoryReporter
+from jaeger_client.sampler import ConstSampler, ProbabilisticSampler, RateLimitingSampler
+
+import Octopus.bottle.jaeger_tracing.jaeger_config as config
+
+from Octopus.bottle.jaeger_tracing import tracing
+from Octopus.tracing import lifecycle
+from Octopus.tracing import sampling
+
+from tests.helpers import get_environ, get_tags
+
+
+class TestStrategies(unittest.TestCase):
+
+    def test_parse_strategy(self):
+
+        sampler = sampling.parse_strategy(' probabilistic:0.25 ')
+
+        self.assertIsInstance(sampler, ProbabilisticSampler)
+        self.assertEqual(sampler.rate, 0.25)
+
+        self.assertIsInstance(sampling.parse_strategy('rate-limiting:10'), RateLimitingSampler)
+        self.assertTrue(sampling.parse_strategy('const:1').decision)
+        self.assertFalse(sampling.parse_strategy('CONST:0').decision)
+
+    def test_parse_invalid_strategy(self):
+
+        for strategy in ['const', 'const:', 'remote:1', 'probabilistic:x']:
+            with self.assertRaises(ValueError, msg=strategy):
+                sampling.parse_strategy(strategy)
+
+    def test_parse_route_strategies(self):
+
+        strategies = sampling.parse_route_strategies(' GET /items=probabilistic:0.01, POST /items=const:1,,/health=const:0')
+
+        self.assertEqual(strategies, {'GET /items': 'probabilistic:0.01', 'POST /items': 'const:1', '/health': 'const:0'})
+        self.assertEqual(sampling.parse_route_strategies(''), {})
+
+    def test_parse_invalid_route_strategies(self):
+
+        for value in ['const:1', '=const:1']:
+            with self.assertRaises(ValueError, msg=value):
+                sampling.parse_route_strategies(value)
+
+    def test_get_operation_name(self):
+
+        self.assertEqual(sampling.get_operation_name('get /items'), 'GET - /items')
+        self.assertEqual(sampling.get_operation_name('/items'), '/items')
+
+    def test_route_sampler_only_created_for_route_strategies(self):
+
+        self.assertIsInstance(sampling.get_route_sampler('const', 1), ConstSampler)
+        self.assertIsInstance(sampling.get_route_sampler('const', 1, {'/health': 'const:0'}), sampling.RouteSampler)
+
+
+class TestRouteSampler(unittest.TestCase):
+
+    def setUp(self):
+
+        self.sampler = sampling.get_route_sampler('const', 1, {'GET /items': 'const:0', '/health': 'const:0'})
+
+    def is_sampled(self, operation: str) -> bool:
+        return self.sampler.is_sampled(1, operation)[0]
+
+    def test_operation_matched_by_method_and_rule(self):
+
+        self.assertFalse(self.is_sampled('GET - /items'))
+        self.assertTrue(self.is_sampled('POST - /items'))
+
+    def test_operation_matched_by_rule(self):
+
+        self.assertFalse(self.is_sampled('GET - /health'))
+        self.assertFalse(self.is_sampled('HEAD - /health'))
+
+    def test_unmatched_operations_use_default(self):
+
+        self.assertTrue(self.is_sampled('GET - /other'))
+        self.assertTrue(self.is_sampled(''))
+
+    def test_operation_cache_is_bounded(self):
+
+        with mock.patch.object(sampling, 'MAX_CACHED_OPERATIONS', 4):
+            for index in range(10):
+                self.assertTrue(self.is_sampled(f'GET - /{index}'))
+
+            self.assertFalse(self.is_sampled('GET - /items'))
+
+        self.assertEqual(len(self.sampler._operations), 4)
+        self.assertEqual(list(self.sampler._operations), [f'GET - /{index}' for index in range(4)])
+
+
+class ConstTracer(lifecycle.LazyTracer):
+    """Tracer proxy creating a tracer with a constant
+    sampling decision that keeps finished spans in memory"""
+
+    def __init__(self, decision: bool):
+
+        super().__init__()
+
+        self.decision = decision
+        self.reporter = InMemoryReporter()
+
+    def create(self) -> jaeger_client.Tracer:
+        return jaeger_client.Tracer(service_name='test', reporter=self.reporter, sampler=ConstSampler(self.decision))
+
+
+class TestTrace(unittest.TestCase):
+
+    def setUp(self):
+
+        patcher = mock.patch.object(config, 'ENABLE_JAEGER_TRACING', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        config.set_jaeger_config({'service_name': 'test'})
+
+        environ = get_environ('/items')
+        environ['HTTP_X_AUTHENTICATED_USERID'] = 'user'
+
+        bottle.request.bind(environ)
+
+    def call(self, decision: bool) -> jaeger_client.Span:
+        """Function used to call a traced route with a tracer
+        making the given sampling decision
+
+        Returns:
+            span of the route
+        """
+
+        tracer, spans = ConstTracer(decision), []
+        self.addCleanup(lifecycle.PROXIES.remove, tracer)
+
+        def route() -> dict:
+            spans.append(tracer.active_span)
+            return {'success': True, 'http_code': 200}
+
+        with mock.patch.object(tracing, 'TRACER', tracer):
+            self.assertEqual(tracing.trace('/items')(route)(), {'success': True, 'http_code': 200})
+
+        return spans[0]
+
+    def test_sampled_span_is_tagged(self):
+
+        span = self.call(True)
+
+        self.assertTrue(span.is_sampled())
+        self.assertEqual(span.operation_name, 'GET - /items')
+        self.assertTrue({'user', 'http.method', 'http.url', 'success', 'http_code'} <= set(get_tags(span)))
+
+    def test_unsampled_span_is_not_tagged(self):
+
+        with mock.patch.object(jaeger_client.Span, 'set_tag') as set_tag:
+            span = self.call(False)
+
+        self.assertFalse(span.is_sampled())
+        set_tag.assert_not_called()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,86 @@
+"""Tests of the capture of slow requests"""
+
+import json
+import threading
+import unittest
+
+import jaeger_client
+
+from jaeger_client.reporter import InMemoryReporter
+from jaeger_client.sampler import ConstSampler
+
+from Octopus.tracing import slow_requests
+
+
+class TestSlowRequestCapture(unittest.TestCase):
+
+    def setUp(self):
+
+        self.capture = slow_requests.SlowRequestCapture(threshold=1e-6)
+
+        reporter = slow_requests.CollectingReporter(InMemoryReporter(), self.capture)
+        self.tracer = jaeger_client.Tracer(service_name='test', reporter=reporter, sampler=ConstSampler(True))
+
+    def get_children(self) -> dict:
+        """Function used to map the operation names of the
+        buffered requests to the names of their children"""
+
+        entries = json.loads(self.capture.buffer.to_json())
+
+        return {entry['operation_name']: sorted(child['operation_name'] for child in entry['children']) for entry in entries}
+
+    def test_fan_out_requests_of_one_trace(self):
+
+        # requests of one upstream trace handled concurrently on separate threads
+        upstream = jaeger_client.SpanContext(trace_id=0xabc, span_id=0x1, parent_id=None, flags=1)
+        barrier = threading.Barrier(2)
+
+        def handle(name: str):
+
+            root = self.tracer.start_span(f'GET - /{name}', child_of=upstream)
+            request = self.capture.begin(root, root.start_time)
+
+            barrier.wait()
+
+            child = self.tracer.start_span(f'{name}-child', child_of=root)
+            grandchild = self.tracer.start_span(f'{name}-grandchild', child_of=child)
+
+            grandchild.finish()
+            child.finish()
+
+            barrier.wait()
+
+            root.finish()
+            self.capture.finish(request, request.start + 1, 'GET', f'/{name}')
+
+        threads = [threading.Thread(target=handle, args=(name,)) for name in ['a', 'b']]
+
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(self.get_children(), {
+            'GET - /a': ['a-child', 'a-grandchild'],
+            'GET - /b': ['b-child', 'b-grandchild']
+        })
+
+    def test_direct_children_are_found_from_other_threads(self):
+
+        root = self.tracer.start_span('GET - /a')
+        request = self.capture.begin(root, root.start_time)
+
+        # i.e. a request made on the thread pool of the async client
+        thread = threading.Thread(target=lambda: self.tracer.start_span('a-child', child_of=root).finish())
+        thread.start()
+        thread.join()
+
+        root.finish()
+        self.capture.finish(request, request.start + 1, 'GET', '/a')
+
+        self.assertEqual(self.get_children(), {'GET - /a': ['a-child']})
+
+
+if __name__ == '__main__':
+    unittest.main()
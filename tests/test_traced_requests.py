@@ -0,0 +1,117 @@
+"""Tests of the pooled traced request session against a local HTTP server"""
+
+import http.server
+import threading
+import unittest
+
+from unittest import mock
+
+import Octopus.bottle.jaeger_tracing.jaeger_config as config
+
+from Octopus.bottle.jaeger_tracing import traced_requests
+from Octopus.bottle.jaeger_tracing import tracing
+from Octopus.tracing import lifecycle
+
+from tests.helpers import InMemoryTracer
+
+
+class KeepAliveHandler(http.server.BaseHTTPRequestHandler):
+    """Request handler recording the client address and
+    headers of each request. Connections are kept alive
+    between requests"""
+
+    protocol_version = 'HTTP/1.1'
+
+    def handle_request(self):
+
+        length = int(self.headers.get('Content-Length', 0))
+        self.rfile.read(length)
+
+        self.server.requests.append((self.command, self.client_address, dict(self.headers)))
+
+        self.send_response(200)
+        self.send_header('Content-Length', '2')
+        self.end_headers()
+
+        if self.command != 'HEAD':
+            self.wfile.write(b'ok')
+
+    do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = do_HEAD = do_OPTIONS = handle_request
+
+    def log_message(self, *args: tuple):
+        pass
+
+
+class TestTracedSession(unittest.TestCase):
+
+    def setUp(self):
+
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), KeepAliveHandler)
+        self.server.daemon_threads = True
+        self.server.requests = []
+
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.addCleanup(self.server.server_close)
+        self.addCleanup(self.server.shutdown)
+
+        self.url = f'http://127.0.0.1:{self.server.server_port}'
+
+        self.tracer = InMemoryTracer()
+        self.addCleanup(lifecycle.PROXIES.remove, self.tracer)
+
+        for patcher in [mock.patch.object(config, 'ENABLE_JAEGER_TRACING', True), mock.patch.object(tracing, 'TRACER', self.tracer)]:
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+        config.set_jaeger_config({'service_name': 'test'})
+
+    def test_span_headers_injected(self):
+
+        with traced_requests.TracedSession() as session:
+            with self.tracer.start_active_span('parent') as scope:
+                responses = [getattr(session, method)(f'{self.url}/items') for method in ['get', 'post', 'put', 'patch', 'delete', 'head', 'options']]
+
+        self.assertEqual([response.status_code for response in responses], [200] * 7)
+        self.assertEqual([command for command, _, _ in self.server.requests], ['GET', 'POST', 'PUT', 'PATCH', 'DELETE', 'HEAD', 'OPTIONS'])
+
+        for _, _, headers in self.server.requests:
+            trace_id, span_id, _, _ = headers['uber-trace-id'].split(':')
+
+            self.assertEqual(int(trace_id, 16), scope.span.trace_id)
+            self.assertEqual(int(span_id, 16), scope.span.span_id)
+
+        request_spans = [span for span in self.tracer.reporter.get_spans() if span.operation_name == f'{self.url}/items']
+
+        self.assertEqual(len(request_spans), 7)
+        self.assertTrue(all(span.parent_id == scope.span.span_id for span in request_spans))
+
+    def test_untraced_requests_have_no_span_headers(self):
+
+        with traced_requests.TracedSession() as session:
+            self.assertEqual(session.get(f'{self.url}/items').status_code, 200)
+
+        _, _, headers = self.server.requests[0]
+
+        self.assertNotIn('uber-trace-id', headers)
+
+    def test_connection_reused(self):
+
+        with traced_requests.TracedSession() as session:
+            with self.tracer.start_active_span('parent'):
+                for _ in range(3):
+                    session.get(f'{self.url}/items')
+
+        # all requests are sent from the same client port over one connection
+        self.assertEqual(len({address for _, address, _ in self.server.requests}), 1)
+
+    def test_connection_closed_without_keep_alive(self):
+
+        with traced_requests.TracedSession(keep_alive=False) as session:
+            for _ in range(3):
+                session.get(f'{self.url}/items')
+
+        self.assertEqual(len({address for _, address, _ in self.server.requests}), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()